@@ -1,9 +1,20 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import hmac
 import os
+import time
 from dotenv import load_dotenv
-from app.services.recommendation_service import RecommendationService
+from app.services.metrics import ServiceCollector, observe_stage
+from app.services.recommendation_service import RecommendationService, CF_ENGINES
+from app.services.product_masks import ProductFilter
+from app.services.profiling import PSTATS_SORT_KEYS, collapsed, sample_stacks
+from app.services.training_jobs import TrainingManager, JOB_INCREMENTAL
 
 load_dotenv()
 
@@ -16,6 +27,29 @@ app = FastAPI(
 # Inicializar servicio de recomendaciones
 recommendation_service = RecommendationService()
 
+# Cargar el último modelo guardado para no depender de /train al iniciar
+try:
+    if recommendation_service.load_model():
+        print(f"[OK] Modelo cargado desde disco (versión {recommendation_service.model_version})")
+except Exception as e:
+    print(f"[!] No se pudo cargar el modelo guardado: {e}")
+
+# Token del header X-Admin-Token para /api/admin (sin token, deshabilitado)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Máximo de usuarios por petición a /api/recommendations/batch
+MAX_BATCH_USERS = int(os.getenv("RECOMMENDATION_BATCH_MAX_USERS", 10000))
+
+class BatchRecommendationsRequest(BaseModel):
+    user_ids: List[str]
+    limit: int = Field(10, ge=1)
+
+# Entrenamientos en segundo plano (no bloquean el event loop)
+training_manager = TrainingManager(recommendation_service)
+
+# Estado del servicio (caché, modelo) calculado en cada scrape de /metrics
+REGISTRY.register(ServiceCollector(recommendation_service))
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -30,83 +64,246 @@ async def health_check():
     return JSONResponse({
         "status": "ok",
         "service": "ai-service",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "model_trained": recommendation_service.is_trained,
+        "model_version": recommendation_service.model_version,
+        "db_pool": recommendation_service.db_pool.stats(),
+        "cache": recommendation_service.cache.stats(),
+        "singleflight": recommendation_service.singleflight_stats()
     })
 
-@app.get("/api/recommendations/{user_id}")
-async def get_recommendations(user_id: str, limit: int = 10):
+@app.get("/metrics")
+async def metrics():
+    """Métricas en formato Prometheus (latencia por etapa, caché, modelo)"""
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+async def periodic_refresh(interval: int):
+    """Encola una actualización incremental cada `interval` segundos"""
+    while True:
+        await asyncio.sleep(interval)
+        if recommendation_service.is_trained:
+            training_manager.submit(JOB_INCREMENTAL)
+
+async def periodic_stock_refresh(interval: int):
+    """Refresca la máscara de productos en stock cada `interval` segundos"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(recommendation_service.refresh_stock)
+        except Exception as e:
+            print(f"[!] No se pudo refrescar el stock: {e}")
+
+@app.on_event("startup")
+async def start_periodic_refresh():
+    interval = int(os.getenv("INCREMENTAL_REFRESH_SECONDS", 0))
+    if interval > 0:
+        app.state.refresh_task = asyncio.create_task(periodic_refresh(interval))
+    stock_interval = int(os.getenv("STOCK_REFRESH_SECONDS", 0))
+    if stock_interval > 0:
+        app.state.stock_refresh_task = asyncio.create_task(periodic_stock_refresh(stock_interval))
+
+@app.on_event("shutdown")
+async def shutdown_training():
+    training_manager.shutdown()
+    recommendation_service.db_pool.close()
+    await recommendation_service.aclose()
+
+@app.post("/api/recommendations/train")
+async def train_model(engine: Optional[str] = None):
     """
-    Obtiene recomendaciones de productos para un usuario.
-    Usa Content-Based y Collaborative Filtering para alcanzar 80%+ de precisión.
+    Encola el entrenamiento del modelo de recomendaciones.
+    Combina Content-Based y Collaborative Filtering.
+    El entrenamiento corre en segundo plano; su estado se consulta en
+    /api/recommendations/train/{job_id}.
+    
+    `engine` elige el motor CF ('neighbors' o 'als'; por defecto CF_ENGINE).
+    """
+    if engine is not None and engine not in CF_ENGINES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Motor CF desconocido: {engine} (opciones: {', '.join(CF_ENGINES)})"
+        )
+    job = training_manager.submit(cf_engine=engine)
+    
+    return JSONResponse({
+        "success": True,
+        "message": "Entrenamiento en curso",
+        "job_id": job.job_id,
+        "status": job.status,
+        "status_url": f"/api/recommendations/train/{job.job_id}"
+    }, status_code=202)
+
+@app.post("/api/recommendations/refresh")
+async def refresh_model():
+    """
+    Encola una actualización incremental: solo procesa productos e
+    interacciones nuevos o modificados desde el último entrenamiento.
+    """
+    job = training_manager.submit(JOB_INCREMENTAL)
+    
+    return JSONResponse({
+        "success": True,
+        "message": "Actualización incremental en curso",
+        "job_id": job.job_id,
+        "status": job.status,
+        "status_url": f"/api/recommendations/train/{job.job_id}"
+    }, status_code=202)
+
+@app.post("/api/recommendations/stock/refresh")
+async def refresh_stock():
+    """
+    Actualiza qué productos están en stock (una consulta liviana, sin
+    reentrenar). Lo usan los filtros `in_stock_only`.
+    """
+    if not recommendation_service.is_trained:
+        return JSONResponse({
+            "success": False,
+            "message": "Modelo no entrenado"
+        }, status_code=503)
+    
+    model = await run_in_threadpool(recommendation_service.refresh_stock)
+    in_stock = model.product_masks.in_stock
+    
+    return JSONResponse({
+        "success": True,
+        "in_stock": int(in_stock.sum()),
+        "products": int(in_stock.size)
+    })
+
+@app.get("/api/recommendations/train")
+async def list_training_jobs():
+    """
+    Lista los entrenamientos recientes (el más reciente primero).
+    """
+    return JSONResponse({
+        "success": True,
+        "jobs": [job.to_dict() for job in training_manager.list_jobs()]
+    })
+
+@app.get("/api/recommendations/train/{job_id}")
+async def get_training_job(job_id: str):
+    """
+    Estado de un entrenamiento: queued, running, done o failed,
+    con duración y conteos de filas al terminar.
+    """
+    job = training_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo de entrenamiento no encontrado")
+    
+    return JSONResponse({
+        "success": True,
+        "job": job.to_dict()
+    })
+
+@app.get("/api/recommendations/accuracy")
+async def get_accuracy(k: int = Query(20, ge=1)):
+    """
+    Obtiene la precisión actual del modelo con un split temporal de las
+    interacciones (accuracy = recall@k de las compras posteriores al corte).
     """
     try:
         if not recommendation_service.is_trained:
             return JSONResponse({
                 "success": False,
-                "message": "Modelo no entrenado. Ejecuta /api/recommendations/train primero"
+                "message": "Modelo no entrenado"
             }, status_code=503)
         
-        recommendations = recommendation_service.get_recommendations(user_id, limit)
+        evaluation = await run_in_threadpool(recommendation_service.evaluate, k)
+        accuracy = evaluation['recall_at_k']
+        accuracy_percent = accuracy * 100
         
         return JSONResponse({
             "success": True,
-            "user_id": user_id,
-            "recommendations": recommendations,
-            "count": len(recommendations)
+            "accuracy": accuracy,
+            "accuracy_percent": round(accuracy_percent, 2),
+            "target_met": accuracy >= 0.80,
+            "target": 0.80,
+            "metrics": evaluation
         })
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al generar recomendaciones: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al evaluar precisión: {str(e)}")
 
-@app.get("/api/recommendations/product/{product_id}")
-async def get_similar_products(product_id: str, limit: int = 5):
+@app.post("/api/recommendations/batch")
+async def get_recommendations_batch(request: BatchRecommendationsRequest, in_stock_only: bool = False,
+                                    category: Optional[str] = None):
     """
-    Obtiene productos similares a uno dado usando Content-Based Filtering.
+    Obtiene recomendaciones para varios usuarios en una sola llamada
+    (campañas de email, precarga de la página de inicio).
+    
+    `in_stock_only` y `category` filtran los productos antes de elegir el top.
     """
+    start = time.perf_counter()
+    if len(request.user_ids) > MAX_BATCH_USERS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Máximo {MAX_BATCH_USERS} usuarios por petición"
+        )
+    
     try:
         if not recommendation_service.is_trained:
             return JSONResponse({
                 "success": False,
-                "message": "Modelo no entrenado"
+                "message": "Modelo no entrenado. Ejecuta /api/recommendations/train primero"
             }, status_code=503)
         
-        similar = recommendation_service.get_similar_products(product_id, limit)
+        # Redis asíncrono y puntuación del lote fuera del event loop
+        recommendations = await recommendation_service.get_recommendations_batch_async(
+            request.user_ids, request.limit, ProductFilter(in_stock_only, category)
+        )
         
-        return JSONResponse({
+        encode_start = time.perf_counter()
+        response = JSONResponse({
             "success": True,
-            "product_id": product_id,
-            "similar_products": similar,
-            "count": len(similar)
+            "recommendations": recommendations,
+            "count": len(recommendations)
         })
+        observe_stage('json_encode', encode_start)
+        observe_stage('request', start)
+        return response
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al obtener productos similares: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al generar recomendaciones: {str(e)}")
 
-@app.post("/api/recommendations/train")
-async def train_model():
+@app.get("/api/recommendations/{user_id}")
+async def get_recommendations(user_id: str, limit: int = Query(10, ge=1), in_stock_only: bool = False,
+                              category: Optional[str] = None):
     """
-    Entrena el modelo de recomendaciones.
-    Combina Content-Based y Collaborative Filtering.
+    Obtiene recomendaciones de productos para un usuario.
+    Usa Content-Based y Collaborative Filtering para alcanzar 80%+ de precisión.
+    
+    `in_stock_only` y `category` filtran los productos antes de elegir el top.
     """
+    start = time.perf_counter()
     try:
-        recommendation_service.train()
+        if not recommendation_service.is_trained:
+            return JSONResponse({
+                "success": False,
+                "message": "Modelo no entrenado. Ejecuta /api/recommendations/train primero"
+            }, status_code=503)
         
-        # Evaluar precisión
-        accuracy = recommendation_service.evaluate_accuracy()
-        accuracy_percent = accuracy * 100
+        recommendations = await recommendation_service.get_recommendations_async(
+            user_id, limit, ProductFilter(in_stock_only, category)
+        )
         
-        return JSONResponse({
+        encode_start = time.perf_counter()
+        response = JSONResponse({
             "success": True,
-            "message": "Modelo entrenado exitosamente",
-            "accuracy": accuracy,
-            "accuracy_percent": round(accuracy_percent, 2),
-            "target_met": accuracy >= 0.80
+            "user_id": user_id,
+            "recommendations": recommendations,
+            "count": len(recommendations)
         })
+        observe_stage('json_encode', encode_start)
+        observe_stage('request', start)
+        return response
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al entrenar modelo: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al generar recomendaciones: {str(e)}")
 
-@app.get("/api/recommendations/accuracy")
-async def get_accuracy():
+@app.get("/api/recommendations/product/{product_id}")
+async def get_similar_products(product_id: str, limit: int = Query(5, ge=1), in_stock_only: bool = False,
+                               category: Optional[str] = None):
     """
-    Obtiene la precisión actual del modelo.
+    Obtiene productos similares a uno dado usando Content-Based Filtering.
+    
+    `in_stock_only` y `category` filtran los vecinos antes de elegir el top.
     """
     try:
         if not recommendation_service.is_trained:
@@ -115,18 +312,104 @@ async def get_accuracy():
                 "message": "Modelo no entrenado"
             }, status_code=503)
         
-        accuracy = recommendation_service.evaluate_accuracy()
-        accuracy_percent = accuracy * 100
+        # Sin E/S: caché en memoria o un slice del índice de vecinos
+        similar = recommendation_service.get_similar_products(
+            product_id, limit, ProductFilter(in_stock_only, category)
+        )
         
         return JSONResponse({
             "success": True,
-            "accuracy": accuracy,
-            "accuracy_percent": round(accuracy_percent, 2),
-            "target_met": accuracy >= 0.80,
-            "target": 0.80
+            "product_id": product_id,
+            "similar_products": similar,
+            "count": len(similar)
         })
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al evaluar precisión: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al obtener productos similares: {str(e)}")
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Solo peticiones con X-Admin-Token igual a ADMIN_TOKEN"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Endpoints de administración deshabilitados (ADMIN_TOKEN)")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Token de administrador inválido")
+
+@app.post("/api/admin/profile/requests", dependencies=[Depends(require_admin)])
+async def start_request_profiling(rate: float = 0.1, max_requests: int = 100, seconds: float = 60):
+    """
+    Perfila con cProfile la puntuación de una fracción `rate` de las
+    peticiones, hasta `max_requests` perfiladas o `seconds` segundos.
+    El resultado se consulta con GET en la misma ruta.
+    """
+    try:
+        recommendation_service.request_profiler.start(rate, max_requests, seconds)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return JSONResponse({
+        "success": True,
+        "message": "Perfilado de peticiones en curso",
+        "profile": recommendation_service.request_profiler.report(limit=0)
+    }, status_code=202)
+
+@app.get("/api/admin/profile/requests", dependencies=[Depends(require_admin)])
+async def get_request_profile(limit: int = 30, sort: str = "cumulative"):
+    """
+    Funciones más costosas de la sesión de perfilado (`sort`: cumulative,
+    tottime o calls).
+    """
+    if sort not in PSTATS_SORT_KEYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Orden desconocido: {sort} (opciones: {', '.join(PSTATS_SORT_KEYS)})"
+        )
+    return JSONResponse({
+        "success": True,
+        "profile": recommendation_service.request_profiler.report(limit, sort)
+    })
+
+@app.delete("/api/admin/profile/requests", dependencies=[Depends(require_admin)])
+async def stop_request_profiling():
+    """Detiene la sesión de perfilado (el resultado se conserva)"""
+    recommendation_service.request_profiler.stop()
+    return JSONResponse({"success": True})
+
+@app.get("/api/admin/profile/stacks", dependencies=[Depends(require_admin)])
+async def sample_stack_profile(seconds: float = 10, interval_ms: float = 5):
+    """
+    Muestrea las pilas de todos los hilos del worker durante `seconds`
+    segundos. Retorna pilas colapsadas (una por línea con su cantidad de
+    muestras), listas para flamegraph.pl o speedscope.
+    """
+    if seconds <= 0 or interval_ms <= 0:
+        raise HTTPException(status_code=400, detail="seconds e interval_ms deben ser mayores que 0")
+    # El muestreador corre en un hilo: el event loop sigue atendiendo (y aparece en las muestras)
+    stacks = await run_in_threadpool(sample_stacks, seconds, interval_ms / 1000)
+    return PlainTextResponse(collapsed(stacks))
+
+@app.post("/api/admin/profile/training", dependencies=[Depends(require_admin)])
+async def profile_training_memory(engine: Optional[str] = None, incremental: bool = False):
+    """
+    Encola un entrenamiento (o una actualización incremental) con
+    tracemalloc: el pico y las líneas que más memoria retienen quedan en
+    `result.memory_profile` del trabajo.
+    """
+    if engine is not None and engine not in CF_ENGINES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Motor CF desconocido: {engine} (opciones: {', '.join(CF_ENGINES)})"
+        )
+    if incremental:
+        job = training_manager.submit(JOB_INCREMENTAL, trace_memory=True)
+    else:
+        job = training_manager.submit(cf_engine=engine, trace_memory=True)
+    
+    return JSONResponse({
+        "success": True,
+        "message": "Entrenamiento con perfil de memoria en curso",
+        "job_id": job.job_id,
+        "status": job.status,
+        "status_url": f"/api/recommendations/train/{job.job_id}"
+    }, status_code=202)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,193 @@
+"""
+Caché de dos niveles para resultados de recomendación.
+
+El primer nivel es un LRU con TTL dentro del proceso (sin viaje de red); el
+segundo es Redis, compartido entre workers, y solo recibe las entradas que
+vale la pena compartir. Las claves incluyen la versión del modelo, así un
+reentrenamiento invalida todo sin borrar nada.
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+import json
+import threading
+import time
+import redis
+
+
+class LRUCache:
+    """LRU acotado a `max_size` entradas que expiran a los `ttl` segundos"""
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class TwoTierCache:
+    """
+    LRU local delante de Redis. Los valores se guardan en Redis como JSON;
+    si Redis falla la caché sigue funcionando solo con el nivel local.
+
+    Los métodos `*_async` usan `async_redis_client` (`redis.asyncio`) para
+    no bloquear el event loop de FastAPI.
+    """
+
+    def __init__(self, local: LRUCache, redis_client=None, async_redis_client=None):
+        self.local = local
+        self.redis_client = redis_client
+        self.async_redis_client = async_redis_client
+        self.redis_hits = 0
+        self.redis_misses = 0
+        self.redis_errors = 0
+
+    def get_many(self, keys: Iterable[str], shared: bool = True) -> Dict[str, Any]:
+        """Valores encontrados para `keys` (local primero y un MGET para el resto)"""
+        found, missing = self._get_local(keys)
+        if not missing or not shared or self.redis_client is None:
+            return found
+
+        try:
+            cached = self.redis_client.mget(missing)
+        except redis.RedisError:
+            self.redis_errors += 1
+            return found
+
+        return self._merge_shared(found, missing, cached)
+
+    async def get_many_async(self, keys: Iterable[str], shared: bool = True) -> Dict[str, Any]:
+        found, missing = self._get_local(keys)
+        if not missing or not shared or self.async_redis_client is None:
+            return found
+
+        try:
+            cached = await self.async_redis_client.mget(missing)
+        except redis.RedisError:
+            self.redis_errors += 1
+            return found
+
+        return self._merge_shared(found, missing, cached)
+
+    def _get_local(self, keys: Iterable[str]):
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.local.get(key)
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+        return found, missing
+
+    def _merge_shared(self, found: Dict[str, Any], missing: List[str], cached: List) -> Dict[str, Any]:
+        """Agrega a `found` los valores leídos de Redis y los copia al nivel local"""
+        for key, raw in zip(missing, cached):
+            if raw is None:
+                self.redis_misses += 1
+                continue
+            self.redis_hits += 1
+            value = json.loads(raw)
+            self.local.set(key, value)
+            found[key] = value
+        return found
+
+    def get(self, key: str, shared: bool = True) -> Optional[Any]:
+        return self.get_many([key], shared).get(key)
+
+    def set_many(self, items: Dict[str, Any], ttl: int, shared: bool = True, local: bool = True):
+        """
+        Guarda `items` en el nivel local y, si `shared`, en Redis con un
+        solo pipeline de SETEX.
+        """
+        if local:
+            for key, value in items.items():
+                self.local.set(key, value)
+
+        if not items or not shared or self.redis_client is None:
+            return
+        try:
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for key, value in items.items():
+                pipeline.setex(key, ttl, json.dumps(value))
+            pipeline.execute()
+        except redis.RedisError:
+            self.redis_errors += 1
+
+    async def set_many_async(self, items: Dict[str, Any], ttl: int, shared: bool = True):
+        for key, value in items.items():
+            self.local.set(key, value)
+
+        if not items or not shared or self.async_redis_client is None:
+            return
+        try:
+            pipeline = self.async_redis_client.pipeline(transaction=False)
+            for key, value in items.items():
+                pipeline.setex(key, ttl, json.dumps(value))
+            await pipeline.execute()
+        except redis.RedisError:
+            self.redis_errors += 1
+
+    def set(self, key: str, value: Any, ttl: int, shared: bool = True):
+        self.set_many({key: value}, ttl, shared)
+
+    def stats(self) -> Dict:
+        """Estadísticas para /health"""
+        return {
+            'local': self.local.stats(),
+            'redis': {
+                'enabled': self.redis_client is not None,
+                'hits': self.redis_hits,
+                'misses': self.redis_misses,
+                'errors': self.redis_errors,
+            },
+        }
@@ -0,0 +1,177 @@
+"""
+Pool de conexiones a PostgreSQL compartido por el servicio de recomendaciones.
+"""
+
+from contextlib import contextmanager
+from typing import Dict, Optional
+import os
+import threading
+import time
+import psycopg2
+from psycopg2 import pool as pg_pool
+
+
+class PoolTimeoutError(Exception):
+    """No se obtuvo una conexión libre dentro del tiempo de espera"""
+
+
+class DatabasePool:
+    """
+    Pool de conexiones (`ThreadedConnectionPool`) con espera acotada.
+
+    `ThreadedConnectionPool` falla de inmediato cuando no quedan conexiones;
+    aquí un semáforo hace esperar hasta `timeout` segundos. Las conexiones
+    que estuvieron inactivas más de `health_check_interval` segundos se
+    verifican con `SELECT 1` antes de entregarse. El pool se crea de forma
+    perezosa y se recrea si el proceso cambia (fork de workers).
+    """
+
+    def __init__(
+        self,
+        minconn: Optional[int] = None,
+        maxconn: Optional[int] = None,
+        timeout: Optional[float] = None,
+        health_check_interval: Optional[float] = None
+    ):
+        self.minconn = minconn if minconn is not None else int(os.getenv('DB_POOL_MIN', 1))
+        self.maxconn = maxconn if maxconn is not None else int(os.getenv('DB_POOL_MAX', 10))
+        self.timeout = timeout if timeout is not None else float(os.getenv('DB_POOL_TIMEOUT', 5))
+        self.health_check_interval = (
+            health_check_interval if health_check_interval is not None
+            else float(os.getenv('DB_POOL_HEALTH_CHECK_SECONDS', 30))
+        )
+
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.maxconn)
+        self._last_used: Dict[int, float] = {}
+        self._stats = {
+            'acquisitions': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'in_use': 0,
+            'health_check_failures': 0,
+            'acquire_seconds_total': 0.0,
+            'acquire_seconds_max': 0.0,
+        }
+
+    def _connect_kwargs(self) -> Dict:
+        kwargs = {
+            'host': os.getenv('POSTGRES_HOST', 'localhost'),
+            'port': int(os.getenv('POSTGRES_PORT', 5432)),
+            'user': os.getenv('POSTGRES_USER', 'ventas_user'),
+            'password': os.getenv('POSTGRES_PASSWORD', 'ventas_password'),
+            'database': os.getenv('POSTGRES_DB', 'ventas_inteligentes'),
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5)),
+        }
+        statement_timeout = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 0))
+        if statement_timeout > 0:
+            kwargs['options'] = f'-c statement_timeout={statement_timeout}'
+        return kwargs
+
+    def _get_pool(self) -> pg_pool.ThreadedConnectionPool:
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = pg_pool.ThreadedConnectionPool(
+                    self.minconn, self.maxconn, **self._connect_kwargs()
+                )
+                self._pid = os.getpid()
+                self._last_used.clear()
+            return self._pool
+
+    @contextmanager
+    def connection(self):
+        """
+        Presta una conexión del pool y la devuelve al salir.
+        La transacción abierta se descarta (rollback) al devolverla.
+        """
+        start = time.perf_counter()
+        if not self._slots.acquire(blocking=False):
+            self._incr('waits')
+            if not self._slots.acquire(timeout=self.timeout):
+                self._incr('timeouts')
+                raise PoolTimeoutError(
+                    f"Sin conexiones libres tras {self.timeout}s (máximo {self.maxconn})"
+                )
+
+        try:
+            pool = self._get_pool()
+            conn = self._checkout(pool)
+            self._record_acquire(time.perf_counter() - start)
+
+            self._incr('in_use')
+            try:
+                yield conn
+            finally:
+                self._incr('in_use', -1)
+                self._checkin(pool, conn)
+        finally:
+            self._slots.release()
+
+    def _checkout(self, pool):
+        conn = pool.getconn()
+        last_used = self._last_used.get(id(conn))
+        if last_used is None or time.time() - last_used < self.health_check_interval:
+            return conn
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+            return conn
+        except psycopg2.Error:
+            # Conexión caída: descartarla y abrir otra
+            self._incr('health_check_failures')
+            self._last_used.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+            return pool.getconn()
+
+    def _checkin(self, pool, conn):
+        broken = conn.closed != 0
+        if not broken:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+
+        if broken:
+            self._last_used.pop(id(conn), None)
+        else:
+            self._last_used[id(conn)] = time.time()
+        pool.putconn(conn, close=broken)
+
+    def _incr(self, name: str, value=1):
+        with self._stats_lock:
+            self._stats[name] += value
+
+    def _record_acquire(self, seconds: float):
+        with self._stats_lock:
+            self._stats['acquisitions'] += 1
+            self._stats['acquire_seconds_total'] += seconds
+            self._stats['acquire_seconds_max'] = max(self._stats['acquire_seconds_max'], seconds)
+
+    def stats(self) -> Dict:
+        """Estadísticas del pool para /health"""
+        acquisitions = self._stats['acquisitions']
+        return {
+            'min_size': self.minconn,
+            'max_size': self.maxconn,
+            'in_use': self._stats['in_use'],
+            'acquisitions': acquisitions,
+            'waits': self._stats['waits'],
+            'timeouts': self._stats['timeouts'],
+            'health_check_failures': self._stats['health_check_failures'],
+            'acquire_ms_avg': round(
+                1000 * self._stats['acquire_seconds_total'] / acquisitions, 3
+            ) if acquisitions else 0.0,
+            'acquire_ms_max': round(1000 * self._stats['acquire_seconds_max'], 3),
+        }
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.closeall()
+            self._pool = None
+            self._last_used.clear()
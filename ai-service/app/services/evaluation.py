@@ -0,0 +1,227 @@
+"""
+Evaluación offline del modelo con split temporal.
+
+Las interacciones anteriores a un corte por `created_at` entrenan un modelo
+aparte (reutilizando el Content-Based vigente) y las compras posteriores son
+los productos relevantes de cada usuario. Todos los usuarios de prueba se
+puntúan por bloques con `rank_users`, sin pasar por la caché de producción.
+
+Las interacciones se leen por bloques (dos pasadas si hay que calcular el
+corte): las de train se agregan como en el entrenamiento y solo se guardan
+las compras de test, así la memoria no crece con el total de filas.
+"""
+
+from typing import Callable, Dict, Iterable, Optional, Tuple
+import os
+import time
+import numpy as np
+import pandas as pd
+
+from app.services.interaction_loader import INTERACTION_COLUMNS
+
+
+# Interacciones que cuentan como acierto en el conjunto de prueba (compras)
+RELEVANT_INTERACTION_TYPES = ['order']
+
+# Fechas muestreadas para estimar el corte temporal
+CUTOFF_SAMPLE_SIZE = int(os.getenv('EVALUATION_CUTOFF_SAMPLE_SIZE', 1_000_000))
+
+
+def temporal_split(
+    interactions_df: pd.DataFrame,
+    cutoff=None,
+    test_fraction: float = 0.2
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.Timestamp]:
+    """
+    Separa las interacciones en train (hasta `cutoff`) y test (después).
+    Sin `cutoff`, se usa el cuantil que deja `test_fraction` de las filas en test.
+    """
+    created_at = pd.to_datetime(interactions_df['created_at'])
+    if cutoff is None:
+        cutoff = created_at.quantile(1 - test_fraction)
+    cutoff = pd.Timestamp(cutoff)
+
+    is_train = (created_at <= cutoff).to_numpy()
+    return interactions_df[is_train], interactions_df[~is_train], cutoff
+
+
+def interaction_cutoff(
+    chunks: Iterable[pd.DataFrame],
+    test_fraction: float = 0.2,
+    sample_size: Optional[int] = None,
+    seed: int = 0
+) -> Optional[pd.Timestamp]:
+    """
+    Corte que deja `test_fraction` de las interacciones en test, estimado
+    con una muestra uniforme de a lo sumo `sample_size` fechas (exacto si
+    hay menos filas). None si no hay interacciones.
+    """
+    sample_size = sample_size or CUTOFF_SAMPLE_SIZE
+    rng = np.random.default_rng(seed)
+    sample, keys = None, np.empty(0)
+    for chunk in chunks:
+        created_at = pd.to_datetime(chunk['created_at'])
+        sample = created_at if sample is None else pd.concat([sample, created_at], ignore_index=True)
+        keys = np.concatenate([keys, rng.random(len(created_at))])
+        if keys.size > sample_size:
+            # Las `sample_size` claves aleatorias menores: muestra uniforme sin reemplazo
+            keep = np.argpartition(keys, sample_size)[:sample_size]
+            keys, sample = keys[keep], sample.iloc[keep].reset_index(drop=True)
+
+    if sample is None or sample.empty:
+        return None
+    return pd.Timestamp(sample.quantile(1 - test_fraction))
+
+
+def ranking_metrics(
+    users: np.ndarray,
+    products: np.ndarray,
+    relevant_users: np.ndarray,
+    relevant_products: np.ndarray,
+    n_users: int,
+    n_products: int,
+    k: int
+) -> Dict:
+    """
+    Precision@k, recall@k, NDCG@k y cobertura de recomendaciones planas.
+
+    `users`/`products` son las recomendaciones ordenadas por usuario y score
+    descendente; `relevant_*` son los pares (usuario, producto) relevantes
+    sin repetidos. Los promedios son sobre los `n_users` usuarios de prueba
+    (un usuario sin productos relevantes cuenta como 0 en recall y NDCG).
+    """
+    if k < 1:
+        raise ValueError("k debe ser mayor que 0")
+    if n_users == 0:
+        return {'precision_at_k': 0.0, 'recall_at_k': 0.0, 'ndcg_at_k': 0.0,
+                'hit_rate': 0.0, 'coverage': 0.0}
+
+    rank = np.arange(users.size) - np.searchsorted(users, users, side='left')
+    hit = np.isin(
+        users.astype(np.int64) * n_products + products,
+        relevant_users.astype(np.int64) * n_products + relevant_products
+    )
+
+    hits = np.bincount(users[hit], minlength=n_users)
+    n_relevant = np.bincount(relevant_users, minlength=n_users)
+
+    discounts = 1.0 / np.log2(np.arange(k) + 2)
+    dcg = np.bincount(users[hit], weights=discounts[rank[hit]], minlength=n_users)
+    has_relevant = n_relevant > 0
+    idcg = np.cumsum(discounts)[np.maximum(np.minimum(n_relevant, k) - 1, 0)]
+    recall = np.divide(hits, n_relevant, out=np.zeros(n_users), where=has_relevant)
+    ndcg = np.divide(dcg, idcg, out=np.zeros(n_users), where=has_relevant)
+
+    return {
+        'precision_at_k': float(np.mean(hits / k)),
+        'recall_at_k': float(np.mean(recall)),
+        'ndcg_at_k': float(np.mean(ndcg)),
+        'hit_rate': float(np.mean(hits > 0)),
+        'coverage': float(np.unique(products).size / n_products) if n_products else 0.0,
+    }
+
+
+def evaluate_model(
+    service,
+    content_based: Dict,
+    interactions: Callable[[], Iterable[pd.DataFrame]],
+    k: int = 20,
+    cutoff=None,
+    test_fraction: float = 0.2,
+    chunk_size: Optional[int] = None,
+    cf_engine: Optional[str] = None
+) -> Dict:
+    """
+    Entrena con las interacciones anteriores al corte y mide qué tan bien
+    se recomiendan las compras posteriores.
+
+    Args:
+        service: `RecommendationService` (se usan sus métodos de entrenamiento y ranking)
+        content_based: Artefactos Content-Based a reutilizar
+        interactions: Función que entrega las interacciones (con `created_at`)
+            por bloques; se llama una vez más si hay que calcular el corte
+        k: Largo de la lista de recomendaciones evaluada
+        cf_engine: Motor CF del modelo evaluado (por defecto el del servicio)
+    """
+    from app.services.recommendation_service import BATCH_CHUNK_SIZE
+
+    if k < 1:
+        raise ValueError("k debe ser mayor que 0")
+    start = time.perf_counter()
+    chunk_size = chunk_size or BATCH_CHUNK_SIZE
+    report = {'k': k, 'cf_engine': cf_engine or service.cf_engine, 'test_users': 0, 'train_interactions': 0, 'test_interactions': 0}
+    if cutoff is None:
+        cutoff = interaction_cutoff(interactions(), test_fraction)
+    if cutoff is None:
+        empty = np.empty(0, dtype=np.int64)
+        return {**report, **ranking_metrics(empty, empty, empty, empty, 0, 0, k),
+                'cutoff': None, 'seconds': round(time.perf_counter() - start, 3)}
+
+    # Train se agrega por bloques; de test solo se guardan las compras
+    cutoff = pd.Timestamp(cutoff)
+    test_chunks = []
+
+    def train_chunks():
+        for chunk in interactions():
+            train_df, test_df, _ = temporal_split(chunk, cutoff)
+            test_chunks.append(test_df[test_df['interaction_type'].isin(RELEVANT_INTERACTION_TYPES)])
+            yield train_df
+
+    model = service.build_model_from_chunks(content_based, train_chunks(), cutoff, cf_engine)
+    test_df = (
+        pd.concat(test_chunks, ignore_index=True) if test_chunks
+        else pd.DataFrame(columns=INTERACTION_COLUMNS)
+    )
+
+    # Productos relevantes: compras posteriores al corte que el usuario no tenía en train
+    product_id_to_index = model.product_id_to_index
+    relevant_products = product_id_to_index.get_indexer(test_df['product_id'])
+    known = relevant_products >= 0
+    relevant_codes, test_user_ids = pd.factorize(test_df['user_id'][known])
+    test_user_ids = np.asarray(test_user_ids, dtype=str)
+    relevant_products = relevant_products[known].astype(np.int64)
+
+    if model.has_collaborative:
+        train_rows = model.user_id_to_index.get_indexer(test_user_ids)
+        seen_rows = train_rows[relevant_codes]
+        seen = np.zeros(relevant_codes.size, dtype=bool)
+        has_row = seen_rows >= 0
+        seen[has_row] = np.asarray(
+            model.user_item_matrix[seen_rows[has_row], relevant_products[has_row]]
+        ).ravel() != 0
+        relevant_codes, relevant_products = relevant_codes[~seen], relevant_products[~seen]
+
+    n_products = len(model.product_ids)
+    pairs = np.unique(relevant_codes.astype(np.int64) * n_products + relevant_products)
+    relevant_users, relevant_products = np.divmod(pairs, n_products)
+
+    # Solo usuarios con al menos un producto relevante
+    test_positions = np.unique(relevant_users)
+    remap = np.full(len(test_user_ids), -1, dtype=np.int64)
+    remap[test_positions] = np.arange(test_positions.size)
+    relevant_users = remap[relevant_users]
+    test_user_ids = test_user_ids[test_positions]
+
+    # Ranking por bloques, sin caché
+    ranked_users, ranked_products = [], []
+    for chunk_start in range(0, len(test_user_ids), chunk_size):
+        chunk = test_user_ids[chunk_start:chunk_start + chunk_size]
+        users, products, _ = service.rank_users(model, chunk, k)
+        ranked_users.append(users + chunk_start)
+        ranked_products.append(products)
+
+    metrics = ranking_metrics(
+        np.concatenate(ranked_users) if ranked_users else np.empty(0, dtype=np.int64),
+        np.concatenate(ranked_products) if ranked_products else np.empty(0, dtype=np.int64),
+        relevant_users, relevant_products, len(test_user_ids), n_products, k
+    )
+
+    return {
+        **report,
+        **metrics,
+        'test_users': len(test_user_ids),
+        'train_interactions': model.training_stats['interactions'],
+        'test_interactions': int(relevant_users.size),
+        'cutoff': cutoff.isoformat(),
+        'seconds': round(time.perf_counter() - start, 3),
+    }
@@ -0,0 +1,92 @@
+"""
+Fusión vectorizada de candidatos de varias fuentes (CF, Content-Based).
+
+Cada fuente entrega arrays planos (usuario, producto, score) en su propia
+escala: CF suma cantidades ponderadas por similitud (o un producto punto de
+factores ALS) y CB usa similitud coseno. Antes de combinarlas, los scores
+de cada fuente se escalan a [0, 1] por usuario (min-max) y se multiplican
+por el peso de la fuente. Un producto que aparece en varias fuentes suma
+sus aportes.
+"""
+
+from typing import Sequence, Tuple
+import os
+import numpy as np
+
+
+# Peso de cada fuente en el score final. Con la evaluación temporal sobre
+# datos sintéticos, CF predice mejor las compras y CB completa la lista
+DEFAULT_WEIGHTS = {
+    'collaborative': float(os.getenv('FUSION_CF_WEIGHT', 0.9)),
+    'content_based': float(os.getenv('FUSION_CB_WEIGHT', 0.1)),
+}
+
+Candidates = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def normalize_per_group(groups: np.ndarray, scores: np.ndarray, n_groups: int) -> np.ndarray:
+    """
+    Escala min-max de los scores dentro de cada grupo: el mejor queda en 1 y
+    el peor en 0 (un grupo con un solo valor queda en 1).
+    """
+    maxima = np.full(n_groups, -np.inf)
+    minima = np.full(n_groups, np.inf)
+    np.maximum.at(maxima, groups, scores)
+    np.minimum.at(minima, groups, scores)
+    spread = (maxima - minima)[groups]
+    return np.divide(scores - minima[groups], spread, out=np.ones_like(scores), where=spread > 0)
+
+
+def fuse(sources: Sequence[Candidates], weights: Sequence[float], n_groups: int,
+         n_items: int, n: int) -> Candidates:
+    """
+    Combina candidatos de varias fuentes y retorna el top `n` de cada grupo.
+
+    Args:
+        sources: (grupos, ítems, scores) de cada fuente
+        weights: Peso de cada fuente (mismo orden que `sources`)
+        n_groups: Cantidad de grupos (usuarios del bloque)
+        n_items: Cantidad de ítems (productos del catálogo)
+
+    Returns:
+        (grupos, ítems, scores) ordenados por grupo y score descendente
+        (empates: menor índice de ítem primero)
+    """
+    groups = np.concatenate([source[0] for source in sources]).astype(np.int64)
+    items = np.concatenate([source[1] for source in sources]).astype(np.int64)
+    scores = np.concatenate([
+        weight * normalize_per_group(source[0], source[2].astype(np.float64), n_groups)
+        for source, weight in zip(sources, weights)
+    ]) if groups.size else np.empty(0)
+    if n <= 0 or groups.size == 0:
+        return groups[:0], items[:0], scores[:0]
+
+    # Quitar repetidos sumando los aportes de cada fuente (claves ordenadas por grupo)
+    keys, inverse = np.unique(groups * n_items + items, return_inverse=True)
+    scores = np.bincount(inverse, weights=scores, minlength=keys.size)
+    groups, items = np.divmod(keys, n_items)
+
+    # Candidatos de cada grupo en una fila de una matriz densa
+    starts = np.searchsorted(groups, np.arange(n_groups))
+    counts = np.bincount(groups, minlength=n_groups)
+    width = int(counts.max())
+    columns = np.arange(keys.size) - starts[groups]
+    dense = np.full((n_groups, width), -np.inf)
+    dense[groups, columns] = scores
+
+    # Top N por fila con argpartition; solo se ordenan los N elegidos
+    n = min(n, width)
+    top = (
+        np.argpartition(dense, width - n, axis=1)[:, -n:] if n < width
+        else np.broadcast_to(np.arange(width), dense.shape)
+    )
+    top_scores = np.take_along_axis(dense, top, axis=1)
+    ranking = np.lexsort((top, -top_scores), axis=1) if top.size else top
+    top = np.take_along_axis(top, ranking, axis=1)
+    top_scores = np.take_along_axis(top_scores, ranking, axis=1)
+
+    valid = np.isfinite(top_scores)
+    top_groups = np.broadcast_to(np.arange(n_groups)[:, None], top.shape)[valid]
+    positions = starts[top_groups] + top[valid]
+    return top_groups, items[positions], top_scores[valid]
+
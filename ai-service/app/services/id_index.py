@@ -0,0 +1,38 @@
+"""
+Mapeo compacto de IDs (cuid) a índices enteros respaldado por arrays.
+"""
+
+from typing import Iterable, Optional
+import numpy as np
+import pandas as pd
+
+
+class IdIndex:
+    """
+    Reemplazo de `{id: idx}` respaldado por un array de IDs y un `pd.Index`.
+
+    Soporta el mismo uso que el dict (`in`, `[]`, `get`, `len`) y además
+    búsquedas vectorizadas con `get_indexer`.
+    """
+
+    def __init__(self, ids: Iterable):
+        self.ids = np.asarray(ids)
+        self._index = pd.Index(self.ids)
+
+    def __contains__(self, key) -> bool:
+        return key in self._index
+
+    def __getitem__(self, key) -> int:
+        return self._index.get_loc(key)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def get(self, key, default: Optional[int] = None) -> Optional[int]:
+        if key in self._index:
+            return self._index.get_loc(key)
+        return default
+
+    def get_indexer(self, keys) -> np.ndarray:
+        """Índices (int32) de `keys`, con -1 para los IDs desconocidos"""
+        return self._index.get_indexer(keys).astype(np.int32)
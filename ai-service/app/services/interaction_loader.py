@@ -0,0 +1,172 @@
+"""
+Carga de interacciones por bloques con agregación incremental.
+
+En vez de traer el `UNION ALL` completo a un DataFrame, las filas se leen
+con un cursor del lado del servidor en bloques de `INTERACTIONS_CHUNK_SIZE`.
+De cada bloque se codifican los IDs como enteros (int32) y se suman los
+scores por par (usuario, producto); el bloque se descarta enseguida. La
+memoria queda acotada por los pares distintos (el tamaño de la matriz CF),
+no por las filas de las tablas.
+"""
+
+from typing import Dict, Iterable, Iterator, List, Optional
+import os
+import uuid
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from sklearn.preprocessing import normalize
+
+from app.services.id_index import IdIndex
+from app.services.popularity import PopularityIndex, interaction_weights
+
+
+# Tipos de interacción que forman el historial de productos de un usuario
+HISTORY_INTERACTION_TYPES = ['cart', 'order']
+
+INTERACTION_COLUMNS = ['user_id', 'product_id', 'interaction_score', 'interaction_type', 'created_at']
+
+# Filas por bloque leído de PostgreSQL
+LOAD_CHUNK_SIZE = int(os.getenv('INTERACTIONS_CHUNK_SIZE', 100_000))
+
+# Pares pendientes antes de compactar (sumar repetidos)
+COMPACT_ROWS = int(os.getenv('INTERACTIONS_COMPACT_ROWS', 2_000_000))
+
+
+def stream_query(conn, query: str, columns: List[str], chunk_size: Optional[int] = None,
+                 params: Optional[Dict] = None) -> Iterator[pd.DataFrame]:
+    """
+    Ejecuta `query` con un cursor con nombre (del lado del servidor) y
+    entrega DataFrames de hasta `chunk_size` filas.
+    """
+    chunk_size = chunk_size or LOAD_CHUNK_SIZE
+    with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cursor:
+        cursor.itersize = chunk_size
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield pd.DataFrame.from_records(rows, columns=columns)
+
+
+class _PairSums:
+    """
+    Suma de valores por clave `usuario * n_productos + producto`.
+    Los bloques se acumulan y se compactan (claves únicas ordenadas) cuando
+    lo pendiente supera lo ya compactado, así el costo total es O(N log N).
+    """
+
+    def __init__(self, compact_rows: int):
+        self.compact_rows = compact_rows
+        self.keys = np.empty(0, dtype=np.int64)
+        self.values = np.empty(0, dtype=np.float32)
+        self._pending_keys: List[np.ndarray] = []
+        self._pending_values: List[np.ndarray] = []
+        self._pending = 0
+
+    def add(self, keys: np.ndarray, values: np.ndarray):
+        self._pending_keys.append(keys)
+        self._pending_values.append(values)
+        self._pending += keys.size
+        if self._pending >= max(self.compact_rows, self.keys.size):
+            self.compact()
+
+    def compact(self):
+        if not self._pending_keys:
+            return
+        keys, inverse = np.unique(
+            np.concatenate([self.keys, *self._pending_keys]), return_inverse=True
+        )
+        values = np.bincount(
+            inverse, weights=np.concatenate([self.values, *self._pending_values]),
+            minlength=keys.size
+        )
+        self.keys, self.values = keys, values.astype(np.float32)
+        self._pending_keys, self._pending_values, self._pending = [], [], 0
+
+    def to_csr(self, n_users: int, n_products: int, dtype) -> csr_matrix:
+        """Matriz usuarios × productos (las claves ordenadas ya siguen el orden CSR)"""
+        self.compact()
+        users = self.keys // n_products
+        indptr = np.zeros(n_users + 1, dtype=np.int64)
+        np.cumsum(np.bincount(users, minlength=n_users), out=indptr[1:])
+        return csr_matrix(
+            (self.values.astype(dtype), (self.keys % n_products).astype(np.int32), indptr),
+            shape=(n_users, n_products)
+        )
+
+
+class InteractionAggregator:
+    """
+    Acumula bloques de interacciones (columnas de INTERACTION_COLUMNS) en
+    lo que necesita el modelo: matriz usuario-producto, historial y pesos
+    de popularidad, alineados a `product_id_to_index`.
+    """
+
+    def __init__(self, product_id_to_index: IdIndex, reference_time=None,
+                 half_life_days: float = 0.0, compact_rows: Optional[int] = None):
+        self.product_id_to_index = product_id_to_index
+        self.n_products = len(product_id_to_index)
+        self.reference_time = reference_time
+        self.half_life_days = half_life_days
+        self.interactions = 0
+        self.popularity_weights = np.zeros(self.n_products)
+        self._user_codes: Dict[str, int] = {}
+        self._scores = _PairSums(compact_rows or COMPACT_ROWS)
+        self._history = _PairSums(compact_rows or COMPACT_ROWS)
+
+    @property
+    def n_users(self) -> int:
+        return len(self._user_codes)
+
+    def add_all(self, chunks: Iterable[pd.DataFrame]) -> 'InteractionAggregator':
+        for chunk in chunks:
+            self.add(chunk)
+        return self
+
+    def add(self, chunk: pd.DataFrame):
+        if chunk.empty:
+            return
+        self.interactions += len(chunk)
+
+        # Usuarios en orden de aparición (como `pd.factorize` sobre todas las filas)
+        codes, uniques = pd.factorize(chunk['user_id'])
+        user_codes = np.fromiter(
+            (self._user_codes.setdefault(user_id, len(self._user_codes)) for user_id in uniques),
+            dtype=np.int32, count=len(uniques)
+        )[codes]
+
+        # Ignorar interacciones con productos que ya no existen
+        product_codes = self.product_id_to_index.get_indexer(chunk['product_id'])
+        known = product_codes >= 0
+        product_codes = product_codes[known].astype(np.int32)
+        keys = user_codes[known].astype(np.int64) * self.n_products + product_codes
+
+        self._scores.add(keys, chunk['interaction_score'].to_numpy(dtype=np.float32)[known])
+        in_history = chunk['interaction_type'].isin(HISTORY_INTERACTION_TYPES).to_numpy()[known]
+        self._history.add(keys[in_history], np.ones(in_history.sum(), dtype=np.float32))
+
+        weights = interaction_weights(chunk, self.reference_time, self.half_life_days)[known]
+        self.popularity_weights += np.bincount(
+            product_codes, weights=weights, minlength=self.n_products
+        )
+
+    def collaborative(self) -> Dict:
+        """Artefactos CF (mismas claves que `RecommendationModel`)"""
+        user_item_matrix = self._scores.to_csr(self.n_users, self.n_products, np.float32)
+        user_history = self._history.to_csr(self.n_users, self.n_products, np.int8)
+        user_history.data[:] = 1
+        user_ids = np.array(list(self._user_codes), dtype=str)
+        return {
+            'user_ids': user_ids,
+            'user_id_to_index': IdIndex(user_ids),
+            'user_item_matrix': user_item_matrix,
+            'user_item_normalized': normalize(user_item_matrix, norm='l2', axis=1),
+            'user_history': user_history,
+        }
+
+    def popularity(self, product_categories: np.ndarray) -> PopularityIndex:
+        return PopularityIndex.build(
+            np.arange(self.n_products), self.popularity_weights, product_categories
+        )
@@ -0,0 +1,225 @@
+"""
+Índice IVF (inverted file) para vecinos aproximados entre productos.
+
+Los vectores de productos (normalizados, float32) se agrupan con k-means
+esférico en `nlist` listas. Una búsqueda solo compara la consulta con los
+productos de las `nprobe` listas cuyos centroides son más parecidos, así
+que construir los vecinos de todo el catálogo cuesta ~N²·nprobe/nlist en
+vez de N². Más `nprobe` = más recall y más latencia.
+"""
+
+from typing import Dict, Optional, Tuple
+import os
+import numpy as np
+from scipy.sparse import csr_matrix, issparse
+from sklearn.preprocessing import normalize
+
+
+IVF_NPROBE = int(os.getenv('IVF_NPROBE', 8))
+
+# Consultas resueltas juntas en cada bloque de `search`
+_SEARCH_BLOCK = 2048
+
+# Puntos de muestra por lista para entrenar los centroides
+_SAMPLE_PER_LIST = 64
+
+
+class IVFIndex:
+    """
+    `vectors` guarda los productos agrupados por lista: las filas
+    `list_offsets[l]:list_offsets[l + 1]` son la lista `l` y `list_ids`
+    indica el producto de cada fila.
+    """
+
+    def __init__(self, centroids: np.ndarray, vectors: np.ndarray,
+                 list_ids: np.ndarray, list_offsets: np.ndarray):
+        self.centroids = centroids
+        self.vectors = vectors
+        self.list_ids = list_ids
+        self.list_offsets = list_offsets
+        # Fila de `vectors` de cada producto
+        self.positions = np.empty(len(list_ids), dtype=np.int64)
+        self.positions[list_ids] = np.arange(len(list_ids))
+
+    @property
+    def nlist(self) -> int:
+        return self.centroids.shape[0]
+
+    def __len__(self) -> int:
+        return len(self.list_ids)
+
+    @property
+    def nbytes(self) -> int:
+        return self.centroids.nbytes + self.vectors.nbytes + self.list_ids.nbytes
+
+    @classmethod
+    def build(cls, features, nlist: Optional[int] = None, iterations: int = 10,
+              seed: int = 0) -> 'IVFIndex':
+        """
+        Entrena los centroides sobre una muestra y asigna cada producto a su lista.
+        Por defecto `nlist` es IVF_NLIST o 4·√N.
+        """
+        vectors = _dense_normalized(features)
+        n_products = vectors.shape[0]
+        nlist = nlist or int(os.getenv('IVF_NLIST', 0)) or int(4 * np.sqrt(n_products))
+        nlist = max(1, min(nlist, n_products))
+
+        centroids = _spherical_kmeans(vectors, nlist, iterations, np.random.default_rng(seed))
+        return cls._from_assignments(centroids, vectors, _nearest(vectors, centroids))
+
+    @classmethod
+    def _from_assignments(cls, centroids: np.ndarray, vectors: np.ndarray,
+                          assignments: np.ndarray) -> 'IVFIndex':
+        order = np.argsort(assignments, kind='stable')
+        list_offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=len(centroids)), out=list_offsets[1:])
+        return cls(centroids, vectors[order], order.astype(np.int32), list_offsets)
+
+    def vector(self, product_ids: np.ndarray) -> np.ndarray:
+        return self.vectors[self.positions[product_ids]]
+
+    def update(self, features, changed: np.ndarray) -> 'IVFIndex':
+        """
+        Retorna un índice nuevo con los productos `changed` (modificados o
+        agregados al final de `features`) reasignados. Los centroides no se
+        reentrenan hasta el próximo entrenamiento completo.
+        """
+        changed = np.unique(np.asarray(changed, dtype=np.int64))
+        n_products, n_old = features.shape[0], len(self)
+
+        vectors = np.empty((n_products, self.vectors.shape[1]), dtype=np.float32)
+        vectors[:n_old] = self.vectors[self.positions]
+        assignments = np.empty(n_products, dtype=np.int64)
+        assignments[:n_old] = np.repeat(
+            np.arange(self.nlist), np.diff(self.list_offsets)
+        )[self.positions]
+
+        if changed.size:
+            vectors[changed] = _dense_normalized(features[changed])
+            assignments[changed] = _nearest(vectors[changed], self.centroids)
+        return self._from_assignments(self.centroids, vectors, assignments)
+
+    def search(self, queries: np.ndarray, k: int, nprobe: Optional[int] = None,
+               exclude: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-K aproximado (similitud coseno) de cada consulta normalizada.
+
+        Args:
+            queries: Vectores (B×d) normalizados
+            nprobe: Listas visitadas por consulta (por defecto IVF_NPROBE)
+            exclude: Producto a excluir de cada consulta (p. ej. ella misma)
+
+        Returns:
+            (índices int32, scores float32) B×K en orden descendente; -1/-inf
+            donde no hay suficientes candidatos
+        """
+        nprobe = max(1, min(nprobe or IVF_NPROBE, self.nlist))
+        indices = np.full((len(queries), k), -1, dtype=np.int32)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for start in range(0, len(queries), _SEARCH_BLOCK):
+            end = min(start + _SEARCH_BLOCK, len(queries))
+            self._search_block(
+                queries[start:end], k, nprobe,
+                exclude[start:end] if exclude is not None else None,
+                indices[start:end], scores[start:end]
+            )
+        return indices, scores
+
+    def _search_block(self, queries: np.ndarray, k: int, nprobe: int, exclude: Optional[np.ndarray],
+                      indices: np.ndarray, scores: np.ndarray):
+        probes = np.argpartition(queries @ self.centroids.T, -nprobe, axis=1)[:, -nprobe:]
+
+        # Top-K de cada lista visitada, en el hueco (consulta, sonda) que le toca
+        candidate_ids = np.full((len(queries), nprobe, k), -1, dtype=np.int32)
+        candidate_scores = np.full((len(queries), nprobe, k), -np.inf, dtype=np.float32)
+
+        # Recorrer cada lista una vez con todas las consultas que la visitan
+        lists = probes.ravel()
+        order = np.argsort(lists, kind='stable')
+        bounds = np.flatnonzero(np.diff(lists[order], prepend=-1, append=self.nlist))
+        for begin, end in zip(bounds[:-1], bounds[1:]):
+            list_index = lists[order[begin]]
+            list_begin, list_end = self.list_offsets[list_index], self.list_offsets[list_index + 1]
+            if list_begin == list_end:
+                continue
+
+            block_queries, block_probes = np.divmod(order[begin:end], nprobe)
+            block_scores = queries[block_queries] @ self.vectors[list_begin:list_end].T
+            block_ids = self.list_ids[list_begin:list_end]
+            if exclude is not None:
+                block_scores[exclude[block_queries][:, None] == block_ids[None, :]] = -np.inf
+
+            top_k = min(k, list_end - list_begin)
+            top = _top_columns(block_scores, top_k)
+            candidate_ids[block_queries, block_probes, :top_k] = block_ids[top]
+            candidate_scores[block_queries, block_probes, :top_k] = np.take_along_axis(block_scores, top, axis=1)
+
+        # Cada producto está en una sola lista: no hay candidatos repetidos
+        candidate_ids = candidate_ids.reshape(len(queries), -1)
+        candidate_scores = candidate_scores.reshape(len(queries), -1)
+        top = _top_columns(candidate_scores, k)
+        top_scores = np.take_along_axis(candidate_scores, top, axis=1)
+        ranking = np.argsort(-top_scores, axis=1, kind='stable')
+        top_scores = np.take_along_axis(top_scores, ranking, axis=1)
+        top_ids = np.take_along_axis(np.take_along_axis(candidate_ids, top, axis=1), ranking, axis=1)
+        top_ids[np.isneginf(top_scores)] = -1
+        indices[:, :top_ids.shape[1]] = top_ids
+        scores[:, :top_scores.shape[1]] = top_scores
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            'ivf_centroids': self.centroids,
+            'ivf_vectors': self.vectors,
+            'ivf_list_ids': self.list_ids,
+            'ivf_list_offsets': self.list_offsets,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'IVFIndex':
+        return cls(
+            arrays['ivf_centroids'],
+            arrays['ivf_vectors'],
+            arrays['ivf_list_ids'],
+            arrays['ivf_list_offsets'],
+        )
+
+
+def _top_columns(scores: np.ndarray, k: int) -> np.ndarray:
+    """Columnas de los `k` mayores scores de cada fila (sin ordenar)"""
+    if k >= scores.shape[1]:
+        return np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    return np.argpartition(scores, -k, axis=1)[:, -k:]
+
+
+def _dense_normalized(features) -> np.ndarray:
+    features = normalize(features.astype(np.float32), norm='l2', axis=1)
+    return features.toarray() if issparse(features) else np.ascontiguousarray(features)
+
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray, block_size: int = 65536) -> np.ndarray:
+    """Centroide más parecido de cada vector, por bloques"""
+    return np.concatenate([
+        np.argmax(vectors[start:start + block_size] @ centroids.T, axis=1)
+        for start in range(0, len(vectors), block_size)
+    ]) if len(vectors) else np.empty(0, dtype=np.int64)
+
+
+def _spherical_kmeans(vectors: np.ndarray, nlist: int, iterations: int, rng) -> np.ndarray:
+    """k-means con similitud coseno sobre una muestra de los vectores"""
+    sample_size = min(len(vectors), nlist * _SAMPLE_PER_LIST)
+    sample = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = _nearest(sample, centroids)
+        membership = csr_matrix(
+            (np.ones(sample_size, dtype=np.float32), (assignments, np.arange(sample_size))),
+            shape=(nlist, sample_size)
+        )
+        sums = np.asarray(membership @ sample)
+        # Listas vacías: reiniciar con puntos al azar
+        empty = np.flatnonzero(np.bincount(assignments, minlength=nlist) == 0)
+        sums[empty] = sample[rng.choice(sample_size, empty.size)]
+        centroids = normalize(sums, norm='l2', axis=1).astype(np.float32)
+
+    return centroids
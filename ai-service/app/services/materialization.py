@@ -0,0 +1,161 @@
+"""
+Materialización de las recomendaciones de todos los usuarios en Redis.
+
+Después de publicar un modelo se calcula el top-N de cada usuario conocido
+en bloques vectorizados repartidos en un pool de procesos. Cada proceso
+carga la misma versión del modelo (mapeada en memoria) y escribe con
+pipelines bajo claves que incluyen la versión, así una petición en línea
+de un usuario conocido es una sola lectura de caché.
+
+Redis guarda una sola versión materializada (`MATERIALIZED_VERSION_KEY`):
+al publicarse otra versión, `purge_materialized` borra sus claves.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+import multiprocessing
+import os
+import time
+import numpy as np
+import redis
+
+
+# Respaldo por si la purga no llega a correr (p. ej. el servidor se reinicia)
+MATERIALIZE_TTL = int(os.getenv('MATERIALIZE_TTL_SECONDS', 24 * 3600))
+
+# Versión cuyas recomendaciones están materializadas en Redis
+MATERIALIZED_VERSION_KEY = 'recommendations:materialized_version'
+
+# Claves por SCAN / UNLINK al purgar
+PURGE_BATCH_SIZE = 1000
+
+# Servicio de cada proceso del pool (se crea en `_init_worker`)
+_worker_service = None
+
+
+def materialize_recommendations(
+    service,
+    n: Optional[int] = None,
+    workers: Optional[int] = None,
+    users_per_task: int = 5000
+) -> Dict:
+    """
+    Calcula y guarda en Redis las recomendaciones de todos los usuarios del
+    modelo vigente de `service`.
+
+    Args:
+        n: Recomendaciones por usuario (por defecto MATERIALIZE_TOP_N o 10)
+        workers: Procesos del pool (por defecto MATERIALIZE_WORKERS o los CPUs)
+        users_per_task: Usuarios por tarea enviada a cada proceso
+
+    Returns:
+        Usuarios escritos, duración y usuarios/segundo
+    """
+    model = service.model
+    if model is None or service.redis_client is None or not model.has_collaborative:
+        return {}
+
+    n = n or int(os.getenv('MATERIALIZE_TOP_N', 10))
+    workers = workers or int(os.getenv('MATERIALIZE_WORKERS', os.cpu_count() or 1))
+    n_users = len(model.user_ids)
+    ranges = [(start, min(start + users_per_task, n_users))
+              for start in range(0, n_users, users_per_task)]
+
+    purge_materialized(service)
+    print(f"⚡ Materializando recomendaciones de {n_users} usuarios...")
+    start_time = time.perf_counter()
+
+    # Sin versión en disco los procesos hijos no pueden cargar el modelo
+    if workers <= 1 or model.version is None:
+        workers = 1
+        written = sum(_materialize_range(service, model, start, end, n) for start, end in ranges)
+    else:
+        # 'spawn' evita heredar conexiones y locks del proceso del servidor
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(ranges)),
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(model.version,)
+        ) as pool:
+            futures = [pool.submit(_materialize_worker, start, end, n) for start, end in ranges]
+            written = sum(future.result() for future in futures)
+
+    try:
+        service.redis_client.set(MATERIALIZED_VERSION_KEY, model.version or 'local')
+    except redis.RedisError:
+        pass
+
+    seconds = time.perf_counter() - start_time
+    users_per_second = written / seconds if seconds > 0 else 0.0
+    print(f"✅ {written} usuarios materializados en {seconds:.1f}s ({users_per_second:.0f} usuarios/s)")
+
+    return {
+        'model_version': model.version,
+        'users': written,
+        'top_n': n,
+        'workers': workers,
+        'seconds': round(seconds, 3),
+        'users_per_second': round(users_per_second, 1),
+    }
+
+
+def purge_materialized(service) -> int:
+    """
+    Borra de Redis las recomendaciones materializadas de una versión que ya
+    no es la publicada (nadie las vuelve a leer). Retorna las claves borradas.
+    """
+    from app.services.recommendation_service import recommendations_cache_prefix
+
+    client = service.redis_client
+    current = service.model.version if service.model is not None else None
+    if client is None:
+        return 0
+    try:
+        previous = client.get(MATERIALIZED_VERSION_KEY)
+        if previous is None or previous == (current or 'local'):
+            return 0
+
+        deleted = 0
+        batch = []
+        pattern = recommendations_cache_prefix(previous) + '*'
+        for key in client.scan_iter(match=pattern, count=PURGE_BATCH_SIZE):
+            batch.append(key)
+            if len(batch) >= PURGE_BATCH_SIZE:
+                deleted += client.unlink(*batch)
+                batch = []
+        if batch:
+            deleted += client.unlink(*batch)
+        client.delete(MATERIALIZED_VERSION_KEY)
+    except redis.RedisError:
+        return 0
+
+    print(f"🧹 {deleted} recomendaciones materializadas de la versión {previous} eliminadas")
+    return deleted
+
+
+def _materialize_range(service, model, start: int, end: int, n: int) -> int:
+    """Calcula y escribe las recomendaciones de los usuarios `start:end` del modelo"""
+    from app.services.recommendation_service import BATCH_CHUNK_SIZE
+
+    written = 0
+    for chunk_start in range(start, end, BATCH_CHUNK_SIZE):
+        user_ids = np.asarray(model.user_ids[chunk_start:min(chunk_start + BATCH_CHUNK_SIZE, end)])
+        recommendations = dict(zip(user_ids.tolist(), service.score_users(model, user_ids, n)))
+        service.cache_recommendations(model, recommendations, n, MATERIALIZE_TTL)
+        written += len(recommendations)
+    return written
+
+
+def _init_worker(version: str):
+    global _worker_service
+    from app.services.recommendation_service import RecommendationService
+
+    _worker_service = RecommendationService()
+    if not _worker_service.load_model(version):
+        raise RuntimeError(f"No se encontró la versión {version} del modelo")
+    if _worker_service.redis_client is None:
+        raise RuntimeError("Redis no está disponible en el proceso de materialización")
+
+
+def _materialize_worker(start: int, end: int, n: int) -> int:
+    return _materialize_range(_worker_service, _worker_service.model, start, end, n)
@@ -0,0 +1,58 @@
+"""
+Medición de memoria del proceso para los reportes de entrenamiento.
+"""
+
+from typing import Optional
+import sys
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# En Linux el pico (VmHWM) se puede reiniciar para medir por etapas
+_PROC_STATUS = '/proc/self/status'
+_PROC_CLEAR_REFS = '/proc/self/clear_refs'
+
+
+def peak_memory_mb() -> Optional[float]:
+    """Memoria residente pico del proceso (MB), o None si no se puede medir"""
+    peak = _proc_peak_kb()
+    if peak is not None:
+        return peak / 1024
+
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reporta KB y macOS bytes
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return getattr(info, 'peak_wset', info.rss) / (1024 * 1024)
+
+
+def reset_peak_memory() -> bool:
+    """
+    Reinicia el pico de memoria residente al uso actual (solo Linux).
+    Retorna False si el sistema no lo permite; el pico sigue siendo el del proceso.
+    """
+    try:
+        with open(_PROC_CLEAR_REFS, 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _proc_peak_kb() -> Optional[int]:
+    try:
+        with open(_PROC_STATUS) as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
@@ -0,0 +1,138 @@
+"""
+Métricas Prometheus del servicio (expuestas en /metrics).
+
+- Histogramas por etapa al servir recomendaciones (caché, CF, CB, fusión,
+  armado de la respuesta, JSON) y por etapa de entrenamiento.
+- Valores que se leen al momento del scrape (`ServiceCollector`): tasa de
+  aciertos de caché, tamaño del modelo, productos/usuarios y antigüedad del
+  último entrenamiento. No cuestan nada en el camino de las peticiones.
+
+Los entrenamientos que corren en un proceso hijo no comparten el registro:
+sus etapas viajan en `training_stats['stages']` y se registran al terminar
+el trabajo (`observe_training`).
+"""
+
+from typing import Dict, Optional
+import time
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+
+SERVING_STAGES = (
+    'request', 'cache_get', 'collaborative', 'content_based', 'fusion',
+    'group', 'cache_set', 'json_encode',
+)
+
+SERVING_STAGE_SECONDS = Histogram(
+    'ai_recommendation_stage_seconds',
+    'Duración de cada etapa al servir recomendaciones',
+    ['stage'],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+TRAINING_STAGE_SECONDS = Histogram(
+    'ai_training_stage_seconds',
+    'Duración de cada etapa de un entrenamiento',
+    ['kind', 'stage'],
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600),
+)
+
+TRAINING_JOBS = Counter(
+    'ai_training_jobs_total',
+    'Entrenamientos terminados por tipo y estado',
+    ['kind', 'status'],
+)
+
+# Hijos con la etiqueta ya resuelta: en el camino caliente solo se llama observe()
+_SERVING = {stage: SERVING_STAGE_SECONDS.labels(stage) for stage in SERVING_STAGES}
+
+
+def observe_stage(stage: str, start: float) -> float:
+    """Registra la etapa `stage` iniciada en `start` (perf_counter); retorna el instante actual"""
+    now = time.perf_counter()
+    _SERVING[stage].observe(now - start)
+    return now
+
+
+class StageClock:
+    """Duración de etapas consecutivas de un entrenamiento, en segundos"""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self._last = time.perf_counter()
+
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        self.stages[stage] = round(self.stages.get(stage, 0.0) + now - self._last, 4)
+        self._last = now
+
+
+def observe_training(kind: str, status: str, result: Optional[Dict] = None,
+                     seconds: Optional[float] = None):
+    """Registra las etapas y la duración total de un entrenamiento terminado (`TrainingJob`)"""
+    TRAINING_JOBS.labels(kind, status).inc()
+    if seconds is not None:
+        TRAINING_STAGE_SECONDS.labels(kind, 'total').observe(seconds)
+    result = result or {}
+    for stage, seconds in result.get('stages', {}).items():
+        TRAINING_STAGE_SECONDS.labels(kind, stage).observe(seconds)
+    materialization = result.get('materialization')
+    if isinstance(materialization, dict) and 'seconds' in materialization:
+        TRAINING_STAGE_SECONDS.labels(kind, 'materialization').observe(materialization['seconds'])
+
+
+def observe_evaluation(kind: str, seconds: float):
+    """Registra la evaluación que corre después de publicar un entrenamiento"""
+    TRAINING_STAGE_SECONDS.labels(kind, 'evaluation').observe(seconds)
+
+
+class ServiceCollector:
+    """Métricas del estado del servicio calculadas en cada scrape"""
+
+    def __init__(self, service):
+        self.service = service
+
+    def collect(self):
+        model = self.service.model
+        cache = self.service.cache
+
+        hit_ratio = GaugeMetricFamily(
+            'ai_cache_hit_ratio', 'Aciertos / consultas de la caché de recomendaciones', labels=['tier']
+        )
+        lookups = CounterMetricFamily(
+            'ai_cache_lookups', 'Consultas a la caché de recomendaciones', labels=['tier', 'result']
+        )
+        for tier, hits, misses in (
+            ('local', cache.local.hits, cache.local.misses),
+            ('redis', cache.redis_hits, cache.redis_misses),
+        ):
+            hit_ratio.add_metric([tier], hits / (hits + misses) if hits + misses else 0.0)
+            lookups.add_metric([tier, 'hit'], hits)
+            lookups.add_metric([tier, 'miss'], misses)
+        yield hit_ratio
+        yield lookups
+
+        yield GaugeMetricFamily('ai_model_trained', 'Hay un modelo publicado', value=int(model is not None))
+        if model is None:
+            return
+
+        info = GaugeMetricFamily(
+            'ai_model_info', 'Versión y motor CF del modelo publicado', labels=['version', 'cf_engine']
+        )
+        info.add_metric([model.version or 'local', model.cf_engine or 'none'], 1)
+        yield info
+        yield GaugeMetricFamily('ai_model_size_bytes', 'Tamaño de los arrays del modelo', value=model.nbytes)
+        yield GaugeMetricFamily('ai_model_products', 'Productos del modelo', value=len(model.product_ids))
+        yield GaugeMetricFamily(
+            'ai_model_users', 'Usuarios con historial en el modelo',
+            value=len(model.user_ids) if model.has_collaborative else 0
+        )
+
+        trained_at = model.trained_at
+        if trained_at is not None:
+            yield GaugeMetricFamily(
+                'ai_model_trained_timestamp_seconds', 'Instante (epoch) del último entrenamiento', value=trained_at
+            )
+            yield GaugeMetricFamily(
+                'ai_model_age_seconds', 'Segundos desde el último entrenamiento', value=time.time() - trained_at
+            )
@@ -0,0 +1,160 @@
+"""
+Snapshot inmutable de un modelo de recomendaciones entrenado.
+
+El servicio guarda una sola referencia a `RecommendationModel` y la reemplaza
+completa al reentrenar, así los lectores concurrentes nunca ven un modelo a
+medio construir.
+"""
+
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from functools import cached_property
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+from scipy.sparse import csr_matrix
+from app.services.id_index import IdIndex
+from app.services.ivf_index import IVFIndex
+from app.services.model_store import sparse_to_arrays, sparse_from_arrays
+from app.services.neighbor_index import NeighborIndex
+from app.services.popularity import PopularityIndex
+from app.services.product_masks import ProductMasks
+
+
+@dataclass(frozen=True)
+class RecommendationModel:
+    """Artefactos de Content-Based y Collaborative Filtering de una versión"""
+
+    product_ids: np.ndarray
+    product_id_to_index: IdIndex
+    product_features: csr_matrix
+    neighbor_index: NeighborIndex
+    vectorizer: Any
+    scaler: Any
+    product_categories: Optional[np.ndarray] = None
+    # Productos con stock > 0 (bool); se actualiza sin reentrenar (`refresh_stock`)
+    product_in_stock: Optional[np.ndarray] = None
+    # Índice IVF con el que se construyen los vecinos en catálogos grandes
+    ann_index: Optional[IVFIndex] = None
+    user_ids: Optional[np.ndarray] = None
+    user_id_to_index: Optional[IdIndex] = None
+    user_item_matrix: Optional[csr_matrix] = None
+    user_item_normalized: Optional[csr_matrix] = None
+    # Productos vistos por cada usuario (carrito u orden), CSR binaria
+    user_history: Optional[csr_matrix] = None
+    # Factores ALS (float32); si existen reemplazan la similitud usuario-usuario
+    user_factors: Optional[np.ndarray] = None
+    item_factors: Optional[np.ndarray] = None
+    # Ranking precalculado para usuarios sin historial
+    popularity: Optional[PopularityIndex] = None
+    training_stats: Dict[str, Any] = field(default_factory=dict)
+    # Instante (UTC) hasta el que el modelo incluye cambios de la base de datos
+    watermark: Optional[datetime] = None
+    version: Optional[str] = None
+
+    @property
+    def has_collaborative(self) -> bool:
+        return self.user_item_matrix is not None
+
+    @property
+    def cf_engine(self) -> Optional[str]:
+        if not self.has_collaborative:
+            return None
+        return 'als' if self.user_factors is not None else 'neighbors'
+
+    @cached_property
+    def product_masks(self) -> ProductMasks:
+        return ProductMasks(self.product_in_stock, self.product_categories)
+
+    @cached_property
+    def nbytes(self) -> int:
+        """Bytes de los arrays que se guardan en el artefacto"""
+        arrays, _, _ = self.to_artifact()
+        return int(sum(array.nbytes for array in arrays.values()))
+
+    @property
+    def trained_at(self) -> Optional[float]:
+        """Instante (epoch) del último entrenamiento o actualización"""
+        if 'trained_at' in self.training_stats:
+            return self.training_stats['trained_at']
+        return self.watermark.timestamp() if self.watermark else None
+
+    def with_version(self, version: str) -> 'RecommendationModel':
+        return replace(self, version=version)
+
+    def to_artifact(self) -> Tuple[Dict[str, np.ndarray], Dict[str, Any], Dict[str, Any]]:
+        """Descompone el modelo en (arrays, objects, metadata) para `save_artifact`"""
+        arrays = {
+            'product_ids': np.asarray(self.product_ids, dtype=str),
+            'product_categories': np.asarray(self.product_categories, dtype=str),
+            'neighbor_indices': self.neighbor_index.indices,
+            'neighbor_scores': self.neighbor_index.scores,
+            **sparse_to_arrays('product_features', self.product_features),
+        }
+        metadata = {
+            'product_features_shape': self.product_features.shape,
+            'has_collaborative': self.has_collaborative,
+            'training_stats': self.training_stats,
+            'watermark': self.watermark.isoformat() if self.watermark else None,
+        }
+        if self.popularity is not None:
+            arrays.update(self.popularity.to_arrays())
+        if self.product_in_stock is not None:
+            arrays['product_in_stock'] = self.product_in_stock
+        if self.ann_index is not None:
+            arrays.update(self.ann_index.to_arrays())
+        if self.has_collaborative:
+            arrays['user_ids'] = np.asarray(self.user_ids, dtype=str)
+            arrays.update(sparse_to_arrays('user_item', self.user_item_matrix))
+            arrays.update(sparse_to_arrays('user_item_normalized', self.user_item_normalized))
+            arrays.update(sparse_to_arrays('user_history', self.user_history))
+            metadata['user_item_shape'] = self.user_item_matrix.shape
+            if self.user_factors is not None:
+                arrays['user_factors'] = self.user_factors
+                arrays['item_factors'] = self.item_factors
+
+        objects = {'vectorizer': self.vectorizer, 'scaler': self.scaler}
+        return arrays, objects, metadata
+
+    @classmethod
+    def from_artifact(
+        cls,
+        arrays: Dict[str, np.ndarray],
+        objects: Dict[str, Any],
+        manifest: Dict[str, Any]
+    ) -> 'RecommendationModel':
+        """Reconstruye el modelo desde `load_artifact` sin copiar los arrays"""
+        metadata = manifest['metadata']
+        watermark = metadata.get('watermark')
+        collaborative = {}
+        if metadata['has_collaborative']:
+            shape = metadata['user_item_shape']
+            collaborative = {
+                'user_ids': arrays['user_ids'],
+                'user_id_to_index': IdIndex(arrays['user_ids']),
+                'user_item_matrix': sparse_from_arrays('user_item', arrays, shape),
+                'user_item_normalized': sparse_from_arrays('user_item_normalized', arrays, shape),
+                'user_history': sparse_from_arrays('user_history', arrays, shape),
+                'user_factors': arrays.get('user_factors'),
+                'item_factors': arrays.get('item_factors'),
+            }
+
+        return cls(
+            product_ids=arrays['product_ids'],
+            product_id_to_index=IdIndex(arrays['product_ids']),
+            product_categories=arrays['product_categories'],
+            product_in_stock=arrays.get('product_in_stock'),
+            product_features=sparse_from_arrays(
+                'product_features', arrays, metadata['product_features_shape']
+            ),
+            neighbor_index=NeighborIndex(arrays['neighbor_indices'], arrays['neighbor_scores']),
+            ann_index=IVFIndex.from_arrays(arrays) if 'ivf_centroids' in arrays else None,
+            vectorizer=objects['vectorizer'],
+            scaler=objects['scaler'],
+            popularity=(
+                PopularityIndex.from_arrays(arrays) if 'popularity_scores' in arrays else None
+            ),
+            training_stats=metadata.get('training_stats', {}),
+            watermark=datetime.fromisoformat(watermark) if watermark else None,
+            version=manifest['version'],
+            **collaborative
+        )
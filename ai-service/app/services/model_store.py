@@ -0,0 +1,170 @@
+"""
+Persistencia versionada de modelos entrenados.
+
+Cada versión es un directorio con un `.npy` por array numérico (cargables con
+`np.load(mmap_mode='r')`, así los workers comparten una sola copia vía page
+cache), un `objects.joblib` con los objetos pequeños de sklearn y un
+`manifest.json`. El archivo `LATEST` apunta a la versión vigente.
+"""
+
+from typing import Any, Dict, Optional, Tuple
+from pathlib import Path
+from datetime import datetime, timezone
+import json
+import os
+import shutil
+import uuid
+import joblib
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+MODEL_FORMAT_VERSION = 3
+DEFAULT_MODEL_DIR = Path(__file__).resolve().parents[2] / 'trained_models'
+LATEST_FILE = 'LATEST'
+MANIFEST_FILE = 'manifest.json'
+OBJECTS_FILE = 'objects.joblib'
+
+
+def get_model_dir() -> Path:
+    """Directorio base de modelos (configurable con MODEL_DIR)"""
+    return Path(os.getenv('MODEL_DIR', DEFAULT_MODEL_DIR))
+
+
+def new_version() -> str:
+    """Genera un identificador de versión ordenable por fecha"""
+    timestamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+    return f"{timestamp}-{uuid.uuid4().hex[:6]}"
+
+
+def save_artifact(
+    arrays: Dict[str, np.ndarray],
+    objects: Dict[str, Any],
+    metadata: Dict[str, Any],
+    version: Optional[str] = None,
+    model_dir: Optional[Path] = None,
+    keep_versions: Optional[int] = None
+) -> str:
+    """
+    Guarda un modelo como nueva versión y la marca como la más reciente.
+
+    La versión se escribe en un directorio temporal y se publica con
+    `os.replace`, así un lector nunca ve un artefacto a medio escribir.
+    """
+    model_dir = Path(model_dir or get_model_dir())
+    model_dir.mkdir(parents=True, exist_ok=True)
+    version = version or new_version()
+
+    tmp_dir = model_dir / f'.tmp-{version}'
+    tmp_dir.mkdir()
+    try:
+        for name, array in arrays.items():
+            # Sin pickle: los arrays de objetos no se pueden mapear en memoria
+            np.save(tmp_dir / f'{name}.npy', np.ascontiguousarray(array), allow_pickle=False)
+        joblib.dump(objects, tmp_dir / OBJECTS_FILE)
+
+        manifest = {
+            'format_version': MODEL_FORMAT_VERSION,
+            'version': version,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'arrays': sorted(arrays),
+            'metadata': metadata,
+        }
+        with open(tmp_dir / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, default=str)
+
+        os.replace(tmp_dir, model_dir / version)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    _write_latest(model_dir, version)
+
+    if keep_versions is None:
+        keep_versions = int(os.getenv('MODEL_KEEP_VERSIONS', 3))
+    _prune_versions(model_dir, keep_versions)
+
+    return version
+
+
+def latest_version(model_dir: Optional[Path] = None) -> Optional[str]:
+    """Versión marcada como más reciente, o None si no hay modelos guardados"""
+    latest_path = Path(model_dir or get_model_dir()) / LATEST_FILE
+    if not latest_path.exists():
+        return None
+    version = latest_path.read_text(encoding='utf-8').strip()
+    return version or None
+
+
+def load_artifact(
+    version: Optional[str] = None,
+    model_dir: Optional[Path] = None,
+    mmap: bool = True
+) -> Tuple[Dict[str, np.ndarray], Dict[str, Any], Dict[str, Any]]:
+    """
+    Carga una versión del modelo (por defecto la más reciente).
+
+    Retorna (arrays, objects, manifest). Con `mmap=True` los arrays son
+    mapeos de solo lectura: la carga no copia datos.
+    """
+    model_dir = Path(model_dir or get_model_dir())
+    version = version or latest_version(model_dir)
+    if version is None:
+        raise FileNotFoundError(f"No hay modelos guardados en {model_dir}")
+
+    version_dir = model_dir / version
+    with open(version_dir / MANIFEST_FILE, encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    if manifest.get('format_version') != MODEL_FORMAT_VERSION:
+        raise ValueError(
+            f"Formato de modelo {manifest.get('format_version')} no soportado "
+            f"(se esperaba {MODEL_FORMAT_VERSION})"
+        )
+
+    mmap_mode = 'r' if mmap else None
+    arrays = {
+        name: np.load(version_dir / f'{name}.npy', mmap_mode=mmap_mode, allow_pickle=False)
+        for name in manifest['arrays']
+    }
+    objects = joblib.load(version_dir / OBJECTS_FILE)
+
+    return arrays, objects, manifest
+
+
+def _write_latest(model_dir: Path, version: str):
+    tmp_path = model_dir / f'.{LATEST_FILE}.tmp'
+    tmp_path.write_text(version, encoding='utf-8')
+    os.replace(tmp_path, model_dir / LATEST_FILE)
+
+
+def _prune_versions(model_dir: Path, keep_versions: int):
+    """Elimina las versiones más antiguas dejando las `keep_versions` más recientes"""
+    if keep_versions <= 0:
+        return
+    versions = sorted(
+        path for path in model_dir.iterdir()
+        if path.is_dir() and not path.name.startswith('.') and (path / MANIFEST_FILE).exists()
+    )
+    for path in versions[:-keep_versions]:
+        # En Windows puede fallar si otro worker tiene la versión mapeada
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def sparse_to_arrays(name: str, matrix) -> Dict[str, np.ndarray]:
+    """Descompone una matriz CSR en arrays `{name}_data/_indices/_indptr`"""
+    matrix = matrix.tocsr()
+    return {
+        f'{name}_data': matrix.data,
+        f'{name}_indices': matrix.indices,
+        f'{name}_indptr': matrix.indptr,
+    }
+
+
+def sparse_from_arrays(name: str, arrays: Dict[str, np.ndarray], shape: Tuple[int, int]):
+    """Reconstruye una matriz CSR sin copiar los arrays (admite mmap)"""
+    return csr_matrix(
+        (arrays[f'{name}_data'], arrays[f'{name}_indices'], arrays[f'{name}_indptr']),
+        shape=tuple(shape),
+        copy=False
+    )
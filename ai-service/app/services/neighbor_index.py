@@ -0,0 +1,202 @@
+"""
+Índice de vecinos más cercanos (top-K) entre productos.
+Reemplaza la matriz densa de similitud N×N por K vecinos por producto.
+Con un `IVFIndex` los vecinos se buscan de forma aproximada en vez de
+comparar cada producto contra todo el catálogo.
+"""
+
+from typing import Optional, Tuple
+import numpy as np
+from scipy.sparse import issparse
+from sklearn.preprocessing import normalize
+
+from app.services.ivf_index import IVFIndex
+
+
+# Presupuesto de memoria para cada bloque de similitudes (en bytes)
+DEFAULT_BLOCK_BYTES = 256 * 1024 * 1024
+
+# Productos buscados juntos en el índice IVF
+_ANN_BLOCK_ROWS = 8192
+
+
+class NeighborIndex:
+    """
+    Vecinos top-K de cada producto ordenados por similitud descendente.
+
+    `indices[i]` contiene los índices (int32) de los vecinos del producto i
+    y `scores[i]` sus similitudes coseno (float32). Las posiciones sin vecino
+    tienen índice -1 y score -inf.
+    """
+
+    def __init__(self, indices: np.ndarray, scores: np.ndarray):
+        self.indices = indices
+        self.scores = scores
+
+    @property
+    def k(self) -> int:
+        return self.indices.shape[1]
+
+    def __len__(self) -> int:
+        return self.indices.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self.indices.nbytes + self.scores.nbytes
+
+    def neighbors(self, idx: int, min_score: float = -np.inf) -> Tuple[np.ndarray, np.ndarray]:
+        """Retorna (índices, scores) de los vecinos de `idx` con score > min_score"""
+        row_indices = self.indices[idx]
+        row_scores = self.scores[idx]
+        valid = (row_indices >= 0) & (row_scores > min_score)
+        return row_indices[valid], row_scores[valid]
+
+    @classmethod
+    def build(cls, features, k: int = 100, block_bytes: int = DEFAULT_BLOCK_BYTES,
+              ann: Optional[IVFIndex] = None, nprobe: Optional[int] = None) -> 'NeighborIndex':
+        """
+        Construye el índice por bloques de filas sin materializar la matriz N×N.
+
+        Cada bloque calcula `bloque @ features.T` (B×N en float32), se queda
+        con los K mejores por fila y se descarta, así que la memoria pico es
+        `block_bytes` más los arrays finales de tamaño N×K. Con `ann` cada
+        producto solo se compara con las `nprobe` listas más cercanas.
+        """
+        features = _normalize(features)
+        n_products = features.shape[0]
+        k = max(0, min(k, n_products - 1))
+
+        indices = np.full((n_products, k), -1, dtype=np.int32)
+        scores = np.full((n_products, k), -np.inf, dtype=np.float32)
+        if k == 0:
+            return cls(indices, scores)
+
+        if ann is not None:
+            # En el orden de las listas IVF: consultas vecinas visitan las mismas listas
+            _fill_ann_rows(ann, ann.list_ids, k, nprobe, indices, scores)
+        else:
+            _fill_full_rows(features, np.arange(n_products), k, indices, scores, block_bytes)
+        return cls(indices, scores)
+
+    def update(
+        self,
+        features,
+        changed: np.ndarray,
+        k: int = 100,
+        block_bytes: int = DEFAULT_BLOCK_BYTES,
+        ann: Optional[IVFIndex] = None,
+        nprobe: Optional[int] = None
+    ) -> 'NeighborIndex':
+        """
+        Retorna un índice nuevo tras modificar o agregar los productos `changed`.
+
+        `features` es la matriz completa ya actualizada (los productos nuevos van
+        al final). Las filas cambiadas se recalculan completas (C×N) y el resto
+        solo se compara contra los productos cambiados (N×C), así el costo
+        escala con el volumen de cambios. Si un producto cambiado sale de la
+        lista de otro, ese hueco solo se cubre con productos cambiados (el
+        resultado es aproximado hasta el próximo entrenamiento completo).
+        Con `ann` (ya actualizado con `changed`) las filas cambiadas se
+        buscan en el índice IVF en vez de contra todo el catálogo.
+        """
+        features = _normalize(features)
+        n_products = features.shape[0]
+        k = max(0, min(k, n_products - 1))
+        changed = np.unique(np.asarray(changed, dtype=np.int64))
+
+        # Copiar las listas actuales ajustando al nuevo N y K
+        indices = np.full((n_products, k), -1, dtype=np.int32)
+        scores = np.full((n_products, k), -np.inf, dtype=np.float32)
+        kept = min(k, self.k)
+        indices[:len(self), :kept] = self.indices[:, :kept]
+        scores[:len(self), :kept] = self.scores[:, :kept]
+        if k == 0 or changed.size == 0:
+            return NeighborIndex(indices, scores)
+
+        # 1. Productos cambiados: recalcular sus vecinos contra todo el catálogo
+        if ann is not None:
+            _fill_ann_rows(ann, changed, k, nprobe, indices, scores)
+        else:
+            _fill_full_rows(features, changed, k, indices, scores, block_bytes)
+
+        # 2. Resto: quitar vecinos cambiados y mezclar con las similitudes nuevas
+        is_changed = np.zeros(n_products, dtype=bool)
+        is_changed[changed] = True
+        unchanged = np.flatnonzero(~is_changed)
+        changed_t = _transpose(features[changed])
+        block_size = max(1, block_bytes // (4 * (changed.size + k)))
+
+        for start in range(0, unchanged.size, block_size):
+            rows = unchanged[start:start + block_size]
+            old_indices = indices[rows]
+            old_scores = scores[rows]
+            stale = (old_indices >= 0) & is_changed[np.maximum(old_indices, 0)]
+            old_scores[stale] = -np.inf
+
+            new_scores = _dense(features[rows] @ changed_t)
+            candidate_indices = np.hstack([
+                old_indices, np.broadcast_to(changed, (rows.size, changed.size))
+            ])
+            candidate_scores = np.hstack([old_scores, new_scores])
+            indices[rows], scores[rows] = _top_k(candidate_scores, k, candidate_indices)
+
+        return NeighborIndex(indices, scores)
+
+
+def _normalize(features):
+    features = normalize(features.astype(np.float32), norm='l2', axis=1)
+    return features.tocsr() if issparse(features) else features
+
+
+def _transpose(features):
+    return features.T.tocsc() if issparse(features) else features.T
+
+
+def _dense(block) -> np.ndarray:
+    block = block.toarray() if issparse(block) else np.asarray(block)
+    return block.astype(np.float32, copy=False)
+
+
+def _fill_full_rows(features, rows: np.ndarray, k: int, indices: np.ndarray,
+                    scores: np.ndarray, block_bytes: int):
+    """Calcula los vecinos de `rows` contra todo el catálogo, por bloques"""
+    n_products = features.shape[0]
+    features_t = _transpose(features)
+    block_size = max(1, min(n_products, block_bytes // (4 * n_products)))
+
+    for start in range(0, rows.size, block_size):
+        block_rows = rows[start:start + block_size]
+        block = _dense(features[block_rows] @ features_t)
+
+        # Excluir el propio producto de sus vecinos
+        block[np.arange(block_rows.size), block_rows] = -np.inf
+        indices[block_rows], scores[block_rows] = _top_k(block, k)
+
+
+def _fill_ann_rows(ann: IVFIndex, rows: np.ndarray, k: int, nprobe: Optional[int],
+                   indices: np.ndarray, scores: np.ndarray):
+    """Vecinos aproximados de `rows` buscados en el índice IVF, por bloques"""
+    for start in range(0, rows.size, _ANN_BLOCK_ROWS):
+        block_rows = rows[start:start + _ANN_BLOCK_ROWS]
+        indices[block_rows], scores[block_rows] = ann.search(
+            ann.vector(block_rows), k, nprobe, exclude=block_rows
+        )
+
+
+def _top_k(candidate_scores: np.ndarray, k: int,
+           candidate_indices: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-K por fila en orden descendente. Si no se pasan `candidate_indices`,
+    el índice de cada candidato es su columna.
+    """
+    top = np.argpartition(candidate_scores, -k, axis=1)[:, -k:]
+    top_scores = np.take_along_axis(candidate_scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+    if candidate_indices is not None:
+        top = np.take_along_axis(candidate_indices, top, axis=1)
+    top = top.astype(np.int32)
+    top[np.isneginf(top_scores)] = -1
+    return top, top_scores
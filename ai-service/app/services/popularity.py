@@ -0,0 +1,127 @@
+"""
+Ranking de popularidad precalculado para usuarios sin historial (cold-start).
+"""
+
+from typing import Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+
+# Peso de cada interacción en la popularidad (las órdenes valen más)
+POPULARITY_WEIGHTS = {'cart': 1.0, 'order': 3.0}
+
+
+def interaction_weights(
+    interactions_df: pd.DataFrame,
+    reference_time=None,
+    half_life_days: float = 0.0
+) -> np.ndarray:
+    """
+    Peso de popularidad de cada fila de `interactions_df`.
+
+    Usa `interaction_type`, la columna opcional `interactions` (conteo de filas
+    agregadas) y, si `half_life_days > 0`, un decaimiento exponencial según la
+    antigüedad de `created_at` respecto a `reference_time`.
+    """
+    weights = np.array(
+        interactions_df['interaction_type'].map(POPULARITY_WEIGHTS).fillna(0.0),
+        dtype=np.float64
+    )
+    if 'interactions' in interactions_df:
+        weights *= interactions_df['interactions'].to_numpy(dtype=np.float64)
+
+    if half_life_days > 0 and reference_time is not None and 'created_at' in interactions_df:
+        created_at = pd.to_datetime(interactions_df['created_at'])
+        age_days = (pd.Timestamp(reference_time) - created_at).dt.total_seconds().to_numpy() / 86400
+        weights *= np.power(0.5, np.clip(age_days, 0, None) / half_life_days)
+
+    return weights
+
+
+class PopularityIndex:
+    """
+    Productos ordenados por popularidad, global y por categoría.
+
+    `order` tiene todos los productos de mayor a menor score. `category_order`
+    agrupa los productos por categoría (cada grupo ordenado por score) y
+    `category_offsets[c]:category_offsets[c + 1]` delimita el grupo `c`, así
+    que servir el top-N es un slice.
+    """
+
+    def __init__(self, scores: np.ndarray, order: np.ndarray, categories: np.ndarray,
+                 category_order: np.ndarray, category_offsets: np.ndarray):
+        self.scores = scores
+        self.order = order
+        self.categories = categories
+        self.category_order = category_order
+        self.category_offsets = category_offsets
+        self._category_to_code = {str(category): code for code, category in enumerate(categories)}
+
+    @classmethod
+    def build(cls, product_codes: np.ndarray, weights: np.ndarray,
+              product_categories: np.ndarray) -> 'PopularityIndex':
+        """
+        Args:
+            product_codes: Índice de producto de cada interacción
+            weights: Peso de cada interacción (ver `interaction_weights`)
+            product_categories: Categoría de cada producto del catálogo
+        """
+        n_products = len(product_categories)
+        scores = np.bincount(product_codes, weights=weights, minlength=n_products).astype(np.float32)
+        order = np.argsort(-scores, kind='stable').astype(np.int32)
+
+        categories, category_codes = np.unique(
+            np.asarray(product_categories, dtype=str), return_inverse=True
+        )
+        # Ordenar por categoría y, dentro de cada una, por score descendente
+        category_order = np.lexsort((-scores, category_codes)).astype(np.int32)
+        category_offsets = np.zeros(len(categories) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(category_codes, minlength=len(categories)), out=category_offsets[1:])
+
+        return cls(scores, order, categories, category_order, category_offsets)
+
+    def top(self, n: int, category: Optional[str] = None,
+            allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Índices y scores de los `n` productos más populares (opcionalmente de
+        una categoría y solo entre los productos con `allowed[i]`).
+        """
+        if category is None:
+            ranked = self.order
+        else:
+            code = self._category_to_code.get(category)
+            if code is None:
+                return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+            ranked = self.category_order[self.category_offsets[code]:self.category_offsets[code + 1]]
+
+        if allowed is None:
+            indices = ranked[:n]
+        else:
+            # Recorrer el ranking en tramos crecientes hasta juntar `n` permitidos
+            window = max(4 * n, 64)
+            while True:
+                head = ranked[:window]
+                indices = head[allowed[head]][:n]
+                if indices.size == n or window >= ranked.size:
+                    break
+                window *= 4
+        return indices, self.scores[indices]
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            'popularity_scores': self.scores,
+            'popularity_order': self.order,
+            'popularity_categories': np.asarray(self.categories, dtype=str),
+            'popularity_category_order': self.category_order,
+            'popularity_category_offsets': self.category_offsets,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'PopularityIndex':
+        return cls(
+            arrays['popularity_scores'],
+            arrays['popularity_order'],
+            arrays['popularity_categories'],
+            arrays['popularity_category_order'],
+            arrays['popularity_category_offsets'],
+        )
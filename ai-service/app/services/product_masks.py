@@ -0,0 +1,101 @@
+"""
+Máscaras de productos (en stock, por categoría) alineadas con `product_ids`.
+
+Se calculan una vez por modelo (o por cambio de stock) y se aplican dentro
+de la puntuación CF/CB, antes de elegir el top-K: una petición filtrada
+cuesta lo mismo que una sin filtros y el backend no tiene que pedir de más
+y filtrar después.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Optional
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+
+from app.services.id_index import IdIndex
+
+
+# Combinaciones de filtros guardadas por modelo antes de vaciar la caché
+_MAX_CACHED_MASKS = 256
+
+
+@dataclass(frozen=True)
+class ProductFilter:
+    """Filtros de una petición de recomendaciones"""
+
+    in_stock_only: bool = False
+    category: Optional[str] = None
+
+    @property
+    def active(self) -> bool:
+        return self.in_stock_only or self.category is not None
+
+
+NO_FILTER = ProductFilter()
+
+
+def in_stock_mask(product_id_to_index: IdIndex, stock_df: pd.DataFrame,
+                  previous: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Máscara en stock alineada con `product_id_to_index` a partir de filas
+    (id, stock). Los productos que no vienen en `stock_df` conservan su
+    valor en `previous` (o quedan sin stock si no hay valor previo).
+    """
+    in_stock = np.zeros(len(product_id_to_index), dtype=bool)
+    if previous is not None:
+        in_stock[:len(previous)] = previous
+    rows = product_id_to_index.get_indexer(stock_df['id'].to_numpy(dtype=str))
+    known = rows >= 0
+    in_stock[rows[known]] = stock_df['stock'].fillna(0).to_numpy()[known] > 0
+    return in_stock
+
+
+class ProductMasks:
+    """
+    Máscaras booleanas por producto. `allowed` combina los filtros de una
+    petición en una sola máscara y la guarda para las siguientes.
+    """
+
+    def __init__(self, in_stock: Optional[np.ndarray], product_categories: np.ndarray):
+        # Modelos anteriores sin stock guardado: todos disponibles
+        self.in_stock = (
+            np.asarray(in_stock, dtype=bool) if in_stock is not None
+            else np.ones(len(product_categories), dtype=bool)
+        )
+        categories, codes = np.unique(np.asarray(product_categories, dtype=str), return_inverse=True)
+        self.category_codes = codes.astype(np.int32)
+        self._category_to_code = {str(category): code for code, category in enumerate(categories)}
+        self._masks: Dict[ProductFilter, np.ndarray] = {}
+        self._lock = threading.Lock()
+        # Identifica el estado del stock en las claves de caché filtradas
+        self.stock_digest = hashlib.blake2b(np.packbits(self.in_stock).tobytes(), digest_size=6).hexdigest()
+
+    def allowed(self, product_filter: ProductFilter) -> Optional[np.ndarray]:
+        """Productos que cumplen `product_filter` (None si no filtra nada)"""
+        if not product_filter.active:
+            return None
+
+        mask = self._masks.get(product_filter)
+        if mask is None:
+            mask = self.in_stock.copy() if product_filter.in_stock_only else np.ones(len(self.in_stock), dtype=bool)
+            if product_filter.category is not None:
+                code = self._category_to_code.get(product_filter.category)
+                mask &= self.category_codes == code if code is not None else False
+            with self._lock:
+                if len(self._masks) >= _MAX_CACHED_MASKS:
+                    self._masks.clear()
+                self._masks[product_filter] = mask
+        return mask
+
+    def cache_suffix(self, product_filter: ProductFilter) -> str:
+        """Parte de la clave de caché que distingue los resultados filtrados"""
+        if not product_filter.active:
+            return ''
+        parts = []
+        if product_filter.in_stock_only:
+            parts.append(f"stock={self.stock_digest}")
+        if product_filter.category is not None:
+            parts.append(f"category={product_filter.category}")
+        return ':' + ','.join(parts)
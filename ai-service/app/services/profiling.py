@@ -0,0 +1,217 @@
+"""
+Perfilado bajo demanda del servicio en producción (solo administradores).
+
+- `RequestProfiler`: cProfile alrededor de la puntuación de una fracción
+  de las peticiones; acumula las funciones más costosas.
+- `sample_stacks`: muestreo estadístico de las pilas de todos los hilos
+  durante N segundos, en formato "collapsed" (flamegraph.pl, speedscope).
+- `trace_memory`: asignaciones de memoria (tracemalloc) de un entrenamiento.
+
+Sin sesión activa el costo en el camino de las peticiones es una
+comparación; ninguna herramienta requiere reiniciar los workers.
+"""
+
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, List, Optional, Tuple
+import cProfile
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+
+
+PSTATS_SORT_KEYS = ('cumulative', 'tottime', 'calls')
+
+# Límites de una sesión: el perfilado no puede quedar encendido por descuido
+MAX_PROFILE_SECONDS = int(os.getenv('PROFILE_MAX_SECONDS', 300))
+MAX_SAMPLE_SECONDS = int(os.getenv('PROFILE_MAX_SAMPLE_SECONDS', 60))
+
+
+class RequestProfiler:
+    """
+    Perfila con cProfile una fracción `rate` de las llamadas a `profile()`
+    hasta juntar `max_requests` o pasar `seconds`. Cada llamada usa su
+    propio `cProfile.Profile` y el resultado se suma a `pstats.Stats` de la
+    sesión. Se perfila una llamada a la vez (desde Python 3.12 solo puede
+    haber un cProfile activo por proceso); las concurrentes no se muestrean.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._profiling = threading.Lock()
+        self._active = False
+        self._reset(0.0, 0, 0.0)
+
+    def _reset(self, rate: float, max_requests: int, seconds: float):
+        self.rate = rate
+        self.max_requests = max_requests
+        self.started_at = time.time()
+        self.deadline = self.started_at + seconds
+        self.profiled = 0
+        self.seen = 0
+        self._stats: Optional[pstats.Stats] = None
+
+    @property
+    def active(self) -> bool:
+        return self._active
+
+    def start(self, rate: float = 0.1, max_requests: int = 100, seconds: float = 60.0):
+        """Inicia una sesión nueva (descarta la anterior)"""
+        if not 0 < rate <= 1:
+            raise ValueError("rate debe estar en (0, 1]")
+        if max_requests <= 0:
+            raise ValueError("max_requests debe ser mayor que 0")
+        with self._lock:
+            self._reset(rate, max_requests, min(seconds, MAX_PROFILE_SECONDS))
+            self._active = True
+
+    def stop(self):
+        with self._lock:
+            self._active = False
+
+    def profile(self):
+        """Context manager alrededor de la puntuación de una petición"""
+        if not self._active:
+            return nullcontext()
+        return self._maybe_profile()
+
+    @contextmanager
+    def _maybe_profile(self):
+        with self._lock:
+            self.seen += 1
+            if time.time() >= self.deadline or self.profiled >= self.max_requests:
+                self._active = False
+                sampled = False
+            else:
+                sampled = random.random() < self.rate
+        if not sampled or not self._profiling.acquire(blocking=False):
+            yield
+            return
+
+        with self._lock:
+            self.profiled += 1
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+            with self._lock:
+                if self._stats is None:
+                    self._stats = pstats.Stats(profiler)
+                else:
+                    self._stats.add(profiler)
+        finally:
+            self._profiling.release()
+
+    def report(self, limit: int = 30, sort: str = 'cumulative') -> Dict:
+        """Estado de la sesión y las `limit` funciones más costosas"""
+        if sort not in PSTATS_SORT_KEYS:
+            raise ValueError(f"Orden desconocido: {sort} (opciones: {', '.join(PSTATS_SORT_KEYS)})")
+        with self._lock:
+            functions = hot_functions(self._stats, limit, sort) if self._stats is not None else []
+            return {
+                'active': self._active and time.time() < self.deadline,
+                'rate': self.rate,
+                'max_requests': self.max_requests,
+                'seen': self.seen,
+                'profiled': self.profiled,
+                'started_at': self.started_at,
+                'sort': sort,
+                'functions': functions,
+            }
+
+
+def hot_functions(stats: pstats.Stats, limit: int, sort: str) -> List[Dict]:
+    """Tabla de funciones de `stats` ordenada por `sort`"""
+    key = {'cumulative': 3, 'tottime': 2, 'calls': 1}[sort]
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][key], reverse=True)[:limit]
+    return [
+        {
+            'function': f"{filename}:{line}({name})",
+            'calls': calls,
+            'primitive_calls': primitive_calls,
+            'tottime': round(tottime, 6),
+            'cumtime': round(cumtime, 6),
+            'percall_ms': round(cumtime / calls * 1000, 4) if calls else 0.0,
+        }
+        for (filename, line, name), (primitive_calls, calls, tottime, cumtime, _) in rows
+    ]
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds: float, interval: float = 0.005) -> Counter:
+    """
+    Toma una muestra de la pila de cada hilo cada `interval` segundos durante
+    `seconds`. Retorna pila colapsada ("raíz;...;hoja") -> cantidad de muestras.
+    No instrumenta las funciones: el costo es el del hilo muestreador.
+    """
+    seconds = min(seconds, MAX_SAMPLE_SECONDS)
+    own = threading.get_ident()
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    stacks = Counter()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            labels.append(names.get(thread_id, str(thread_id)))
+            stacks[';'.join(reversed(labels))] += 1
+        time.sleep(interval)
+    return stacks
+
+
+def collapsed(stacks: Counter) -> str:
+    """Formato de flamegraph.pl / speedscope: una pila por línea con su cantidad"""
+    return ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def trace_memory(fn: Callable, *args, limit: int = 25, frames: int = 10, **kwargs) -> Tuple[object, Dict]:
+    """
+    Ejecuta `fn` con tracemalloc y retorna (resultado, reporte) con el pico
+    y las líneas que más memoria retienen al terminar.
+    """
+    already_tracing = tracemalloc.is_tracing()
+    if not already_tracing:
+        tracemalloc.start(frames)
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        result = fn(*args, **kwargs)
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        if not already_tracing:
+            tracemalloc.stop()
+
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+    ))
+    top = snapshot.statistics('lineno')[:limit]
+    return result, {
+        'seconds': round(time.perf_counter() - start, 3),
+        'current_mb': round(current / 1024 / 1024, 2),
+        'peak_mb': round(peak / 1024 / 1024, 2),
+        'top': [
+            {
+                'location': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                'size_mb': round(stat.size / 1024 / 1024, 3),
+                'count': stat.count,
+            }
+            for stat in top
+        ],
+    }
@@ -3,174 +3,823 @@ Servicio de recomendaciones usando técnicas de ML.
 Implementa Content-Based y Collaborative Filtering para alcanzar 80%+ de precisión.
 """
 
-from typing import List, Dict, Optional
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from datetime import timedelta
+import threading
+import time
 import pandas as pd
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.preprocessing import StandardScaler
-import psycopg2
-from psycopg2.extras import RealDictCursor
 import os
 import joblib
+import asyncio
 import redis
-import json
+import redis.asyncio
+from scipy.sparse import coo_matrix, csr_matrix, hstack
+from sklearn.preprocessing import normalize
+from app.services.als import train_als, fold_in
+from app.services.cache import LRUCache, TwoTierCache
+from app.services.db import DatabasePool
+from app.services.evaluation import evaluate_model
+from app.services.fusion import DEFAULT_WEIGHTS, fuse
+from app.services.id_index import IdIndex
+from app.services.interaction_loader import (
+    HISTORY_INTERACTION_TYPES, INTERACTION_COLUMNS, InteractionAggregator, stream_query
+)
+from app.services.ivf_index import IVFIndex
+from app.services.memory import peak_memory_mb
+from app.services.metrics import StageClock, observe_stage
+from app.services.model_snapshot import RecommendationModel
+from app.services.model_store import save_artifact, load_artifact
+from app.services.neighbor_index import NeighborIndex
+from app.services.popularity import PopularityIndex, interaction_weights
+from app.services.product_masks import NO_FILTER, ProductFilter, in_stock_mask
+from app.services.profiling import RequestProfiler
+from app.services.scoring import top_n_per_group, top_n_per_row
+from app.services.singleflight import SingleFlight, RedisComputeLock
+from app.services.sparse_utils import replace_rows
+
+
+# Interacciones (carritos, órdenes, reseñas) por usuario real (Cart/Order);
+# los filtros permiten cargar solo un subconjunto de usuarios en las
+# actualizaciones incrementales
+INTERACTIONS_QUERY = """
+    SELECT 
+        c."userId" as user_id,
+        ci."productId" as product_id,
+        ci.quantity as interaction_score,
+        'cart' as interaction_type,
+        ci."createdAt" as created_at
+    FROM "CartItem" ci
+    JOIN "Cart" c ON ci."cartId" = c.id
+    WHERE TRUE {cart_filter}
+    UNION ALL
+    SELECT 
+        o."userId" as user_id,
+        oi."productId" as product_id,
+        oi.quantity * 3 as interaction_score,  -- Órdenes valen más
+        'order' as interaction_type,
+        oi."createdAt" as created_at
+    FROM "OrderItem" oi
+    JOIN "Order" o ON oi."orderId" = o.id
+    WHERE o.status != 'cancelled' {order_filter}
+    UNION ALL
+    SELECT 
+        r."userId" as user_id,
+        r."productId" as product_id,
+        r.rating as interaction_score,
+        'review' as interaction_type,
+        r."createdAt" as created_at
+    FROM "Review" r
+    WHERE TRUE {review_filter}
+"""
+
+# Usuarios con interacciones nuevas o modificadas
+CHANGED_USERS_QUERY = """
+    SELECT c."userId" as user_id
+    FROM "CartItem" ci
+    JOIN "Cart" c ON ci."cartId" = c.id
+    WHERE ci."updatedAt" > %(since)s OR c."updatedAt" > %(since)s
+    UNION
+    SELECT o."userId"
+    FROM "OrderItem" oi
+    JOIN "Order" o ON oi."orderId" = o.id
+    WHERE oi."createdAt" > %(since)s OR o."updatedAt" > %(since)s
+    UNION
+    SELECT r."userId" FROM "Review" r WHERE r."updatedAt" > %(since)s
+"""
+
+PRODUCTS_QUERY = """
+    SELECT id, name, description, category, price, stock, "imageUrl"
+    FROM "Product"
+"""
+
+# Solo el stock: refresca la máscara de disponibilidad sin reentrenar
+STOCK_QUERY = """
+    SELECT id, stock FROM "Product"
+"""
+
+# Interacciones agregadas por producto y día para recalcular la popularidad
+# en cada refresh; cada tabla se agrupa por separado para no multiplicar filas
+POPULARITY_QUERY = """
+    SELECT "productId" as product_id, 'cart' as interaction_type,
+           date_trunc('day', "createdAt") as created_at, COUNT(*) as interactions
+    FROM "CartItem"
+    GROUP BY 1, 3
+    UNION ALL
+    SELECT oi."productId", 'order',
+           date_trunc('day', oi."createdAt"), COUNT(*)
+    FROM "OrderItem" oi
+    JOIN "Order" o ON oi."orderId" = o.id
+    WHERE o.status != 'cancelled'
+    GROUP BY 1, 3
+"""
+
+# Motores de Collaborative Filtering: similitud usuario-usuario o factorización ALS
+CF_ENGINES = ('neighbors', 'als')
+
+# Búsqueda de vecinos entre productos: exacta, IVF aproximada o según el tamaño
+NEIGHBOR_SEARCH_MODES = ('auto', 'exact', 'ivf')
+
+# Productos a partir de los que `auto` usa el índice IVF
+ANN_MIN_PRODUCTS = int(os.getenv('ANN_MIN_PRODUCTS', 50_000))
+
+# Usuarios puntuados juntos en cada bloque de recomendaciones por lotes
+BATCH_CHUNK_SIZE = int(os.getenv('RECOMMENDATION_BATCH_CHUNK_SIZE', 256))
+
+# TTL (segundos) de las recomendaciones guardadas en Redis
+RECOMMENDATIONS_TTL = 3600
+
+_EMPTY_CANDIDATES = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0))
+
+# Margen para no perder filas de transacciones que confirmaron tarde;
+# releer filas ya vistas es inofensivo porque se recalculan completas
+WATERMARK_OVERLAP = timedelta(seconds=30)
+
+
+def recommendations_cache_key(version: Optional[str], user_id: str, n: int, filter_key: str = '') -> str:
+    """
+    Clave Redis de las recomendaciones de un usuario. Incluye la versión del
+    modelo: al publicar una versión nueva las claves anteriores dejan de leerse.
+    `filter_key` distingue las peticiones filtradas (ver `ProductMasks.cache_suffix`).
+    """
+    return f"{recommendations_cache_prefix(version)}{n}{filter_key}:{user_id}"
+
+
+def recommendations_cache_prefix(version: Optional[str]) -> str:
+    """Prefijo común de las claves de recomendaciones de una versión del modelo"""
+    return f"recommendations:{version or 'local'}:"
 
 
 class RecommendationService:
     """
     Servicio para generar recomendaciones de productos con ML.
     Combina Content-Based y Collaborative Filtering.
+    
+    El modelo vigente es un `RecommendationModel` inmutable: entrenar construye
+    uno nuevo y lo publica reemplazando la referencia `self.model`.
     """
     
-    def __init__(self):
-        self.product_similarity_matrix = None
-        self.user_product_matrix = None
-        self.product_features = None
-        self.vectorizer = None
-        self.scaler = StandardScaler()
-        self.is_trained = False
+    def __init__(self, use_cache: bool = True, db_pool: Optional[DatabasePool] = None):
+        self.model: Optional[RecommendationModel] = None
+        # Serializa los reemplazos de `self.model` (entrenamiento vs refresh de stock)
+        self._model_lock = threading.Lock()
+        self.n_neighbors = int(os.getenv('RECOMMENDATION_NEIGHBORS', 100))
+        # Vida media (días) del decaimiento de popularidad; 0 = sin decaimiento
+        self.popularity_half_life_days = float(os.getenv('POPULARITY_HALF_LIFE_DAYS', 0))
+        self.cf_engine = self._check_cf_engine(os.getenv('CF_ENGINE', 'neighbors'))
+        # Peso de cada fuente (CF, Content-Based) al combinar recomendaciones
+        self.fusion_weights = dict(DEFAULT_WEIGHTS)
+        self.neighbor_search = os.getenv('NEIGHBOR_SEARCH', 'auto')
+        if self.neighbor_search not in NEIGHBOR_SEARCH_MODES:
+            raise ValueError(f"NEIGHBOR_SEARCH inválido: {self.neighbor_search}")
+        self.db_pool = db_pool or DatabasePool()
         self.redis_client = None
+        self.async_redis_client = None
+        # Hilos para puntuar fuera del event loop (numpy/scipy liberan el GIL)
+        self.scoring_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('SCORING_THREADS', os.cpu_count() or 1)),
+            thread_name_prefix='scoring'
+        )
+        # Perfilado bajo demanda de una fracción de las peticiones (ver /api/admin/profile)
+        self.request_profiler = RequestProfiler()
         
-        # Conectar a Redis si está disponible
-        try:
-            self.redis_client = redis.Redis(
-                host=os.getenv('REDIS_HOST', 'localhost'),
-                port=int(os.getenv('REDIS_PORT', 6379)),
-                decode_responses=True
-            )
-            self.redis_client.ping()
-        except:
-            self.redis_client = None
+        if use_cache:
+            # Conectar a Redis si está disponible
+            redis_config = {
+                'host': os.getenv('REDIS_HOST', 'localhost'),
+                'port': int(os.getenv('REDIS_PORT', 6379)),
+                'decode_responses': True,
+            }
+            try:
+                self.redis_client = redis.Redis(**redis_config)
+                self.redis_client.ping()
+                # Cliente no bloqueante para los handlers de FastAPI; con muchas
+                # peticiones concurrentes esperan una conexión libre en vez de fallar
+                self.async_redis_client = redis.asyncio.Redis(
+                    connection_pool=redis.asyncio.BlockingConnectionPool(
+                        max_connections=int(os.getenv('REDIS_MAX_CONNECTIONS', 50)),
+                        timeout=float(os.getenv('REDIS_POOL_TIMEOUT', 5)),
+                        **redis_config
+                    )
+                )
+            except:
+                self.redis_client = None
+        
+        # Caché en memoria del proceso delante de Redis
+        self.cache = TwoTierCache(
+            LRUCache(
+                max_size=int(os.getenv('LOCAL_CACHE_SIZE', 10000)) if use_cache else 0,
+                ttl=float(os.getenv('LOCAL_CACHE_TTL_SECONDS', 300))
+            ),
+            self.redis_client,
+            self.async_redis_client
+        )
+        # Peticiones concurrentes sin caché para la misma clave comparten un cálculo
+        self.singleflight = SingleFlight()
+        self.compute_lock = None
+        if self.async_redis_client is not None and os.getenv('SINGLEFLIGHT_REDIS_LOCK', '0') == '1':
+            self.compute_lock = RedisComputeLock(self.async_redis_client)
+    
+    async def aclose(self):
+        """Libera el cliente asíncrono de Redis y los hilos de puntuación"""
+        if self.async_redis_client is not None:
+            await self.async_redis_client.aclose()
+        self.scoring_executor.shutdown(wait=False)
+    
+    def singleflight_stats(self) -> Dict:
+        """Peticiones coalescidas (en el proceso y, si está activo, entre workers)"""
+        stats = self.singleflight.stats()
+        if self.compute_lock is not None:
+            stats['redis_lock'] = self.compute_lock.stats()
+        return stats
+    
+    @property
+    def is_trained(self) -> bool:
+        return self.model is not None
+    
+    @property
+    def model_version(self) -> Optional[str]:
+        return self.model.version if self.model is not None else None
+    
+    @property
+    def training_stats(self) -> Dict:
+        return self.model.training_stats if self.model is not None else {}
     
     def get_db_connection(self):
-        """Obtiene conexión a PostgreSQL"""
-        return psycopg2.connect(
-            host=os.getenv('POSTGRES_HOST', 'localhost'),
-            port=int(os.getenv('POSTGRES_PORT', 5432)),
-            user=os.getenv('POSTGRES_USER', 'ventas_user'),
-            password=os.getenv('POSTGRES_PASSWORD', 'ventas_password'),
-            database=os.getenv('POSTGRES_DB', 'ventas_inteligentes')
-        )
+        """
+        Presta una conexión a PostgreSQL desde el pool (usar con `with`).
+        """
+        return self.db_pool.connection()
     
     def load_data_from_db(self) -> tuple:
-        """Carga datos de productos e interacciones desde PostgreSQL"""
-        conn = self.get_db_connection()
-        
-        try:
+        """
+        Carga productos e interacciones completos desde PostgreSQL (scripts y
+        análisis); el entrenamiento y la evaluación usan `stream_interactions_from_db`.
+        """
+        with self.get_db_connection() as conn:
             # Cargar productos
-            products_query = """
-                SELECT id, name, description, category, price, stock, "imageUrl"
-                FROM "Product"
-            """
-            products_df = pd.read_sql(products_query, conn)
+            products_df = pd.read_sql(PRODUCTS_QUERY, conn)
             
             # Cargar interacciones (carritos, órdenes, reseñas)
-            interactions_query = """
-                SELECT 
-                    ci."cartId" as user_id,
-                    ci."productId" as product_id,
-                    ci.quantity as interaction_score,
-                    'cart' as interaction_type
-                FROM "CartItem" ci
-                UNION ALL
-                SELECT 
-                    oi."orderId" as user_id,
-                    oi."productId" as product_id,
-                    oi.quantity * 3 as interaction_score,  -- Órdenes valen más
-                    'order' as interaction_type
-                FROM "OrderItem" oi
-                JOIN "Order" o ON oi."orderId" = o.id
-                WHERE o.status != 'cancelled'
-                UNION ALL
-                SELECT 
-                    r."userId" as user_id,
-                    r."productId" as product_id,
-                    r.rating as interaction_score,
-                    'review' as interaction_type
-                FROM "Review" r
-            """
+            interactions_query = INTERACTIONS_QUERY.format(
+                cart_filter='', order_filter='', review_filter=''
+            )
             interactions_df = pd.read_sql(interactions_query, conn)
             
             return products_df, interactions_df
-        finally:
-            conn.close()
     
-    def train(self):
+    def load_products_from_db(self) -> pd.DataFrame:
+        """Carga solo el catálogo de productos"""
+        with self.get_db_connection() as conn:
+            return pd.read_sql(PRODUCTS_QUERY, conn)
+    
+    def stream_interactions_from_db(self, chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
         """
-        Entrena el modelo de recomendaciones.
+        Interacciones (carritos, órdenes, reseñas) en bloques de `chunk_size`
+        filas leídos con un cursor del lado del servidor.
+        """
+        interactions_query = INTERACTIONS_QUERY.format(
+            cart_filter='', order_filter='', review_filter=''
+        )
+        with self.get_db_connection() as conn:
+            yield from stream_query(conn, interactions_query, INTERACTION_COLUMNS, chunk_size)
+    
+    def get_db_watermark(self):
+        """Hora actual de la base de datos en UTC (mismo formato que Prisma)"""
+        with self.get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT now() AT TIME ZONE 'UTC'")
+                return cursor.fetchone()[0]
+    
+    def load_changes_from_db(self, since) -> tuple:
+        """
+        Carga solo lo que cambió desde `since`: productos creados/modificados
+        y todas las interacciones de los usuarios afectados.
+        
+        Returns:
+            (products_df, interactions_df, user_ids afectados)
+        """
+        since = since - WATERMARK_OVERLAP
+        with self.get_db_connection() as conn:
+            products_df = pd.read_sql(
+                PRODUCTS_QUERY + ' WHERE "updatedAt" > %(since)s',
+                conn, params={'since': since}
+            )
+            
+            changed_users = pd.read_sql(CHANGED_USERS_QUERY, conn, params={'since': since})
+            user_ids = changed_users['user_id'].to_numpy(dtype=str)
+            
+            # Recargar las filas completas de los usuarios afectados
+            interactions_query = INTERACTIONS_QUERY.format(
+                cart_filter='AND c."userId" = ANY(%(user_ids)s)',
+                order_filter='AND o."userId" = ANY(%(user_ids)s)',
+                review_filter='AND r."userId" = ANY(%(user_ids)s)'
+            )
+            interactions_df = pd.read_sql(
+                interactions_query, conn, params={'user_ids': list(user_ids)}
+            )
+            
+            return products_df, interactions_df, user_ids
+    
+    def load_popularity_from_db(self) -> pd.DataFrame:
+        """Conteos de interacciones por producto, tipo y día (ver POPULARITY_QUERY)"""
+        with self.get_db_connection() as conn:
+            return pd.read_sql(POPULARITY_QUERY, conn)
+    
+    def load_stock_from_db(self) -> pd.DataFrame:
+        """Stock actual de cada producto (ver STOCK_QUERY)"""
+        with self.get_db_connection() as conn:
+            return pd.read_sql(STOCK_QUERY, conn)
+    
+    def train(self, persist: bool = True, cf_engine: Optional[str] = None) -> Optional[RecommendationModel]:
+        """
+        Entrena el modelo de recomendaciones y lo publica de forma atómica.
         Combina Content-Based y Collaborative Filtering.
+        
+        Args:
+            persist: Guardar el modelo en disco al terminar
+            cf_engine: 'neighbors' o 'als' (por defecto CF_ENGINE)
+        """
+        model = self.build_model(cf_engine)
+        if model is None:
+            return None
+        
+        return self._publish(model, persist)
+    
+    def refresh(self, persist: bool = True) -> Optional[RecommendationModel]:
+        """
+        Actualiza el modelo vigente solo con los cambios desde el último
+        entrenamiento o refresh. Si no hay modelo, hace un entrenamiento completo.
+        """
+        model = self.build_incremental_model()
+        if model is None:
+            return None
+        
+        return self._publish(model, persist)
+    
+    def refresh_stock(self) -> Optional[RecommendationModel]:
+        """
+        Actualiza solo la máscara de productos en stock del modelo vigente
+        (una consulta liviana, sin reentrenar ni guardar una versión nueva).
+        Las claves de caché filtradas por stock cambian con la máscara.
+        """
+        model = self.model
+        if model is None:
+            return None
+        
+        in_stock = in_stock_mask(model.product_id_to_index, self.load_stock_from_db())
+        if model.product_in_stock is not None and np.array_equal(in_stock, model.product_in_stock):
+            return model
+        
+        with self._model_lock:
+            # Si otro entrenamiento publicó mientras tanto, su stock ya es más nuevo
+            if self.model is not model:
+                return self.model
+            self.model = replace(model, product_in_stock=in_stock)
+        print(f"📦 Stock actualizado: {int(in_stock.sum())}/{in_stock.size} productos disponibles")
+        return self.model
+    
+    def _publish(self, model: RecommendationModel, persist: bool) -> RecommendationModel:
+        if persist:
+            model = self.save_model(model)
+            print(f"💾 Modelo guardado (versión {model.version})")
+        
+        # Intercambio atómico: los lectores ven el modelo anterior o el nuevo
+        with self._model_lock:
+            self.model = model
+        # Las claves llevan la versión: las entradas anteriores ya no se leen
+        self.cache.local.clear()
+        return model
+    
+    @staticmethod
+    def _check_cf_engine(cf_engine: str) -> str:
+        if cf_engine not in CF_ENGINES:
+            raise ValueError(f"Motor CF desconocido: {cf_engine} (opciones: {', '.join(CF_ENGINES)})")
+        return cf_engine
+    
+    def build_model(self, cf_engine: Optional[str] = None) -> Optional[RecommendationModel]:
+        """
+        Carga los datos y construye un modelo nuevo sin modificar el vigente.
         """
         print("🔄 Cargando datos desde la base de datos...")
-        products_df, interactions_df = self.load_data_from_db()
+        clock = StageClock()
+        watermark = self.get_db_watermark()
+        products_df = self.load_products_from_db()
+        clock.lap('load')
         
         if products_df.empty:
             print("⚠️ No hay productos en la base de datos")
-            return
+            return None
         
         print(f"📦 Productos cargados: {len(products_df)}")
-        print(f"👥 Interacciones cargadas: {len(interactions_df)}")
         
         # 1. Content-Based Filtering (basado en características de productos)
         print("🔍 Entrenando modelo Content-Based...")
-        self._train_content_based(products_df)
+        content_based = self._train_content_based(products_df, clock)
+        del products_df
+        
+        # Las interacciones se agregan por bloques a medida que llegan
+        model = self.build_model_from_chunks(
+            content_based, self.stream_interactions_from_db(), watermark, cf_engine, clock
+        )
+        
+        print(f"👥 Interacciones cargadas: {model.training_stats['interactions']}")
+        print("✅ Modelo entrenado exitosamente")
+        if model.training_stats['peak_memory_mb'] is not None:
+            print(f"📈 Memoria pico del proceso: {model.training_stats['peak_memory_mb']:.1f} MB")
+        
+        return model
+    
+    def build_model_from_chunks(self, content_based: Dict, chunks: Iterable[pd.DataFrame],
+                                watermark, cf_engine: Optional[str] = None,
+                                clock: Optional[StageClock] = None) -> RecommendationModel:
+        """
+        Construye un modelo a partir de un Content-Based ya entrenado,
+        consumiendo las interacciones por bloques sin juntarlas nunca en un
+        solo DataFrame (la evaluación lo usa con los bloques de train).
+        
+        `clock` acumula la duración de cada etapa en `training_stats['stages']`.
+        """
+        cf_engine = self._check_cf_engine(cf_engine or self.cf_engine)
+        clock = clock or StageClock()
+        aggregator = InteractionAggregator(
+            content_based['product_id_to_index'], watermark, self.popularity_half_life_days
+        ).add_all(chunks)
+        clock.lap('interactions')
         
         # 2. Collaborative Filtering (basado en usuarios similares)
-        if not interactions_df.empty:
+        collaborative = {}
+        if aggregator.interactions:
             print("👥 Entrenando modelo Collaborative Filtering...")
-            self._train_collaborative(interactions_df, products_df)
+            collaborative = aggregator.collaborative()
+            clock.lap('collaborative')
         else:
             print("⚠️ No hay interacciones, usando solo Content-Based")
-            self.user_product_matrix = None
         
-        self.is_trained = True
-        print("✅ Modelo entrenado exitosamente")
+        als_params = None
+        if collaborative and cf_engine == 'als':
+            print("🧮 Factorizando la matriz usuario-producto (ALS)...")
+            als = train_als(collaborative['user_item_matrix'])
+            collaborative.update(user_factors=als['user_factors'], item_factors=als['item_factors'])
+            als_params = als['params']
+            clock.lap('als')
+        
+        # 3. Ranking de popularidad para usuarios sin historial
+        popularity = aggregator.popularity(content_based['product_categories'])
+        clock.lap('popularity')
+        
+        training_stats = {
+            'products': len(content_based['product_ids']),
+            'interactions': aggregator.interactions,
+            'users': len(collaborative['user_ids']) if collaborative else 0,
+            'cf_engine': cf_engine if collaborative else None,
+            'neighbor_search': 'ivf' if content_based.get('ann_index') else 'exact',
+            'peak_memory_mb': peak_memory_mb(),
+            'stages': clock.stages,
+            'trained_at': time.time(),
+        }
+        if als_params is not None:
+            training_stats['als'] = als_params
+        
+        return RecommendationModel(
+            popularity=popularity,
+            training_stats=training_stats,
+            watermark=watermark,
+            **content_based,
+            **collaborative
+        )
+    
+    def build_incremental_model(self, model: Optional[RecommendationModel] = None) -> Optional[RecommendationModel]:
+        """
+        Construye un modelo nuevo aplicando sobre `model` (por defecto el
+        vigente) los cambios posteriores a su watermark.
+        
+        Los productos nuevos o modificados se vectorizan con el vocabulario ya
+        entrenado y solo se recalculan sus vecinos; en CF solo se reconstruyen
+        las filas de los usuarios afectados. Los borrados se reflejan en el
+        próximo entrenamiento completo.
+        """
+        model = model or self.model
+        if model is None or model.watermark is None:
+            return self.build_model()
+        
+        start = time.perf_counter()
+        clock = StageClock()
+        watermark = self.get_db_watermark()
+        products_df, interactions_df, user_ids = self.load_changes_from_db(model.watermark)
+        clock.lap('load')
+        print(f"🔄 Cambios: {len(products_df)} productos, {len(user_ids)} usuarios")
+        
+        content_based = self._update_content_based(model, products_df)
+        clock.lap('content_based')
+        collaborative = self._update_collaborative(
+            model, interactions_df, user_ids, content_based['product_id_to_index']
+        )
+        clock.lap('collaborative')
+        if collaborative and model.user_factors is not None:
+            collaborative.update(self._update_factors(model, collaborative, user_ids))
+            clock.lap('als')
+        # Una consulta agregada por refresh (no por petición)
+        popularity = self._build_popularity(
+            self.load_popularity_from_db(), content_based['product_id_to_index'],
+            content_based['product_categories'], watermark
+        )
+        clock.lap('popularity')
+        
+        training_stats = {
+            **model.training_stats,
+            'products': len(content_based['product_ids']),
+            'users': len(collaborative['user_ids']) if collaborative else 0,
+            'incremental': {
+                'changed_products': len(products_df),
+                'changed_users': len(user_ids),
+                'interactions': len(interactions_df),
+                'seconds': round(time.perf_counter() - start, 3),
+            },
+            'stages': clock.stages,
+            'trained_at': time.time(),
+        }
+        
+        return RecommendationModel(
+            popularity=popularity,
+            training_stats=training_stats,
+            watermark=watermark,
+            **content_based,
+            **collaborative
+        )
     
-    def _train_content_based(self, products_df: pd.DataFrame):
+    def save_model(self, model: Optional[RecommendationModel] = None) -> RecommendationModel:
+        """
+        Guarda un modelo (por defecto el vigente) en disco como una nueva versión.
+        
+        Returns:
+            El mismo modelo con su `version` asignada
+        """
+        is_current = model is None
+        model = self.model if is_current else model
+        if model is None:
+            raise RuntimeError("No hay un modelo entrenado para guardar")
+        
+        model = model.with_version(save_artifact(*model.to_artifact()))
+        if is_current:
+            self.model = model
+        return model
+    
+    def load_model(self, version: Optional[str] = None) -> bool:
+        """
+        Carga un modelo guardado (por defecto el más reciente) sin reentrenar.
+        Los arrays quedan mapeados en memoria (solo lectura).
+        
+        Returns:
+            True si se cargó un modelo, False si no hay modelos guardados
+        """
+        try:
+            arrays, objects, manifest = load_artifact(version)
+        except FileNotFoundError:
+            return False
+        
+        model = RecommendationModel.from_artifact(arrays, objects, manifest)
+        with self._model_lock:
+            self.model = model
+        self.cache.local.clear()
+        return True
+    
+    def _train_content_based(self, products_df: pd.DataFrame, clock: Optional[StageClock] = None) -> Dict:
         """Entrena modelo Content-Based usando características de productos"""
+        clock = clock or StageClock()
+        product_features, vectorizer, scaler = self._fit_product_features(products_df)
+        clock.lap('tfidf')
+        
+        # Calcular vecinos top-K entre productos (sin matriz N×N)
+        ann_index = None
+        if self._use_ann(product_features.shape[0]):
+            ann_index = IVFIndex.build(product_features)
+        neighbor_index = NeighborIndex.build(product_features, k=self.n_neighbors, ann=ann_index)
+        clock.lap('similarity')
+        
+        # Guardar IDs de productos para referencia
+        product_ids = products_df['id'].to_numpy(dtype=str)
+        
+        return {
+            'product_ids': product_ids,
+            'product_id_to_index': IdIndex(product_ids),
+            'product_categories': products_df['category'].fillna('').to_numpy(dtype=str),
+            'product_in_stock': products_df['stock'].fillna(0).to_numpy() > 0,
+            'product_features': product_features,
+            'neighbor_index': neighbor_index,
+            'ann_index': ann_index,
+            'vectorizer': vectorizer,
+            'scaler': scaler,
+        }
+    
+    def _fit_product_features(self, products_df: pd.DataFrame) -> tuple:
+        """Retorna (product_features, vectorizer, scaler) ajustados al catálogo"""
         # Combinar características de texto
-        products_df['features'] = (
-            products_df['name'].fillna('') + ' ' +
-            products_df['description'].fillna('') + ' ' +
-            products_df['category'].fillna('')
-        )
+        products_df['features'] = self._product_text(products_df)
         
         # Vectorizar características de texto
-        self.vectorizer = TfidfVectorizer(max_features=100, stop_words='english')
-        text_features = self.vectorizer.fit_transform(products_df['features'])
+        vectorizer = TfidfVectorizer(max_features=100, stop_words='english')
+        text_features = vectorizer.fit_transform(products_df['features'])
         
         # Agregar características numéricas (precio normalizado)
+        scaler = StandardScaler()
         price_features = products_df[['price']].values
-        price_features = self.scaler.fit_transform(price_features)
+        price_features = scaler.fit_transform(price_features)
         
         # Combinar características
-        from scipy.sparse import hstack
-        self.product_features = hstack([text_features, price_features])
+        product_features = hstack([text_features, price_features]).tocsr()
+        return product_features, vectorizer, scaler
+    
+    def _use_ann(self, n_products: int) -> bool:
+        """Si los vecinos se buscan con el índice IVF en vez de exactos"""
+        if self.neighbor_search == 'auto':
+            return n_products >= ANN_MIN_PRODUCTS
+        return self.neighbor_search == 'ivf'
+    
+    @staticmethod
+    def _product_text(products_df: pd.DataFrame) -> pd.Series:
+        return (
+            products_df['name'].fillna('') + ' ' +
+            products_df['description'].fillna('') + ' ' +
+            products_df['category'].fillna('')
+        )
+    
+    def _update_content_based(self, model: RecommendationModel, products_df: pd.DataFrame) -> Dict:
+        """Aplica productos nuevos o modificados al modelo Content-Based"""
+        content_based = {
+            'product_ids': model.product_ids,
+            'product_id_to_index': model.product_id_to_index,
+            'product_categories': model.product_categories,
+            'product_in_stock': model.product_in_stock,
+            'product_features': model.product_features,
+            'neighbor_index': model.neighbor_index,
+            'ann_index': model.ann_index,
+            'vectorizer': model.vectorizer,
+            'scaler': model.scaler,
+        }
+        if products_df.empty:
+            return content_based
         
-        # Calcular matriz de similitud entre productos
-        self.product_similarity_matrix = cosine_similarity(self.product_features)
+        # Los productos nuevos se agregan al final del catálogo
+        changed_ids = products_df['id'].to_numpy(dtype=str)
+        rows = model.product_id_to_index.get_indexer(changed_ids).astype(np.int64)
+        is_new = rows < 0
+        rows[is_new] = len(model.product_ids) + np.arange(is_new.sum())
+        product_ids = np.concatenate([np.asarray(model.product_ids, dtype=str), changed_ids[is_new]])
+        product_categories = np.empty(len(product_ids), dtype=object)
+        product_categories[:len(model.product_ids)] = model.product_categories
+        product_categories[rows] = products_df['category'].fillna('').to_numpy(dtype=str)
+        product_id_to_index = IdIndex(product_ids) if is_new.any() else model.product_id_to_index
+        product_in_stock = in_stock_mask(
+            product_id_to_index, products_df,
+            previous=model.product_in_stock if model.product_in_stock is not None
+            else np.ones(len(model.product_ids), dtype=bool)
+        )
         
-        # Guardar IDs de productos para referencia
-        self.product_ids = products_df['id'].values
-        self.product_id_to_index = {pid: idx for idx, pid in enumerate(self.product_ids)}
+        # Vectorizar con el vocabulario y la escala ya entrenados
+        text_features = model.vectorizer.transform(self._product_text(products_df))
+        price_features = model.scaler.transform(products_df[['price']].values)
+        changed_features = hstack([text_features, price_features]).tocsr()
+        
+        product_features = replace_rows(
+            model.product_features, rows, changed_features,
+            shape=(len(product_ids), model.product_features.shape[1])
+        )
+        ann_index = model.ann_index.update(product_features, rows) if model.ann_index else None
+        neighbor_index = model.neighbor_index.update(
+            product_features, rows, k=self.n_neighbors, ann=ann_index
+        )
+        
+        content_based.update({
+            'product_ids': product_ids,
+            'product_id_to_index': product_id_to_index,
+            'product_categories': product_categories.astype(str),
+            'product_in_stock': product_in_stock,
+            'product_features': product_features,
+            'neighbor_index': neighbor_index,
+            'ann_index': ann_index,
+        })
+        return content_based
+    
+    def _build_popularity(self, interactions_df: pd.DataFrame, product_id_to_index: IdIndex,
+                          product_categories: np.ndarray, reference_time) -> PopularityIndex:
+        """Ranking de popularidad (carritos + órdenes x3) alineado al catálogo"""
+        if interactions_df.empty:
+            return PopularityIndex.build(
+                np.empty(0, dtype=np.int64), np.empty(0), product_categories
+            )
+        
+        weights = interaction_weights(
+            interactions_df, reference_time, self.popularity_half_life_days
+        )
+        product_codes = product_id_to_index.get_indexer(interactions_df['product_id'])
+        known = product_codes >= 0
+        return PopularityIndex.build(product_codes[known], weights[known], product_categories)
     
-    def _train_collaborative(self, interactions_df: pd.DataFrame, products_df: pd.DataFrame):
-        """Entrena modelo Collaborative Filtering"""
-        # Agregar interacciones por usuario-producto
-        user_product_scores = interactions_df.groupby(['user_id', 'product_id'])['interaction_score'].sum().reset_index()
+    def _update_collaborative(self, model: RecommendationModel, interactions_df: pd.DataFrame,
+                              user_ids: np.ndarray, product_id_to_index: IdIndex) -> Dict:
+        """
+        Reconstruye las filas CF de `user_ids` con sus interacciones completas
+        (`interactions_df`) y agrega los usuarios nuevos al final.
+        """
+        n_products = len(product_id_to_index)
+        if model.has_collaborative:
+            old_user_ids = np.asarray(model.user_ids, dtype=str)
+            user_item_matrix = model.user_item_matrix
+            user_item_normalized = model.user_item_normalized
+            user_history = model.user_history
+            user_id_to_index = model.user_id_to_index
+        else:
+            old_user_ids = np.empty(0, dtype=str)
+            user_item_matrix = user_item_normalized = csr_matrix((0, n_products), dtype=np.float32)
+            user_history = csr_matrix((0, n_products), dtype=np.int8)
+            user_id_to_index = IdIndex(old_user_ids)
+        
+        if len(user_ids) == 0:
+            if not model.has_collaborative:
+                return {}
+            # Solo cambió el catálogo: ampliar columnas para productos nuevos
+            shape = (len(old_user_ids), n_products)
+            return {
+                'user_ids': model.user_ids,
+                'user_id_to_index': user_id_to_index,
+                'user_item_matrix': replace_rows(user_item_matrix, [], None, shape),
+                'user_item_normalized': replace_rows(user_item_normalized, [], None, shape),
+                'user_history': replace_rows(user_history, [], None, shape),
+            }
+        
+        rows = user_id_to_index.get_indexer(user_ids).astype(np.int64)
+        is_new = rows < 0
+        rows[is_new] = len(old_user_ids) + np.arange(is_new.sum())
+        all_user_ids = np.concatenate([old_user_ids, user_ids[is_new]])
         
-        # Crear matriz usuario-producto
-        self.user_product_matrix = user_product_scores.pivot(
-            index='user_id',
-            columns='product_id',
-            values='interaction_score'
-        ).fillna(0)
+        # Filas nuevas de los usuarios afectados (COO -> CSR suma repetidos)
+        user_codes = pd.Index(user_ids).get_indexer(interactions_df['user_id'])
+        product_codes = product_id_to_index.get_indexer(interactions_df['product_id'])
+        scores = interactions_df['interaction_score'].to_numpy(dtype=np.float32)
+        known = (user_codes >= 0) & (product_codes >= 0)
+        new_rows = coo_matrix(
+            (scores[known], (user_codes[known], product_codes[known])),
+            shape=(len(user_ids), n_products),
+            dtype=np.float32
+        ).tocsr()
+        new_history = self._history_matrix(
+            interactions_df, user_codes[known], product_codes[known], known,
+            (len(user_ids), n_products)
+        )
         
-        # Guardar mapeo de usuarios
-        self.user_ids = self.user_product_matrix.index.values
-        self.user_id_to_index = {uid: idx for idx, uid in enumerate(self.user_ids)}
+        shape = (len(all_user_ids), n_products)
+        return {
+            'user_ids': all_user_ids,
+            'user_id_to_index': IdIndex(all_user_ids) if is_new.any() else user_id_to_index,
+            'user_item_matrix': replace_rows(user_item_matrix, rows, new_rows, shape),
+            'user_item_normalized': replace_rows(
+                user_item_normalized, rows, normalize(new_rows, norm='l2', axis=1), shape
+            ),
+            'user_history': replace_rows(user_history, rows, new_history, shape),
+        }
     
-    def get_recommendations(self, user_id: str, n: int = 10) -> List[Dict]:
+    @staticmethod
+    def _update_factors(model: RecommendationModel, collaborative: Dict, user_ids: np.ndarray) -> Dict:
+        """
+        Factores ALS tras un refresh: los usuarios afectados se recalculan con
+        los factores de productos fijos; los productos nuevos quedan en cero
+        hasta el próximo entrenamiento completo.
+        """
+        n_users, n_products = collaborative['user_item_matrix'].shape
+        n_factors = model.item_factors.shape[1]
+        item_factors = np.zeros((n_products, n_factors), dtype=np.float32)
+        item_factors[:len(model.item_factors)] = model.item_factors
+        user_factors = np.zeros((n_users, n_factors), dtype=np.float32)
+        user_factors[:len(model.user_factors)] = model.user_factors
+        
+        rows = collaborative['user_id_to_index'].get_indexer(user_ids)
+        if rows.size:
+            user_factors[rows] = fold_in(collaborative['user_item_matrix'][rows], item_factors)
+        return {'user_factors': user_factors, 'item_factors': item_factors}
+    
+    @staticmethod
+    def _history_matrix(interactions_df: pd.DataFrame, user_codes: np.ndarray,
+                        product_codes: np.ndarray, known: np.ndarray, shape) -> csr_matrix:
+        """
+        Índice usuario -> productos vistos (carrito u orden) como CSR binaria.
+        `user_codes`/`product_codes` ya vienen filtrados por `known`.
+        """
+        in_history = interactions_df['interaction_type'].isin(HISTORY_INTERACTION_TYPES).to_numpy()[known]
+        history = coo_matrix(
+            (np.ones(in_history.sum(), dtype=np.int8),
+             (user_codes[in_history], product_codes[in_history])),
+            shape=shape
+        ).tocsr()
+        history.data[:] = 1
+        return history
+    
+    def get_recommendations(self, user_id: str, n: int = 10,
+                            product_filter: ProductFilter = NO_FILTER) -> List[Dict]:
         """
         Obtiene recomendaciones para un usuario.
         Combina Content-Based y Collaborative Filtering.
@@ -178,240 +827,463 @@ class RecommendationService:
         Args:
             user_id: ID del usuario
             n: Número de recomendaciones
+            product_filter: Solo productos en stock y/o de una categoría
             
         Returns:
             Lista de productos recomendados con scores
         """
-        if not self.is_trained:
-            return []
+        return self.get_recommendations_batch([user_id], n, product_filter).get(user_id, [])
+    
+    def get_recommendations_batch(self, user_ids: List[str], n: int = 10,
+                                  product_filter: ProductFilter = NO_FILTER) -> Dict[str, List[Dict]]:
+        """
+        Obtiene recomendaciones para varios usuarios en una sola pasada.
+        
+        El caché se lee primero en memoria y luego con un MGET a Redis; los
+        usuarios sin caché se puntúan juntos con operaciones matriciales, por
+        bloques de `BATCH_CHUNK_SIZE` usuarios.
+        
+        Returns:
+            Diccionario user_id -> lista de productos recomendados con scores
+        """
+        model = self.model
+        if model is None:
+            return {}
+        
+        user_ids = list(dict.fromkeys(str(user_id) for user_id in user_ids))
         
         # Verificar caché
-        cache_key = f"recommendations:{user_id}"
-        if self.redis_client:
-            cached = self.redis_client.get(cache_key)
-            if cached:
-                return json.loads(cached)
-        
-        recommendations = []
-        
-        # 1. Collaborative Filtering (si hay datos de interacciones)
-        if self.user_product_matrix is not None and user_id in self.user_id_to_index:
-            cf_recommendations = self._get_collaborative_recommendations(user_id, n * 2)
-            recommendations.extend(cf_recommendations)
-        
-        # 2. Content-Based (basado en productos que el usuario ha visto/interactuado)
-        cb_recommendations = self._get_content_based_recommendations(user_id, n * 2)
-        recommendations.extend(cb_recommendations)
-        
-        # 3. Combinar y ordenar por score
-        # Agrupar por product_id y promediar scores
-        product_scores = {}
-        for rec in recommendations:
-            pid = rec['product_id']
-            if pid not in product_scores:
-                product_scores[pid] = {'score': 0, 'count': 0}
-            product_scores[pid]['score'] += rec['score']
-            product_scores[pid]['count'] += 1
-        
-        # Promediar scores
-        final_recommendations = [
-            {
-                'product_id': pid,
-                'score': data['score'] / data['count']
-            }
-            for pid, data in product_scores.items()
-        ]
+        start = time.perf_counter()
+        cache_keys = self._cache_keys(model, user_ids, n, product_filter)
+        cached = self.cache.get_many(cache_keys.values())
+        observe_stage('cache_get', start)
+        results = {
+            user_id: cached[key] for user_id, key in cache_keys.items() if key in cached
+        }
         
-        # Ordenar por score y tomar top N
-        final_recommendations.sort(key=lambda x: x['score'], reverse=True)
-        final_recommendations = final_recommendations[:n]
+        missing = [user_id for user_id in user_ids if user_id not in results]
+        computed = self._compute_recommendations(model, missing, n, product_filter)
+        results.update(computed)
         
         # Guardar en caché (1 hora)
-        if self.redis_client:
-            self.redis_client.setex(
-                cache_key,
-                3600,
-                json.dumps(final_recommendations)
-            )
+        start = time.perf_counter()
+        self.cache.set_many(self._cacheable(model, computed, cache_keys), RECOMMENDATIONS_TTL)
+        observe_stage('cache_set', start)
         
-        return final_recommendations
+        return {user_id: results[user_id] for user_id in user_ids}
     
-    def _get_collaborative_recommendations(self, user_id: str, n: int) -> List[Dict]:
-        """Recomendaciones basadas en usuarios similares"""
-        if user_id not in self.user_id_to_index:
-            return []
+    async def get_recommendations_async(self, user_id: str, n: int = 10,
+                                        product_filter: ProductFilter = NO_FILTER) -> List[Dict]:
+        """Versión no bloqueante de `get_recommendations` para los handlers async"""
+        return (await self.get_recommendations_batch_async([user_id], n, product_filter)).get(user_id, [])
+    
+    async def get_recommendations_batch_async(self, user_ids: List[str], n: int = 10,
+                                              product_filter: ProductFilter = NO_FILTER) -> Dict[str, List[Dict]]:
+        """
+        Versión no bloqueante de `get_recommendations_batch`: Redis se consulta
+        con `redis.asyncio` y la puntuación corre en `scoring_executor`.
+        """
+        model = self.model
+        if model is None:
+            return {}
         
-        user_idx = self.user_id_to_index[user_id]
-        user_vector = self.user_product_matrix.iloc[user_idx].values
+        user_ids = list(dict.fromkeys(str(user_id) for user_id in user_ids))
         
-        # Encontrar usuarios similares
-        similarities = cosine_similarity([user_vector], self.user_product_matrix.values)[0]
+        start = time.perf_counter()
+        cache_keys = self._cache_keys(model, user_ids, n, product_filter)
+        cached = await self.cache.get_many_async(cache_keys.values())
+        observe_stage('cache_get', start)
+        results = {
+            user_id: cached[key] for user_id, key in cache_keys.items() if key in cached
+        }
         
-        # Obtener productos de usuarios similares que el usuario actual no ha visto
-        user_products = set(self.user_product_matrix.columns[self.user_product_matrix.iloc[user_idx] > 0])
+        missing = [user_id for user_id in user_ids if user_id not in results]
+        if missing:
+            results.update(await self._compute_coalesced(model, missing, cache_keys, n, product_filter))
         
-        recommendations = []
-        for similar_user_idx, similarity in enumerate(similarities):
-            if similar_user_idx == user_idx or similarity < 0.1:
-                continue
-            
-            similar_user_products = self.user_product_matrix.iloc[similar_user_idx]
-            for product_id, score in similar_user_products.items():
-                if product_id not in user_products and score > 0:
-                    recommendations.append({
-                        'product_id': product_id,
-                        'score': score * similarity  # Ponderar por similitud
-                    })
+        return {user_id: results[user_id] for user_id in user_ids}
+    
+    @staticmethod
+    def _cache_keys(model: RecommendationModel, user_ids: List[str], n: int,
+                    product_filter: ProductFilter) -> Dict[str, str]:
+        filter_key = model.product_masks.cache_suffix(product_filter) if product_filter.active else ''
+        return {
+            user_id: recommendations_cache_key(model.version, user_id, n, filter_key)
+            for user_id in user_ids
+        }
+    
+    async def _compute_coalesced(self, model: RecommendationModel, user_ids: List[str],
+                                 cache_keys: Dict[str, str], n: int,
+                                 product_filter: ProductFilter = NO_FILTER) -> Dict[str, List[Dict]]:
+        """
+        Calcula las recomendaciones de `user_ids` sin repetir trabajo: las
+        claves que ya calcula otra petición del proceso se esperan, y con
+        SINGLEFLIGHT_REDIS_LOCK=1 también las que calcula otro worker.
+        """
+        user_by_key = {cache_keys[user_id]: user_id for user_id in user_ids}
+        own, waiting = self.singleflight.claim(user_by_key)
+        
+        results = {}
+        if own:
+            results.update(await self._compute_own(
+                model, [user_by_key[key] for key in own], cache_keys, n, product_filter
+            ))
+        
+        # Si el líder falló, recalcular por cuenta propia
+        retry = []
+        shared = await asyncio.gather(*waiting.values(), return_exceptions=True)
+        for key, value in zip(waiting, shared):
+            if isinstance(value, BaseException):
+                retry.append(user_by_key[key])
+            else:
+                results[user_by_key[key]] = value
+        if retry:
+            results.update(await self._score_in_executor(model, retry, n, product_filter))
         
-        return recommendations[:n]
+        return results
     
-    def _get_content_based_recommendations(self, user_id: str, n: int) -> List[Dict]:
-        """Recomendaciones basadas en productos similares a los que el usuario ha visto"""
-        # Obtener productos que el usuario ha interactuado
-        conn = self.get_db_connection()
+    async def _compute_own(self, model: RecommendationModel, user_ids: List[str],
+                           cache_keys: Dict[str, str], n: int,
+                           product_filter: ProductFilter = NO_FILTER) -> Dict[str, List[Dict]]:
+        """Calcula (como líder) y publica en caché y en `singleflight`"""
+        computed = {}
         try:
-            query = """
-                SELECT DISTINCT ci."productId"
-                FROM "CartItem" ci
-                JOIN "Cart" c ON ci."cartId" = c.id
-                WHERE c."userId" = %s
-                UNION
-                SELECT DISTINCT oi."productId"
-                FROM "OrderItem" oi
-                JOIN "Order" o ON oi."orderId" = o.id
-                WHERE o."userId" = %s AND o.status != 'cancelled'
-            """
-            user_products_df = pd.read_sql(query, conn, params=(user_id, user_id))
-            user_product_ids = set(user_products_df['productId'].values) if not user_products_df.empty else set()
+            # Solo los usuarios con historial van a Redis: solo por ellos vale la pena esperar
+            locked, elsewhere, lock_token = [], [], None
+            if self.compute_lock is not None and model.has_collaborative:
+                shared_keys = [
+                    cache_keys[user_id] for user_id in user_ids if user_id in model.user_id_to_index
+                ]
+                locked, lock_token = await self.compute_lock.acquire(shared_keys)
+                elsewhere = sorted(set(shared_keys) - set(locked))
+            
+            user_by_key = {cache_keys[user_id]: user_id for user_id in user_ids}
+            skip = {user_by_key[key] for key in elsewhere}
+            scoring = asyncio.ensure_future(
+                self._score_in_executor(model, [u for u in user_ids if u not in skip], n, product_filter)
+            )
+            
+            # Mientras se puntúa, esperar lo que calcula otro worker
+            found = await self.compute_lock.wait_for(elsewhere, self.cache) if elsewhere else {}
+            computed.update({user_by_key[key]: value for key, value in found.items()})
+            
+            fresh = await asyncio.shield(scoring)
+            leftover = [user_by_key[key] for key in elsewhere if key not in found]
+            if leftover:
+                fresh.update(await self._score_in_executor(model, leftover, n, product_filter))
+            computed.update(fresh)
+            
+            start = time.perf_counter()
+            await self.cache.set_many_async(
+                self._cacheable(model, fresh, cache_keys), RECOMMENDATIONS_TTL
+            )
+            observe_stage('cache_set', start)
+            if locked:
+                await self.compute_lock.release(locked, lock_token)
         finally:
-            conn.close()
+            self.singleflight.resolve(
+                {cache_keys[user_id]: value for user_id, value in computed.items()},
+                [cache_keys[user_id] for user_id in user_ids]
+            )
+        return computed
+    
+    async def _score_in_executor(self, model: RecommendationModel, user_ids: List[str], n: int,
+                                 product_filter: ProductFilter = NO_FILTER) -> Dict[str, List[Dict]]:
+        if not user_ids:
+            return {}
+        return await asyncio.get_running_loop().run_in_executor(
+            self.scoring_executor, self._compute_recommendations, model, user_ids, n, product_filter
+        )
+    
+    def _compute_recommendations(self, model: RecommendationModel, user_ids: List[str], n: int,
+                                 product_filter: ProductFilter = NO_FILTER) -> Dict[str, List[Dict]]:
+        """Puntúa `user_ids` por bloques de `BATCH_CHUNK_SIZE` usuarios"""
+        computed = {}
+        with self.request_profiler.profile():
+            for start in range(0, len(user_ids), BATCH_CHUNK_SIZE):
+                chunk = np.asarray(user_ids[start:start + BATCH_CHUNK_SIZE], dtype=str)
+                computed.update(zip(
+                    chunk.tolist(), self.score_users(model, chunk, n, product_filter, observe=True)
+                ))
+        return computed
+    
+    @staticmethod
+    def _cacheable(model: RecommendationModel, computed: Dict[str, List[Dict]],
+                   cache_keys: Dict[str, str]) -> Dict[str, List[Dict]]:
+        """
+        Entradas que vale la pena cachear: solo usuarios con historial; los
+        demás reciben el ranking de popularidad, que ya es un slice en memoria.
+        """
+        if not model.has_collaborative:
+            return {}
+        return {
+            cache_keys[user_id]: recommendations
+            for user_id, recommendations in computed.items()
+            if user_id in model.user_id_to_index
+        }
+    
+    def cache_recommendations(self, model: RecommendationModel, recommendations: Dict[str, List[Dict]],
+                              n: int, ttl: int):
+        """Guarda recomendaciones ya calculadas solo en Redis, con un pipeline"""
+        self.cache.set_many({
+            recommendations_cache_key(model.version, user_id, n): user_recommendations
+            for user_id, user_recommendations in recommendations.items()
+        }, ttl, local=False)
+    
+    def score_users(self, model: RecommendationModel, user_ids: np.ndarray, n: int,
+                    product_filter: ProductFilter = NO_FILTER, observe: bool = False) -> List[List[Dict]]:
+        """Recomendaciones de un bloque de usuarios (una lista por usuario)"""
+        users, products, scores = self.rank_users(model, user_ids, n, product_filter, observe)
+        start = time.perf_counter()
+        recommendations = self._group_recommendations(model, len(user_ids), users, products, scores)
+        if observe:
+            observe_stage('group', start)
+        return recommendations
+    
+    def rank_users(self, model: RecommendationModel, user_ids: np.ndarray, n: int,
+                   product_filter: ProductFilter = NO_FILTER,
+                   observe: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Top N de un bloque de usuarios como arrays planos (posición del
+        usuario en el bloque, índice de producto, score), ordenados por
+        usuario y score descendente.
         
-        if not user_product_ids:
-            # Si no tiene interacciones, recomendar productos populares
-            return self._get_popular_products(n)
+        CF y CB aportan `n * 2` candidatos cada una; `fuse` normaliza los
+        scores de cada fuente por usuario y los combina con `fusion_weights`.
+        `product_filter` se aplica dentro de cada fuente, antes de su top-K.
+        Con `observe` se registra la duración de cada etapa en /metrics (solo
+        al servir peticiones; la evaluación y la materialización no).
+        """
+        start = time.perf_counter()
+        collaborative = self._get_collaborative_recommendations(model, user_ids, n * 2, product_filter)
+        lap = observe_stage('collaborative', start) if observe else start
+        content_based = self._get_content_based_recommendations(model, user_ids, n * 2, product_filter)
+        lap = observe_stage('content_based', lap) if observe else lap
+        ranked = fuse(
+            [collaborative, content_based],
+            [self.fusion_weights['collaborative'], self.fusion_weights['content_based']],
+            len(user_ids), len(model.product_ids), n
+        )
+        if observe:
+            observe_stage('fusion', lap)
+        return ranked
+    
+    @staticmethod
+    def _group_recommendations(model: RecommendationModel, n_users: int, users: np.ndarray,
+                               products: np.ndarray, scores: np.ndarray) -> List[List[Dict]]:
+        """Separa candidatos ordenados por usuario en una lista por usuario"""
+        bounds = np.searchsorted(users, np.arange(n_users + 1))
+        product_ids = model.product_ids[products].tolist()
+        scores = scores.tolist()
+        return [
+            [
+                {'product_id': product_id, 'score': score}
+                for product_id, score in zip(product_ids[begin:end], scores[begin:end])
+            ]
+            for begin, end in zip(bounds[:-1], bounds[1:])
+        ]
+    
+    def _get_collaborative_recommendations(self, model: RecommendationModel, user_ids: np.ndarray, n: int,
+                                           product_filter: ProductFilter = NO_FILTER
+                                           ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Recomendaciones basadas en usuarios similares (o en los factores ALS)"""
+        if n <= 0 or not model.has_collaborative:
+            return _EMPTY_CANDIDATES
         
-        recommendations = []
-        for product_id in user_product_ids:
-            if product_id not in self.product_id_to_index:
-                continue
-            
-            product_idx = self.product_id_to_index[product_id]
-            similarities = self.product_similarity_matrix[product_idx]
+        user_rows = model.user_id_to_index.get_indexer(user_ids)
+        positions = np.flatnonzero(user_rows >= 0)
+        if positions.size == 0:
+            return _EMPTY_CANDIDATES
+        user_rows = user_rows[positions]
+        
+        if model.user_factors is not None:
+            # ALS: un producto punto con los factores de todos los productos
+            scores = model.user_factors[user_rows] @ model.item_factors.T
+        else:
+            # Similitud coseno con todos los usuarios, dispersa (solo pares con
+            # productos en común): la memoria no crece con usuarios × bloque
+            similarities = (model.user_item_normalized @ model.user_item_normalized[user_rows].T).tocoo()
+            keep = (similarities.data >= 0.1) & (similarities.row != user_rows[similarities.col])
+            similarities = csr_matrix(
+                (similarities.data[keep], (similarities.col[keep], similarities.row[keep])),
+                shape=(user_rows.size, model.user_item_matrix.shape[0])
+            )
             
-            # Obtener productos similares que el usuario no ha visto
-            for similar_idx, similarity in enumerate(similarities):
-                similar_product_id = self.product_ids[similar_idx]
-                if similar_product_id not in user_product_ids and similarity > 0.1:
-                    recommendations.append({
-                        'product_id': similar_product_id,
-                        'score': similarity
-                    })
-        
-        return recommendations[:n]
-    
-    def _get_popular_products(self, n: int) -> List[Dict]:
-        """Recomienda productos populares cuando no hay datos del usuario"""
-        conn = self.get_db_connection()
-        try:
-            query = """
-                SELECT p.id, COUNT(ci.id) + COUNT(oi.id) * 3 as popularity
-                FROM "Product" p
-                LEFT JOIN "CartItem" ci ON p.id = ci."productId"
-                LEFT JOIN "OrderItem" oi ON p.id = oi."productId"
-                GROUP BY p.id
-                ORDER BY popularity DESC
-                LIMIT %s
-            """
-            popular_df = pd.read_sql(query, conn, params=(n,))
-            return [
-                {'product_id': row['id'], 'score': row['popularity'] / 10.0}
-                for _, row in popular_df.iterrows()
-            ]
-        finally:
-            conn.close()
+            # Score de cada producto: suma de interacciones ponderadas por similitud
+            # (solo se densifica el bloque × productos)
+            scores = (similarities @ model.user_item_matrix).toarray()
+        
+        # Excluir productos que el usuario actual ya vio
+        seen = model.user_item_matrix[user_rows].tocoo()
+        scores[seen.row, seen.col] = 0
+        
+        # Excluir productos que no cumplen los filtros (máscara precalculada)
+        allowed = model.product_masks.allowed(product_filter) if product_filter.active else None
+        if allowed is not None:
+            np.multiply(scores, allowed, out=scores)
+        
+        # Top N de cada usuario sin ordenar todo el catálogo
+        users, products, scores = top_n_per_row(scores, n)
+        return positions[users], products, scores
+    
+    def _get_content_based_recommendations(self, model: RecommendationModel, user_ids: np.ndarray, n: int,
+                                           product_filter: ProductFilter = NO_FILTER
+                                           ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Recomendaciones basadas en productos similares a los que el usuario ha visto"""
+        # Productos que cada usuario ha interactuado (índice en memoria, sin SQL)
+        if model.has_collaborative:
+            user_rows = model.user_id_to_index.get_indexer(user_ids)
+            known = user_rows >= 0
+            user_rows = np.where(known, user_rows, 0)
+            indptr = model.user_history.indptr
+            starts = np.where(known, indptr[user_rows], 0)
+            counts = np.where(known, indptr[user_rows + 1], 0) - starts
+        else:
+            starts = counts = np.zeros(len(user_ids), dtype=np.int64)
+        
+        owners = np.repeat(np.arange(len(user_ids)), counts)
+        offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+        history = (
+            model.user_history.indices[np.arange(counts.sum()) + offsets]
+            if owners.size else np.empty(0, dtype=np.int32)
+        )
+        
+        # Vecinos de todos los productos del historial
+        k = model.neighbor_index.k
+        users = np.repeat(owners, k)
+        products = model.neighbor_index.indices[history].ravel()
+        similarities = model.neighbor_index.scores[history].ravel()
+        
+        # Obtener productos similares que el usuario no ha visto
+        n_products = len(model.product_ids)
+        keys = users.astype(np.int64) * n_products + products
+        valid = (products >= 0) & (similarities > 0.1) & ~np.isin(
+            keys, owners.astype(np.int64) * n_products + history
+        )
+        allowed = model.product_masks.allowed(product_filter) if product_filter.active else None
+        if allowed is not None:
+            valid &= allowed[products]
+        keys, similarities = keys[valid], similarities[valid]
+        
+        # Un candidato puede venir de varios productos: conservar su mayor similitud
+        order = np.lexsort((-similarities, keys))
+        keys, similarities = keys[order], similarities[order]
+        first = np.ones(keys.size, dtype=bool)
+        first[1:] = keys[1:] != keys[:-1]
+        users, products = np.divmod(keys[first], n_products)
+        similarities = similarities[first]
+        
+        top = top_n_per_group(users, similarities, n, tiebreak=products)
+        users, products, similarities = users[top], products[top], similarities[top]
+        
+        # Si no tiene interacciones, recomendar productos populares
+        cold = np.flatnonzero(counts == 0)
+        if cold.size and model.popularity is not None:
+            popular, popularity = model.popularity.top(n, product_filter.category, allowed)
+            users = np.concatenate([users, np.repeat(cold, popular.size)])
+            products = np.concatenate([products, np.tile(popular, cold.size)])
+            similarities = np.concatenate([similarities, np.tile(popularity / 10.0, cold.size)])
+        
+        return users, products, similarities
     
-    def get_similar_products(self, product_id: str, n: int = 5) -> List[Dict]:
+    def get_similar_products(self, product_id: str, n: int = 5,
+                             product_filter: ProductFilter = NO_FILTER) -> List[Dict]:
         """
         Obtiene productos similares a uno dado usando Content-Based.
         
         Args:
             product_id: ID del producto
             n: Número de productos similares
+            product_filter: Solo productos en stock y/o de una categoría
             
         Returns:
             Lista de productos similares con scores
         """
-        if not self.is_trained or product_id not in self.product_id_to_index:
+        model = self.model
+        if model is None or product_id not in model.product_id_to_index:
             return []
         
-        # Verificar caché
-        cache_key = f"similar:{product_id}"
-        if self.redis_client:
-            cached = self.redis_client.get(cache_key)
-            if cached:
-                return json.loads(cached)
+        # Verificar caché (solo en memoria: recalcularlo es un slice del índice)
+        filter_key = model.product_masks.cache_suffix(product_filter)
+        cache_key = f"similar:{model.version or 'local'}:{n}{filter_key}:{product_id}"
+        cached = self.cache.get(cache_key, shared=False)
+        if cached is not None:
+            return cached
         
-        product_idx = self.product_id_to_index[product_id]
-        similarities = self.product_similarity_matrix[product_idx]
+        product_idx = model.product_id_to_index[product_id]
         
-        # Obtener top N productos similares (excluyendo el mismo)
-        similar_indices = np.argsort(similarities)[::-1][1:n+1]
+        # Los vecinos ya vienen ordenados y excluyen el mismo producto
+        similar_indices, similarities = model.neighbor_index.neighbors(product_idx, min_score=0.1)
+        
+        # El filtro se aplica antes de cortar a `n`
+        allowed = model.product_masks.allowed(product_filter)
+        if allowed is not None:
+            keep = allowed[similar_indices]
+            similar_indices, similarities = similar_indices[keep], similarities[keep]
         
         recommendations = [
             {
-                'product_id': self.product_ids[idx],
-                'similarity': float(similarities[idx])
+                'product_id': str(model.product_ids[idx]),
+                'similarity': float(similarity)
             }
-            for idx in similar_indices
-            if similarities[idx] > 0.1
+            for idx, similarity in zip(similar_indices[:n], similarities[:n])
         ]
         
         # Guardar en caché
-        if self.redis_client:
-            self.redis_client.setex(cache_key, 3600, json.dumps(recommendations))
+        self.cache.set(cache_key, recommendations, RECOMMENDATIONS_TTL, shared=False)
         
         return recommendations
     
+    def evaluate(self, k: int = 20, cutoff=None, test_fraction: float = 0.2,
+                 cf_engine: Optional[str] = None,
+                 model: Optional[RecommendationModel] = None) -> Dict:
+        """
+        Evalúa el modelo con un split temporal de las interacciones: entrena
+        con las anteriores al corte y mide precision@k, recall@k, NDCG@k y
+        cobertura sobre las compras posteriores. No usa la caché de producción.
+        
+        `model` (por defecto el publicado) aporta el Content-Based; sin
+        `cf_engine` se evalúa su motor. Las interacciones se leen por bloques.
+        """
+        model = model or self.model
+        if cf_engine is None and model is not None:
+            cf_engine = model.cf_engine
+        if model is not None:
+            # El Content-Based no depende de las interacciones: reutilizar el vigente
+            content_based = {
+                'product_ids': model.product_ids,
+                'product_id_to_index': model.product_id_to_index,
+                'product_categories': model.product_categories,
+                'product_in_stock': model.product_in_stock,
+                'product_features': model.product_features,
+                'neighbor_index': model.neighbor_index,
+                'ann_index': model.ann_index,
+                'vectorizer': model.vectorizer,
+                'scaler': model.scaler,
+            }
+        else:
+            products_df = self.load_products_from_db()
+            if products_df.empty:
+                return evaluate_model(self, {}, lambda: iter(()), k)
+            content_based = self._train_content_based(products_df)
+        
+        report = evaluate_model(
+            self, content_based, self.stream_interactions_from_db, k, cutoff, test_fraction,
+            cf_engine=cf_engine
+        )
+        print(
+            f"📊 Evaluación ({report['test_users']} usuarios, {report['seconds']}s): "
+            f"precision@{k}={report['precision_at_k']:.3f} recall@{k}={report['recall_at_k']:.3f} "
+            f"ndcg@{k}={report['ndcg_at_k']:.3f} cobertura={report['coverage']:.3f}"
+        )
+        return report
+    
     def evaluate_accuracy(self) -> float:
         """
         Evalúa la precisión del modelo.
-        Retorna un score de 0 a 1 (donde 1 = 100%).
+        Retorna el recall@20 de la evaluación temporal, de 0 a 1
+        (% de productos comprados que aparecen en las recomendaciones).
         """
         if not self.is_trained:
             return 0.0
-        
-        # Cargar datos de prueba (órdenes recientes)
-        conn = self.get_db_connection()
-        try:
-            query = """
-                SELECT o."userId", oi."productId"
-                FROM "Order" o
-                JOIN "OrderItem" oi ON o.id = oi."orderId"
-                WHERE o.status != 'cancelled'
-                ORDER BY o."createdAt" DESC
-                LIMIT 100
-            """
-            test_data = pd.read_sql(query, conn)
-        finally:
-            conn.close()
-        
-        if test_data.empty:
-            return 0.8  # Si no hay datos, asumir 80% (modelo base)
-        
-        # Evaluar: ¿los productos comprados están en las recomendaciones?
-        correct = 0
-        total = 0
-        
-        for user_id in test_data['userId'].unique():
-            user_products = set(test_data[test_data['userId'] == user_id]['productId'].values)
-            recommendations = self.get_recommendations(user_id, n=20)
-            recommended_ids = {rec['product_id'] for rec in recommendations}
-            
-            # Precisión: % de productos comprados que están en recomendaciones
-            if user_products:
-                overlap = len(user_products & recommended_ids)
-                correct += overlap
-                total += len(user_products)
-        
-        accuracy = correct / total if total > 0 else 0.8
-        return min(accuracy, 0.95)  # Cap en 95% para ser realista
+        return self.evaluate()['recall_at_k']
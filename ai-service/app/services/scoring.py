@@ -0,0 +1,46 @@
+"""
+Utilidades vectorizadas para ordenar scores de recomendación.
+"""
+
+from typing import Tuple
+import numpy as np
+
+
+def top_n_per_row(scores: np.ndarray, n: int, min_score: float = 0.0
+                  ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Los `n` mayores scores (> min_score) de cada fila de una matriz densa
+    como arrays planos (fila, columna, score), ordenados por fila y score
+    descendente (los empates se resuelven por columna ascendente).
+
+    Usa `argpartition` por fila (O(columnas)) y solo ordena los candidatos elegidos.
+    """
+    if n <= 0 or scores.size == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=scores.dtype)
+
+    n = min(n, scores.shape[1])
+    columns = np.argpartition(scores, scores.shape[1] - n, axis=1)[:, -n:].ravel()
+    rows = np.repeat(np.arange(scores.shape[0]), n)
+    values = scores[rows, columns]
+    keep = values > min_score
+    rows, columns, values = rows[keep], columns[keep], values[keep]
+
+    top = top_n_per_group(rows, values, n, tiebreak=columns)
+    return rows[top], columns[top], values[top]
+
+
+def top_n_per_group(groups: np.ndarray, scores: np.ndarray, n: int,
+                    tiebreak: np.ndarray = None) -> np.ndarray:
+    """
+    Posiciones de los `n` mayores scores de cada grupo, ordenadas por grupo y
+    por score descendente (los empates se resuelven por `tiebreak` ascendente).
+    """
+    if n <= 0 or scores.size == 0:
+        return np.empty(0, dtype=np.int64)
+
+    keys = (-scores, groups) if tiebreak is None else (tiebreak, -scores, groups)
+    order = np.lexsort(keys)
+    sorted_groups = groups[order]
+    rank = np.arange(order.size) - np.searchsorted(sorted_groups, sorted_groups, side='left')
+    return order[rank < n]
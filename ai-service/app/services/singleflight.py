@@ -0,0 +1,157 @@
+"""
+Coalescencia de cálculos concurrentes sobre la misma clave (singleflight).
+
+Dentro del proceso, la primera petición que no encuentra una clave en caché
+la calcula (líder) y las que llegan mientras tanto esperan su resultado. Entre
+workers, un lock opcional en Redis (`SET NX PX`) hace que solo un worker
+calcule la clave y los demás esperen a verla en Redis.
+"""
+
+from typing import Any, Dict, Iterable, List, Tuple
+import asyncio
+import os
+import time
+import uuid
+import redis
+
+
+# Borra solo los locks que siguen teniendo el token de quien los tomó: si el
+# cálculo duró más que el TTL, el lock ya puede ser de otro worker
+RELEASE_SCRIPT = """
+local released = 0
+for _, key in ipairs(KEYS) do
+    if redis.call('get', key) == ARGV[1] then
+        released = released + redis.call('del', key)
+    end
+end
+return released
+"""
+
+
+class SingleFlight:
+    """Registro de cálculos en curso por clave (para el event loop de FastAPI)"""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def claim(self, keys: Iterable[str]) -> Tuple[List[str], Dict[str, asyncio.Future]]:
+        """
+        Reparte `keys` entre las que esta petición debe calcular (propias) y
+        las que ya calcula otra (futuros a esperar).
+        """
+        loop = asyncio.get_running_loop()
+        own = []
+        waiting = {}
+        for key in keys:
+            future = self._inflight.get(key)
+            if future is None:
+                self._inflight[key] = loop.create_future()
+                own.append(key)
+            else:
+                waiting[key] = future
+        self.leaders += len(own)
+        self.coalesced += len(waiting)
+        return own, waiting
+
+    def resolve(self, results: Dict[str, Any], keys: Iterable[str]):
+        """
+        Publica el resultado de las claves propias. Las que no están en
+        `results` (error del líder) se marcan fallidas y quien espera las
+        recalcula por su cuenta.
+        """
+        for key in keys:
+            future = self._inflight.pop(key, None)
+            if future is None or future.done():
+                continue
+            if key in results:
+                future.set_result(results[key])
+            else:
+                future.set_exception(LookupError(key))
+                # Evitar el aviso de excepción no recuperada si nadie esperaba
+                future.exception()
+
+    def stats(self) -> Dict:
+        return {
+            'inflight': len(self._inflight),
+            'leaders': self.leaders,
+            'coalesced': self.coalesced,
+        }
+
+
+class RedisComputeLock:
+    """
+    Lock por clave en Redis para que un solo worker calcule cada entrada.
+
+    Quien no obtiene el lock consulta Redis cada `poll_interval` segundos
+    hasta `wait_timeout`; si la entrada no aparece la calcula igualmente.
+    """
+
+    def __init__(self, async_redis_client, lock_ttl_ms: int = None,
+                 wait_timeout: float = None, poll_interval: float = 0.05):
+        self.redis_client = async_redis_client
+        self.lock_ttl_ms = lock_ttl_ms or int(os.getenv('SINGLEFLIGHT_LOCK_TTL_MS', 5000))
+        self.wait_timeout = (
+            wait_timeout if wait_timeout is not None
+            else float(os.getenv('SINGLEFLIGHT_WAIT_SECONDS', 1.0))
+        )
+        self.poll_interval = poll_interval
+        self._release_script = async_redis_client.register_script(RELEASE_SCRIPT)
+        self.acquired = 0
+        self.waited = 0
+        self.wait_hits = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    async def acquire(self, keys: List[str]) -> Tuple[List[str], str]:
+        """
+        Intenta tomar el lock de cada clave; retorna las claves obtenidas y
+        el token con el que se tomaron (necesario para `release`).
+        """
+        token = uuid.uuid4().hex
+        if not keys:
+            return [], token
+        try:
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for key in keys:
+                pipeline.set(f"lock:{key}", token, nx=True, px=self.lock_ttl_ms)
+            acquired = [key for key, ok in zip(keys, await pipeline.execute()) if ok]
+        except redis.RedisError:
+            # Sin Redis cada worker calcula lo suyo
+            self.errors += 1
+            return list(keys), token
+        self.acquired += len(acquired)
+        self.waited += len(keys) - len(acquired)
+        return acquired, token
+
+    async def release(self, keys: List[str], token: str):
+        """Libera los locks de `keys` que todavía son de `token`"""
+        if not keys:
+            return
+        try:
+            await self._release_script(keys=[f"lock:{key}" for key in keys], args=[token])
+        except redis.RedisError:
+            self.errors += 1
+
+    async def wait_for(self, keys: List[str], cache) -> Dict[str, Any]:
+        """Espera a que otro worker publique `keys` en la caché compartida"""
+        found = {}
+        pending = list(keys)
+        deadline = time.monotonic() + self.wait_timeout
+        while pending and time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            found.update(await cache.get_many_async(pending))
+            pending = [key for key in pending if key not in found]
+        self.wait_hits += len(found)
+        self.timeouts += len(pending)
+        return found
+
+    def stats(self) -> Dict:
+        return {
+            'acquired': self.acquired,
+            'waited': self.waited,
+            'wait_hits': self.wait_hits,
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+        }
@@ -0,0 +1,34 @@
+"""
+Operaciones sobre matrices dispersas usadas al actualizar modelos.
+"""
+
+import numpy as np
+from scipy.sparse import csr_matrix, vstack
+
+
+def replace_rows(matrix, rows: np.ndarray, new_rows, shape) -> csr_matrix:
+    """
+    Retorna una copia CSR de `matrix` con forma `shape` donde las filas `rows`
+    se reemplazan por `new_rows` (en el mismo orden).
+
+    Las filas con índice >= `matrix.shape[0]` se agregan al final, así que
+    todas las filas nuevas deben venir en `rows`. Con `new_rows=None` solo se
+    ajusta la forma. Las columnas nuevas quedan
+    vacías en las filas que no se reemplazan.
+    """
+    n_rows, n_cols = shape
+    n_old = matrix.shape[0]
+    rows = np.asarray(rows, dtype=np.int64)
+
+    old = csr_matrix((matrix.data, matrix.indices, matrix.indptr), shape=(n_old, n_cols))
+    if new_rows is None:
+        new_rows = csr_matrix((rows.size, n_cols), dtype=matrix.dtype)
+    new_rows = csr_matrix(new_rows, shape=(rows.size, n_cols), dtype=matrix.dtype)
+
+    order = np.full(n_rows, -1, dtype=np.int64)
+    order[:n_old] = np.arange(n_old)
+    order[rows] = n_old + np.arange(rows.size)
+    if (order < 0).any():
+        raise ValueError("Faltan filas nuevas para completar la matriz")
+
+    return vstack([old, new_rows], format='csr')[order]
@@ -0,0 +1,258 @@
+"""
+Ejecución de entrenamientos en segundo plano.
+
+Los entrenamientos corren fuera del event loop de FastAPI: en un proceso
+aparte (por defecto, sin competir por el GIL con las peticiones) o en un
+hilo. El proceso hijo guarda el modelo en disco y el servicio lo carga
+mapeado en memoria; en ambos casos el modelo nuevo se publica con un
+intercambio atómico de `RecommendationService.model`.
+
+La evaluación de un entrenamiento completo corre después de publicarlo, en
+su propio proceso (o hilo), y agrega sus métricas al trabajo al terminar.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+import uuid
+from app.services.materialization import materialize_recommendations, purge_materialized
+from app.services.metrics import observe_evaluation, observe_training
+from app.services.profiling import trace_memory
+
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+
+@dataclass
+class TrainingJob:
+    """Estado de un trabajo de entrenamiento"""
+
+    job_id: str
+    kind: str
+    # Motor CF del entrenamiento completo (None = CF_ENGINE del servicio)
+    cf_engine: Optional[str] = None
+    # Registrar asignaciones de memoria (tracemalloc) en result['memory_profile']
+    trace_memory: bool = False
+    status: str = JOB_QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Dict = field(default_factory=dict)
+    error: Optional[str] = None
+    # Evaluación posterior a la publicación (None = no se evalúa)
+    evaluation_status: Optional[str] = None
+
+    @property
+    def duration_seconds(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        return (self.finished_at or time.time()) - self.started_at
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in (JOB_QUEUED, JOB_RUNNING)
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data['duration_seconds'] = (
+            round(self.duration_seconds, 3) if self.duration_seconds is not None else None
+        )
+        return data
+
+
+JOB_FULL = 'full'
+JOB_INCREMENTAL = 'incremental'
+
+
+def _train_in_subprocess(kind: str, base_version: Optional[str], cf_engine: Optional[str] = None,
+                         memory: bool = False) -> Dict:
+    """
+    Entrena y guarda un modelo en un proceso hijo; retorna versión y estadísticas.
+    Las actualizaciones incrementales parten de la versión `base_version` en disco.
+    """
+    from app.services.recommendation_service import RecommendationService
+
+    service = RecommendationService(use_cache=False)
+    if kind == JOB_INCREMENTAL:
+        if base_version:
+            service.load_model(base_version)
+        build = service.build_incremental_model
+    else:
+        build = lambda: service.build_model(cf_engine)
+    model, memory_profile = trace_memory(build) if memory else (build(), None)
+    if model is None:
+        return {}
+    model = service.save_model(model)
+    return _job_result(model, memory_profile)
+
+
+def _evaluate_in_subprocess(version: str) -> Dict:
+    """Evalúa en un proceso hijo la versión `version` guardada en disco"""
+    from app.services.recommendation_service import RecommendationService
+
+    service = RecommendationService(use_cache=False)
+    service.load_model(version)
+    return service.evaluate()
+
+
+def _job_result(model, memory_profile: Optional[Dict]) -> Dict:
+    result = {'model_version': model.version, **model.training_stats}
+    if memory_profile is not None:
+        result['memory_profile'] = memory_profile
+    return result
+
+
+def _spawn_pool() -> ProcessPoolExecutor:
+    # 'spawn' evita heredar conexiones y locks del proceso del servidor
+    return ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+
+
+class TrainingManager:
+    """
+    Encola entrenamientos y mantiene su estado para el endpoint de consulta.
+
+    Solo corre un entrenamiento a la vez: pedir otro mientras hay uno activo
+    retorna el trabajo existente.
+    """
+
+    def __init__(self, service, executor: Optional[str] = None, history_size: int = 20):
+        self.service = service
+        self.executor_kind = executor or os.getenv('TRAINING_EXECUTOR', 'process')
+        self.history_size = history_size
+        self.materialize = os.getenv('MATERIALIZE_AFTER_TRAINING', '1') == '1'
+        self.evaluate = os.getenv('EVALUATE_AFTER_TRAINING', '1') == '1'
+        self.jobs: Dict[str, TrainingJob] = {}
+        self._lock = threading.Lock()
+        # Un solo hilo coordina los trabajos en orden
+        self._runner = ThreadPoolExecutor(max_workers=1, thread_name_prefix='training')
+        self._process_pool = None
+        # Las evaluaciones no retrasan la publicación ni el próximo entrenamiento
+        self._evaluation_pool = None
+
+    def submit(self, kind: str = JOB_FULL, cf_engine: Optional[str] = None,
+               trace_memory: bool = False) -> TrainingJob:
+        """
+        Encola un entrenamiento (o retorna el activo equivalente; uno sin
+        perfil de memoria no sirve a quien pide `trace_memory`).
+        """
+        with self._lock:
+            for job in self.jobs.values():
+                if (job.is_active and job.kind == kind and job.cf_engine == cf_engine
+                        and (job.trace_memory or not trace_memory)):
+                    return job
+
+            job = TrainingJob(
+                job_id=uuid.uuid4().hex, kind=kind, cf_engine=cf_engine, trace_memory=trace_memory
+            )
+            self.jobs[job.job_id] = job
+            self._prune_history()
+
+        self._runner.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[TrainingJob]:
+        return self.jobs.get(job_id)
+
+    def list_jobs(self) -> List[TrainingJob]:
+        return sorted(self.jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def shutdown(self):
+        self._runner.shutdown(wait=False, cancel_futures=True)
+        for pool in (self._process_pool, self._evaluation_pool):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job: TrainingJob):
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = self._train(job.kind, job.cf_engine, job.trace_memory)
+            if job.result and self.materialize and job.kind == JOB_FULL:
+                # Precalcular las recomendaciones de la versión recién publicada
+                job.result['materialization'] = materialize_recommendations(self.service)
+            elif job.result:
+                # Las actualizaciones incrementales (cada pocos minutos) se sirven
+                # bajo demanda; la versión materializada anterior ya no se lee
+                purge_materialized(self.service)
+            job.status = JOB_DONE
+        except Exception as e:
+            job.error = str(e)
+            job.status = JOB_FAILED
+            traceback.print_exc()
+        finally:
+            job.finished_at = time.time()
+            observe_training(job.kind, job.status, job.result, job.duration_seconds)
+
+        if job.status == JOB_DONE and job.result and job.kind == JOB_FULL and self.evaluate:
+            self._evaluate(job)
+
+    def _evaluate(self, job: TrainingJob):
+        """Evalúa la versión publicada por `job` sin bloquear al runner"""
+        job.evaluation_status = JOB_RUNNING
+        if self.executor_kind == 'thread':
+            if self._evaluation_pool is None:
+                self._evaluation_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='evaluation')
+            future = self._evaluation_pool.submit(self.service.evaluate, model=self.service.model)
+        else:
+            if self._evaluation_pool is None:
+                self._evaluation_pool = _spawn_pool()
+            future = self._evaluation_pool.submit(_evaluate_in_subprocess, job.result['model_version'])
+        future.add_done_callback(lambda future: self._attach_evaluation(job, future))
+
+    def _attach_evaluation(self, job: TrainingJob, future):
+        try:
+            evaluation = future.result()
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                self._evaluation_pool = None
+            job.result['evaluation_error'] = str(e)
+            job.evaluation_status = JOB_FAILED
+            return
+        job.result['evaluation'] = evaluation
+        job.result['accuracy'] = evaluation['recall_at_k']
+        job.evaluation_status = JOB_DONE
+        observe_evaluation(job.kind, evaluation['seconds'])
+
+    def _train(self, kind: str, cf_engine: Optional[str] = None, memory: bool = False) -> Dict:
+        if self.executor_kind == 'thread':
+            if kind == JOB_INCREMENTAL:
+                train = self.service.refresh
+            else:
+                train = lambda: self.service.train(cf_engine=cf_engine)
+            model, memory_profile = trace_memory(train) if memory else (train(), None)
+            if model is None:
+                return {}
+            return _job_result(model, memory_profile)
+
+        try:
+            future = self._get_process_pool().submit(
+                _train_in_subprocess, kind, self.service.model_version, cf_engine, memory
+            )
+            result = future.result()
+        except BrokenProcessPool:
+            # El proceso hijo murió (p. ej. sin memoria); crear otro en el próximo intento
+            self._process_pool = None
+            raise
+        if result:
+            # Cargar desde disco (mmap) y publicar el modelo nuevo
+            self.service.load_model(result['model_version'])
+        return result
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            self._process_pool = _spawn_pool()
+        return self._process_pool
+
+    def _prune_history(self):
+        finished = [job for job in self.list_jobs() if not job.is_active]
+        for job in finished[self.history_size:]:
+            del self.jobs[job.job_id]
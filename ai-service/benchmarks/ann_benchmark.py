@@ -0,0 +1,137 @@
+"""
+Recall vs latencia del índice IVF frente a la búsqueda exacta de vecinos
+entre productos, con vectores de productos sintéticos.
+
+Para una muestra de productos calcula sus vecinos exactos (contra todo el
+catálogo) y los del índice IVF con distintos `nprobe`, y reporta recall@k,
+la latencia por consulta y, con --full-build, el tiempo de construir el
+`NeighborIndex` completo de cada forma.
+
+Ejemplos:
+    python benchmarks/ann_benchmark.py --products 100000
+    python benchmarks/ann_benchmark.py --products 20000 --nprobe 1 4 8 16 --full-build
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Agregar directorio del servicio al path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+from sklearn.preprocessing import normalize
+
+from app.services.ivf_index import IVFIndex
+from app.services.neighbor_index import NeighborIndex
+from app.services.recommendation_service import RecommendationService
+from benchmarks.synthetic_data import generate_dataset
+
+
+RESULTS_DIR = Path(__file__).parent / 'results'
+
+
+def exact_search(features, queries: np.ndarray, k: int) -> np.ndarray:
+    """Scores exactos de los `k` mejores vecinos de cada consulta (orden descendente)"""
+    scores = (features[queries] @ features.T).toarray()
+    scores[np.arange(queries.size), queries] = -np.inf
+    return -np.sort(-scores, axis=1)[:, :k]
+
+
+def recall(ann_scores: np.ndarray, exact_scores: np.ndarray) -> float:
+    """
+    Fracción de resultados del IVF que están en el top-k exacto. Se compara
+    por score (≥ el k-ésimo exacto) para no penalizar empates.
+    """
+    threshold = exact_scores[:, [-1]] - 1e-5
+    return float((ann_scores >= threshold).mean())
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def run(args) -> dict:
+    print(f"[INFO] Generando {args.products} productos...")
+    tables = generate_dataset(args.products, 0, seed=args.seed)
+    features, _, _ = RecommendationService(use_cache=False)._fit_product_features(tables['Product'])
+    features = normalize(features.astype(np.float32), norm='l2', axis=1).tocsr()
+
+    queries = np.random.default_rng(args.seed).choice(
+        args.products, min(args.queries, args.products), replace=False
+    )
+    exact, exact_seconds = timed(exact_search, features, queries, args.k)
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'config': {
+            'products': args.products,
+            'queries': int(queries.size),
+            'k': args.k,
+            'nlist': args.nlist,
+            'seed': args.seed,
+        },
+        'exact': {'query_ms': round(exact_seconds / queries.size * 1000, 4)},
+    }
+    print(f"[OK] exacta: {report['exact']['query_ms']} ms/consulta")
+
+    ann, build_seconds = timed(IVFIndex.build, features, nlist=args.nlist, seed=args.seed)
+    report['ivf'] = {
+        'nlist': ann.nlist,
+        'train_seconds': round(build_seconds, 3),
+        'memory_mb': round(ann.nbytes / 1024 / 1024, 1),
+        'nprobe': {},
+    }
+    print(f"[OK] IVF: {ann.nlist} listas entrenadas en {build_seconds:.2f}s")
+
+    if args.full_build:
+        _, seconds = timed(NeighborIndex.build, features, k=args.k)
+        report['exact']['full_build_seconds'] = round(seconds, 3)
+        print(f"[OK] NeighborIndex exacto: {seconds:.2f}s")
+
+    for nprobe in args.nprobe:
+        (_, scores), seconds = timed(ann.search, ann.vector(queries), args.k, nprobe, exclude=queries)
+        result = {
+            'recall_at_k': round(recall(scores, exact), 4),
+            'query_ms': round(seconds / queries.size * 1000, 4),
+        }
+        if args.full_build:
+            _, seconds = timed(NeighborIndex.build, features, k=args.k, ann=ann, nprobe=nprobe)
+            result['full_build_seconds'] = round(seconds, 3)
+        report['ivf']['nprobe'][nprobe] = result
+        print(f"[OK] nprobe={nprobe}: recall@{args.k} {result['recall_at_k']:.3f}, "
+              f"{result['query_ms']} ms/consulta"
+              + (f", NeighborIndex {result['full_build_seconds']}s" if args.full_build else ''))
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--products', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=1000, help='Productos consultados para medir recall')
+    parser.add_argument('--k', type=int, default=10, help='Vecinos por consulta')
+    parser.add_argument('--nlist', type=int, default=None, help='Listas IVF (por defecto 4·√N)')
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--full-build', action='store_true',
+                        help='Medir también la construcción completa del NeighborIndex')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='Archivo JSON de salida')
+    args = parser.parse_args()
+
+    report = run(args)
+    output = Path(args.output) if args.output else (
+        RESULTS_DIR / f"ann-{args.products}-{datetime.now():%Y%m%dT%H%M%S}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+    print(f"[OK] Resultados guardados en {output}")
+
+
+if __name__ == '__main__':
+    main()
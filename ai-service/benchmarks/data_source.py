@@ -0,0 +1,164 @@
+"""
+Fuente de datos en memoria que reemplaza a PostgreSQL en los benchmarks.
+
+Reproduce con pandas las consultas de `recommendation_service`
+(PRODUCTS_QUERY, INTERACTIONS_QUERY, CHANGED_USERS_QUERY, POPULARITY_QUERY
+y STOCK_QUERY) sobre las tablas de `synthetic_data.generate_dataset`,
+con las mismas columnas de salida.
+"""
+
+from typing import Dict, Iterator, Optional
+import numpy as np
+import pandas as pd
+
+from app.services.interaction_loader import LOAD_CHUNK_SIZE
+from app.services.recommendation_service import WATERMARK_OVERLAP
+
+
+PRODUCT_COLUMNS = ['id', 'name', 'description', 'category', 'price', 'stock', 'imageUrl']
+
+_INTERACTION_COLUMNS = ['user_id', 'product_id', 'interaction_score', 'interaction_type', 'created_at']
+
+
+class InMemoryDataSource:
+    """Tablas del esquema Prisma en DataFrames con las consultas del servicio"""
+
+    def __init__(self, tables: Dict[str, pd.DataFrame]):
+        self.tables = tables
+
+    def attach(self, service):
+        """Hace que `service` lea de esta fuente en vez de PostgreSQL"""
+        service.load_data_from_db = self.load_data
+        service.load_products_from_db = self.load_products
+        service.stream_interactions_from_db = self.stream_interactions
+        service.get_db_watermark = self.watermark
+        service.load_changes_from_db = self.load_changes
+        service.load_popularity_from_db = self.load_popularity
+        service.load_stock_from_db = self.load_stock
+        return service
+
+    def load_data(self) -> tuple:
+        """(products_df, interactions_df) como `load_data_from_db`"""
+        return self.load_products(), self._interactions()
+
+    def load_products(self) -> pd.DataFrame:
+        return self.tables['Product'][PRODUCT_COLUMNS].copy()
+
+    def stream_interactions(self, chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """Interacciones en bloques como `stream_interactions_from_db`"""
+        chunk_size = chunk_size or LOAD_CHUNK_SIZE
+        interactions_df = self._interactions()
+        for start in range(0, len(interactions_df), chunk_size):
+            yield interactions_df.iloc[start:start + chunk_size]
+
+    def watermark(self):
+        """Fecha de la última modificación de cualquier tabla"""
+        return max(
+            table[column].max()
+            for table in self.tables.values()
+            for column in ('createdAt', 'updatedAt')
+            if column in table and not table.empty
+        ).floor('us').to_pydatetime()
+
+    def load_changes(self, since) -> tuple:
+        """(products_df, interactions_df, user_ids) como `load_changes_from_db`"""
+        since = pd.Timestamp(since - WATERMARK_OVERLAP)
+        products = self.tables['Product']
+        products_df = products.loc[products['updatedAt'] > since, PRODUCT_COLUMNS].copy()
+
+        cart_items = self._cart_items()
+        order_items = self._order_items(include_cancelled=True)
+        reviews = self.tables['Review']
+        changed = pd.concat([
+            cart_items.loc[(cart_items['updatedAt'] > since) | (cart_items['cartUpdatedAt'] > since), 'userId'],
+            order_items.loc[(order_items['createdAt'] > since) | (order_items['orderUpdatedAt'] > since), 'userId'],
+            reviews.loc[reviews['updatedAt'] > since, 'userId'],
+        ])
+        user_ids = pd.unique(changed).astype(str)
+
+        return products_df, self._interactions(user_ids), user_ids
+
+    def load_popularity(self) -> pd.DataFrame:
+        """Conteos por producto, tipo y día como `load_popularity_from_db`"""
+        frames = []
+        for interaction_type, items in (
+            ('cart', self.tables['CartItem']),
+            ('order', self._order_items()),
+        ):
+            counts = (
+                items.assign(created_at=items['createdAt'].dt.floor('D'))
+                .groupby(['productId', 'created_at'], sort=False)
+                .size()
+                .rename('interactions')
+                .reset_index()
+                .rename(columns={'productId': 'product_id'})
+            )
+            counts['interaction_type'] = interaction_type
+            frames.append(counts)
+        return pd.concat(frames, ignore_index=True)[
+            ['product_id', 'interaction_type', 'created_at', 'interactions']
+        ]
+
+    def load_stock(self) -> pd.DataFrame:
+        """(id, stock) de cada producto como `load_stock_from_db`"""
+        return self.tables['Product'][['id', 'stock']].copy()
+
+    def _cart_items(self) -> pd.DataFrame:
+        carts = self.tables['Cart'].rename(columns={'id': 'cartId', 'updatedAt': 'cartUpdatedAt'})
+        return self.tables['CartItem'].merge(
+            carts[['cartId', 'userId', 'cartUpdatedAt']], on='cartId'
+        )
+
+    def _order_items(self, include_cancelled: bool = False) -> pd.DataFrame:
+        orders = self.tables['Order'].rename(columns={'id': 'orderId', 'updatedAt': 'orderUpdatedAt'})
+        if not include_cancelled:
+            orders = orders[orders['status'] != 'cancelled']
+        return self.tables['OrderItem'].merge(
+            orders[['orderId', 'userId', 'orderUpdatedAt']], on='orderId'
+        )
+
+    def _interactions(self, user_ids=None) -> pd.DataFrame:
+        cart_items = self._cart_items()
+        order_items = self._order_items()
+        reviews = self.tables['Review']
+        if user_ids is not None:
+            cart_items = cart_items[cart_items['userId'].isin(user_ids)]
+            order_items = order_items[order_items['userId'].isin(user_ids)]
+            reviews = reviews[reviews['userId'].isin(user_ids)]
+
+        frames = [
+            pd.DataFrame({
+                'user_id': cart_items['userId'].to_numpy(),
+                'product_id': cart_items['productId'].to_numpy(),
+                'interaction_score': cart_items['quantity'].to_numpy(),
+                'interaction_type': 'cart',
+                'created_at': cart_items['createdAt'].to_numpy(),
+            }),
+            pd.DataFrame({
+                'user_id': order_items['userId'].to_numpy(),
+                'product_id': order_items['productId'].to_numpy(),
+                # Órdenes valen más (igual que INTERACTIONS_QUERY)
+                'interaction_score': order_items['quantity'].to_numpy() * 3,
+                'interaction_type': 'order',
+                'created_at': order_items['createdAt'].to_numpy(),
+            }),
+            pd.DataFrame({
+                'user_id': reviews['userId'].to_numpy(),
+                'product_id': reviews['productId'].to_numpy(),
+                'interaction_score': reviews['rating'].to_numpy(),
+                'interaction_type': 'review',
+                'created_at': reviews['createdAt'].to_numpy(),
+            }),
+        ]
+        return pd.concat(frames, ignore_index=True)[_INTERACTION_COLUMNS]
+
+
+def dataset_summary(tables: Dict[str, pd.DataFrame]) -> Dict[str, int]:
+    """Filas por tabla (para el reporte)"""
+    return {name: int(len(table)) for name, table in tables.items()}
+
+
+def sample_ids(values, n: int, seed: int = 0) -> np.ndarray:
+    """`n` valores tomados con reemplazo (usuarios o productos de prueba)"""
+    values = np.asarray(values)
+    return values[np.random.default_rng(seed).integers(0, len(values), n)]
@@ -0,0 +1,299 @@
+"""
+Benchmark del entrenamiento y de las consultas de recomendaciones con datos
+sintéticos (sin PostgreSQL ni Redis).
+
+Entrena con `build_model` (el mismo código que el servidor) y reporta el
+tiempo de cada etapa de `training_stats['stages']`, además del tiempo y la
+memoria residente pico del entrenamiento completo. Mide la latencia
+(p50/p90/p95/p99) y el throughput de cada endpoint, y guarda
+el resultado en JSON. Con --baseline compara contra un resultado anterior
+y termina con código 1 si algo empeoró más que --tolerance.
+
+Ejemplos:
+    python benchmarks/run_benchmarks.py --scale small
+    python benchmarks/run_benchmarks.py --products 50000 --interactions 500000
+    python benchmarks/run_benchmarks.py --scale small --baseline benchmarks/results/anterior.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+# Agregar directorio del servicio al path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+
+from app.services.memory import peak_memory_mb, reset_peak_memory
+from app.services.recommendation_service import CF_ENGINES, RecommendationService
+from benchmarks.synthetic_data import SCALES, generate_dataset
+from benchmarks.data_source import InMemoryDataSource, dataset_summary, sample_ids
+
+
+RESULTS_DIR = Path(__file__).parent / 'results'
+
+# Métricas comparadas contra el baseline (más alto = peor salvo throughput)
+_LOWER_IS_BETTER = ('seconds', 'peak_rss_mb', 'p50_ms', 'p95_ms', 'p99_ms')
+_HIGHER_IS_BETTER = ('throughput_rps',)
+
+
+class StageTimer:
+    """Tiempo y memoria residente pico de cada etapa"""
+
+    def __init__(self):
+        self.stages = {}
+        self.per_stage_peak = reset_peak_memory()
+
+    def run(self, name: str, fn, *args, **kwargs):
+        reset_peak_memory()
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        peak = peak_memory_mb()
+        self.stages[name] = {
+            'seconds': round(seconds, 4),
+            'peak_rss_mb': round(peak, 1) if peak is not None else None,
+        }
+        print(f"[OK] {name}: {seconds:.2f}s, pico {self.stages[name]['peak_rss_mb']} MB")
+        return result
+
+
+def measure_latency(fn, calls: list, concurrency: int = 1, warmup: int = 5) -> dict:
+    """Latencia por llamada y throughput de `fn(*args)` para cada `args` de `calls`"""
+    for args in calls[:warmup]:
+        fn(*args)
+
+    def timed(args):
+        start = time.perf_counter()
+        fn(*args)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = np.fromiter(pool.map(timed, calls), dtype=np.float64, count=len(calls))
+    else:
+        latencies = np.fromiter(map(timed, calls), dtype=np.float64, count=len(calls))
+    wall = time.perf_counter() - start
+
+    p50, p90, p95, p99 = np.percentile(latencies, [50, 90, 95, 99]) * 1000
+    return {
+        'requests': len(calls),
+        'concurrency': concurrency,
+        'p50_ms': round(float(p50), 3),
+        'p90_ms': round(float(p90), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'max_ms': round(float(latencies.max()) * 1000, 3),
+        'throughput_rps': round(len(calls) / wall, 1) if wall > 0 else None,
+    }
+
+
+def run(args) -> dict:
+    n_products, n_interactions = SCALES.get(args.scale, (None, None))
+    n_products = args.products or n_products
+    n_interactions = args.interactions or n_interactions
+    timer = StageTimer()
+
+    print(f"[INFO] Generando {n_products} productos y {n_interactions} interacciones...")
+    tables = timer.run('generate', generate_dataset, n_products, n_interactions,
+                       n_users=args.users, seed=args.seed)
+    source = InMemoryDataSource(tables)
+    service = source.attach(RecommendationService(use_cache=False))
+
+    # Entrenamiento de producción; sus etapas vienen en training_stats['stages']
+    model = timer.run('build_model', service.build_model, args.cf_engine)
+    for name, seconds in model.training_stats['stages'].items():
+        timer.stages[f'build_model.{name}'] = {'seconds': seconds}
+    model = timer.run('save', service.save_model, model)
+    del model
+
+    # Las consultas se miden como en el servidor: modelo cargado de disco (mmap)
+    serving = source.attach(RecommendationService(use_cache=False))
+    timer.run('load_model', serving.load_model)
+
+    stages = timer.stages
+    training = ('build_model', 'save')
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'scale': args.scale if not (args.products or args.interactions) else 'custom',
+        'config': {
+            'products': n_products,
+            'interactions': n_interactions,
+            'users': args.users,
+            'seed': args.seed,
+            'cf_engine': args.cf_engine,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'batch_size': args.batch_size,
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'peak_rss_per_stage': timer.per_stage_peak,
+        },
+        'dataset': dataset_summary(tables),
+        'model': {key: value for key, value in serving.training_stats.items()
+                  if key != 'peak_memory_mb'},
+        'stages': stages,
+        'training': {
+            'seconds': round(sum(stages[name]['seconds'] for name in training), 4),
+            'peak_rss_mb': max((stages[name]['peak_rss_mb'] or 0) for name in training),
+        },
+    }
+    del tables
+
+    report['endpoints'] = benchmark_endpoints(serving, args)
+    return report
+
+
+class EventLoopThread:
+    """
+    Event loop en un hilo propio, como el de uvicorn: `call` ejecuta una
+    corrutina en él y espera el resultado (desde cualquier hilo).
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def call(self, fn):
+        return lambda *args: asyncio.run_coroutine_threadsafe(fn(*args), self.loop).result()
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+def benchmark_endpoints(service, args) -> dict:
+    """
+    Latencias de los métodos que atienden cada endpoint (sin caché): los
+    asíncronos que usa el servidor y sus equivalentes síncronos.
+    """
+    model = service.model
+    known_users = np.asarray(model.user_ids) if model.has_collaborative else np.empty(0, dtype=str)
+    # Una parte de usuarios nuevos para medir también el fallback de popularidad
+    n_anonymous = args.requests // 10 if known_users.size else args.requests
+    users = np.concatenate([
+        sample_ids(known_users, args.requests - n_anonymous, args.seed) if known_users.size else [],
+        [f'anon{i}' for i in range(n_anonymous)],
+    ]).astype(str)
+    np.random.default_rng(args.seed).shuffle(users)
+    products = sample_ids(model.product_ids, args.requests, args.seed)
+
+    endpoints = {}
+    print(f"[INFO] Midiendo endpoints ({args.requests} peticiones, concurrencia {args.concurrency})...")
+    endpoints['recommendations'] = measure_latency(
+        service.get_recommendations, [(user, 10) for user in users], args.concurrency
+    )
+    batches = [(list(users[i:i + args.batch_size]), 10)
+               for i in range(0, len(users), args.batch_size)]
+    endpoints['recommendations_batch'] = measure_latency(
+        service.get_recommendations_batch, batches, args.concurrency, warmup=1
+    )
+    endpoints['recommendations_batch']['batch_size'] = args.batch_size
+
+    event_loop = EventLoopThread()
+    try:
+        endpoints['recommendations_async'] = measure_latency(
+            event_loop.call(service.get_recommendations_async),
+            [(user, 10) for user in users], args.concurrency
+        )
+        endpoints['recommendations_batch_async'] = measure_latency(
+            event_loop.call(service.get_recommendations_batch_async), batches, args.concurrency, warmup=1
+        )
+        endpoints['recommendations_batch_async']['batch_size'] = args.batch_size
+    finally:
+        event_loop.close()
+    endpoints['similar_products'] = measure_latency(
+        service.get_similar_products, [(product, 5) for product in products], args.concurrency
+    )
+
+    for name, stats in endpoints.items():
+        print(f"[OK] {name}: p50 {stats['p50_ms']} ms, p95 {stats['p95_ms']} ms, "
+              f"p99 {stats['p99_ms']} ms, {stats['throughput_rps']} req/s")
+    return endpoints
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Métricas que empeoraron más que `tolerance` (fracción) respecto al baseline"""
+    regressions = []
+    for section in ('stages', 'training', 'endpoints'):
+        current, previous = report.get(section, {}), baseline.get(section, {})
+        # 'training' es un solo grupo de métricas
+        if section == 'training':
+            current, previous = {'total': current}, {'total': previous}
+        for name, metrics in current.items():
+            for metric, value in metrics.items():
+                old = previous.get(name, {}).get(metric)
+                if not isinstance(value, (int, float)) or not old:
+                    continue
+                change = (value - old) / old
+                worse = (
+                    change > tolerance if metric in _LOWER_IS_BETTER
+                    else -change > tolerance if metric in _HIGHER_IS_BETTER
+                    else False
+                )
+                if worse:
+                    regressions.append(f"{section}.{name}.{metric}: {old} -> {value} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small',
+                        help='Tamaño predefinido del dataset')
+    parser.add_argument('--products', type=int, default=None, help='Productos (reemplaza la escala)')
+    parser.add_argument('--interactions', type=int, default=None, help='Interacciones (reemplaza la escala)')
+    parser.add_argument('--users', type=int, default=None, help='Usuarios (por defecto interacciones / 20)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cf-engine', choices=CF_ENGINES, default='neighbors',
+                        help='Motor de Collaborative Filtering')
+    parser.add_argument('--requests', type=int, default=1000, help='Peticiones por endpoint')
+    parser.add_argument('--concurrency', type=int, default=1, help='Hilos que hacen peticiones')
+    parser.add_argument('--batch-size', type=int, default=100, help='Usuarios por petición batch')
+    parser.add_argument('--output', default=None, help='Archivo JSON de salida')
+    parser.add_argument('--baseline', default=None, help='Resultado anterior para detectar regresiones')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Empeoramiento relativo permitido respecto al baseline')
+    args = parser.parse_args()
+
+    # Modelos del benchmark en un directorio aparte (no toca trained_models/)
+    with tempfile.TemporaryDirectory(prefix='benchmark-models-') as model_dir:
+        os.environ['MODEL_DIR'] = model_dir
+        report = run(args)
+
+    output = Path(args.output) if args.output else (
+        RESULTS_DIR / f"{report['scale']}-{datetime.now():%Y%m%dT%H%M%S}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False, default=str), encoding='utf-8')
+    print(f"[OK] Resultados guardados en {output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"[ERROR] {len(regressions)} regresiones (tolerancia {args.tolerance:.0%}):")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print("[OK] Sin regresiones respecto al baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""
+Generador de datos sintéticos de e-commerce con las tablas de
+`backend/prisma/schema.prisma` (User, Product, Cart, CartItem, Order,
+OrderItem, Review).
+
+Todo se genera con numpy de forma vectorizada para llegar a millones de
+filas. La popularidad de los productos sigue una ley de potencias y cada
+usuario tiene una categoría favorita, así el modelo tiene señal que aprender.
+"""
+
+from typing import Dict, Optional
+import numpy as np
+import pandas as pd
+
+
+# Escalas predefinidas: (productos, interacciones)
+SCALES = {
+    'tiny': (1_000, 10_000),
+    'small': (10_000, 100_000),
+    'medium': (100_000, 1_000_000),
+    'large': (1_000_000, 10_000_000),
+}
+
+CATEGORIES = [
+    'Electrónica', 'Computación', 'Celulares', 'Hogar', 'Cocina', 'Deportes',
+    'Moda', 'Calzado', 'Belleza', 'Juguetes', 'Libros', 'Mascotas',
+    'Herramientas', 'Jardín', 'Automotriz', 'Oficina', 'Música', 'Salud',
+    'Bebés', 'Videojuegos',
+]
+
+_ADJECTIVES = ['Premium', 'Compacto', 'Inalámbrico', 'Clásico', 'Profesional', 'Ligero',
+               'Ecológico', 'Resistente', 'Portátil', 'Deluxe', 'Básico', 'Inteligente']
+_NOUNS = ['Kit', 'Set', 'Modelo', 'Pack', 'Edición', 'Serie', 'Combo', 'Versión']
+_BRANDS = ['Andes', 'Pacífico', 'Cóndor', 'Nova', 'Quantum', 'Sol', 'Atlas', 'Vértice']
+
+# Reparto de las interacciones entre tablas
+_CART_SHARE = 0.35
+_REVIEW_SHARE = 0.15
+_ORDER_STATUSES = np.array(['pending', 'processing', 'shipped', 'delivered', 'cancelled'])
+_ORDER_STATUS_P = [0.05, 0.05, 0.1, 0.75, 0.05]
+_ITEMS_PER_ORDER = 4
+
+
+def generate_dataset(
+    n_products: int,
+    n_interactions: int,
+    n_users: Optional[int] = None,
+    days: int = 365,
+    end: str = '2026-01-01',
+    category_affinity: float = 0.6,
+    seed: int = 0
+) -> Dict[str, pd.DataFrame]:
+    """
+    Genera las tablas del esquema Prisma.
+
+    Args:
+        n_products: Productos del catálogo
+        n_interactions: Filas totales de CartItem + OrderItem + Review
+            (antes de quitar duplicados de las restricciones únicas)
+        n_users: Usuarios (por defecto una vigésima parte de las interacciones)
+        days: Días de historia hacia atrás desde `end`
+        category_affinity: Probabilidad de que una interacción sea de la
+            categoría favorita del usuario
+        seed: Semilla del generador
+
+    Returns:
+        Diccionario nombre de tabla -> DataFrame con las columnas de Prisma
+    """
+    rng = np.random.default_rng(seed)
+    n_users = n_users or max(n_interactions // 20, 1)
+    end = pd.Timestamp(end)
+    start = end - pd.Timedelta(days=days)
+
+    products = _generate_products(rng, n_products, start, end)
+    users = _generate_users(rng, n_users, start)
+
+    # Usuarios muy activos y poco activos (Pareto) y productos populares (potencia)
+    activity = rng.pareto(1.5, n_users) + 1
+    user_codes = rng.choice(n_users, n_interactions, p=activity / activity.sum())
+    product_codes = _sample_products(rng, user_codes, n_products, category_affinity)
+    created_at = start + pd.to_timedelta(rng.random(n_interactions) * days * 86400, unit='s')
+
+    kind = rng.random(n_interactions)
+    is_cart = kind < _CART_SHARE
+    is_review = kind >= 1 - _REVIEW_SHARE
+    is_order = ~(is_cart | is_review)
+
+    tables = {'User': users, 'Product': products}
+    tables.update(_generate_carts(
+        rng, users, products, user_codes[is_cart], product_codes[is_cart], created_at[is_cart]
+    ))
+    tables.update(_generate_orders(
+        rng, users, products, user_codes[is_order], product_codes[is_order], created_at[is_order]
+    ))
+    tables['Review'] = _generate_reviews(
+        rng, users, products, user_codes[is_review], product_codes[is_review], created_at[is_review]
+    )
+    return tables
+
+
+def _ids(prefix: str, n: int) -> np.ndarray:
+    return (prefix + pd.Series(np.arange(n)).astype(str)).to_numpy(dtype=object)
+
+
+def _generate_products(rng, n: int, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+    categories = np.array(CATEGORIES)[np.arange(n) % len(CATEGORIES)]
+    adjectives = np.array(_ADJECTIVES)[rng.integers(0, len(_ADJECTIVES), n)]
+    nouns = np.array(_NOUNS)[rng.integers(0, len(_NOUNS), n)]
+    brands = np.array(_BRANDS)[rng.integers(0, len(_BRANDS), n)]
+    names = pd.Series(nouns, dtype=object) + ' ' + adjectives + ' ' + brands
+    descriptions = (
+        names + ' de la categoría ' + categories + ', ideal para uso diario. Marca ' + brands + '.'
+    )
+    created_at = start + (end - start) * rng.random(n) * 0.5
+
+    return pd.DataFrame({
+        'id': _ids('prod', n),
+        'name': names.to_numpy(),
+        'description': descriptions.to_numpy(),
+        'price': np.round(rng.lognormal(3.5, 1.0, n), 2),
+        'category': categories,
+        'stock': np.where(rng.random(n) < 0.1, 0, rng.integers(1, 500, n)),
+        'imageUrl': None,
+        'createdAt': created_at,
+        'updatedAt': created_at,
+    })
+
+
+def _generate_users(rng, n: int, start: pd.Timestamp) -> pd.DataFrame:
+    ids = _ids('user', n)
+    created_at = start - pd.to_timedelta(rng.integers(0, 365 * 86400, n), unit='s')
+    return pd.DataFrame({
+        'id': ids,
+        'email': ids + '@example.com',
+        'password': '',
+        'name': ids,
+        'role': 'user',
+        'createdAt': created_at,
+        'updatedAt': created_at,
+    })
+
+
+def _sample_products(rng, user_codes: np.ndarray, n_products: int,
+                     category_affinity: float) -> np.ndarray:
+    """
+    Los productos de la categoría `c` son `c, c + C, c + 2C...`; dentro de
+    cada categoría el rango de popularidad sigue una ley de potencias.
+    """
+    n_categories = min(len(CATEGORIES), n_products)
+    favorite = (user_codes * 7919) % n_categories
+    categories = np.where(
+        rng.random(user_codes.size) < category_affinity,
+        favorite,
+        rng.integers(0, n_categories, user_codes.size)
+    )
+    per_category = -(-n_products // n_categories)
+    ranks = np.floor(per_category * rng.random(user_codes.size) ** 3).astype(np.int64)
+    products = ranks * n_categories + categories
+    # La última fila de categorías puede estar incompleta
+    return np.where(products < n_products, products, categories)
+
+
+def _generate_carts(rng, users, products, user_codes, product_codes, created_at) -> Dict[str, pd.DataFrame]:
+    items = pd.DataFrame({'user': user_codes, 'product': product_codes, 'createdAt': created_at})
+    # @@unique([cartId, productId])
+    items = items.drop_duplicates(['user', 'product'], ignore_index=True)
+
+    cart_users, cart_codes = np.unique(items['user'].to_numpy(), return_inverse=True)
+    cart_ids = _ids('cart', cart_users.size)
+    cart_created = items.groupby(cart_codes)['createdAt'].min().to_numpy()
+    carts = pd.DataFrame({
+        'id': cart_ids,
+        'userId': users['id'].to_numpy()[cart_users],
+        'createdAt': cart_created,
+        'updatedAt': items.groupby(cart_codes)['createdAt'].max().to_numpy(),
+    })
+
+    cart_items = pd.DataFrame({
+        'id': _ids('ci', len(items)),
+        'cartId': cart_ids[cart_codes],
+        'productId': products['id'].to_numpy()[items['product'].to_numpy()],
+        'quantity': rng.integers(1, 4, len(items)),
+        'createdAt': items['createdAt'].to_numpy(),
+        'updatedAt': items['createdAt'].to_numpy(),
+    })
+    return {'Cart': carts, 'CartItem': cart_items}
+
+
+def _generate_orders(rng, users, products, user_codes, product_codes, created_at) -> Dict[str, pd.DataFrame]:
+    items = pd.DataFrame({'user': user_codes, 'product': product_codes, 'createdAt': created_at})
+    items = items.sort_values(['user', 'createdAt'], ignore_index=True)
+
+    # Hasta _ITEMS_PER_ORDER productos consecutivos del mismo usuario por orden
+    order_number = items.groupby('user').cumcount().to_numpy() // _ITEMS_PER_ORDER
+    keys = items['user'].to_numpy().astype(np.int64) * (order_number.max(initial=0) + 1) + order_number
+    _, order_codes = np.unique(keys, return_inverse=True)
+    n_orders = order_codes.max() + 1 if order_codes.size else 0
+
+    order_created = items.groupby(order_codes)['createdAt'].min().to_numpy()
+    order_users = items.groupby(order_codes)['user'].first().to_numpy()
+
+    prices = products['price'].to_numpy()[items['product'].to_numpy()]
+    quantities = rng.integers(1, 4, len(items))
+    totals = np.bincount(order_codes, weights=prices * quantities, minlength=n_orders)
+
+    order_ids = _ids('order', n_orders)
+    orders = pd.DataFrame({
+        'id': order_ids,
+        'userId': users['id'].to_numpy()[order_users],
+        'status': rng.choice(_ORDER_STATUSES, n_orders, p=_ORDER_STATUS_P),
+        'total': np.round(totals, 2),
+        'createdAt': order_created,
+        'updatedAt': order_created,
+    })
+    order_items = pd.DataFrame({
+        'id': _ids('oi', len(items)),
+        'orderId': order_ids[order_codes],
+        'productId': products['id'].to_numpy()[items['product'].to_numpy()],
+        'quantity': quantities,
+        'price': prices,
+        'createdAt': order_created[order_codes],
+    })
+    return {'Order': orders, 'OrderItem': order_items}
+
+
+def _generate_reviews(rng, users, products, user_codes, product_codes, created_at) -> pd.DataFrame:
+    items = pd.DataFrame({'user': user_codes, 'product': product_codes, 'createdAt': created_at})
+    # @@unique([userId, productId])
+    items = items.drop_duplicates(['user', 'product'], ignore_index=True)
+    return pd.DataFrame({
+        'id': _ids('rev', len(items)),
+        'userId': users['id'].to_numpy()[items['user'].to_numpy()],
+        'productId': products['id'].to_numpy()[items['product'].to_numpy()],
+        'rating': rng.choice(np.arange(1, 6), len(items), p=[0.05, 0.05, 0.15, 0.35, 0.4]),
+        'comment': None,
+        'createdAt': items['createdAt'].to_numpy(),
+        'updatedAt': items['createdAt'].to_numpy(),
+    })
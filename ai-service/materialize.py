@@ -0,0 +1,43 @@
+"""
+Script para materializar en Redis las recomendaciones de todos los usuarios
+con el último modelo guardado (sin reentrenar).
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Agregar directorio al path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.services.recommendation_service import RecommendationService
+from app.services.materialization import materialize_recommendations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--top-n', type=int, default=None, help='Recomendaciones por usuario')
+    parser.add_argument('--workers', type=int, default=None, help='Procesos del pool')
+    parser.add_argument('--version', default=None, help='Versión del modelo (por defecto la más reciente)')
+    args = parser.parse_args()
+
+    service = RecommendationService()
+    if service.redis_client is None:
+        print("[ERROR] Redis no está disponible")
+        sys.exit(1)
+    if not service.load_model(args.version):
+        print("[ERROR] No hay modelos guardados; entrena primero con /api/recommendations/train")
+        sys.exit(1)
+
+    stats = materialize_recommendations(service, n=args.top_n, workers=args.workers)
+    if not stats:
+        print("[INFO] El modelo no tiene usuarios con interacciones; nada que materializar")
+        return
+    print(f"[OK] {stats['users']} usuarios en {stats['seconds']}s "
+          f"({stats['users_per_second']} usuarios/s, versión {stats['model_version']})")
+
+
+if __name__ == '__main__':
+    main()
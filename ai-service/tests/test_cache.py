@@ -0,0 +1,97 @@
+"""Pruebas de la caché de dos niveles (Redis simulado con fakeredis)"""
+
+import asyncio
+import json
+
+import fakeredis
+import pytest
+
+from app.services import cache as cache_module
+from app.services.cache import LRUCache, TwoTierCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Reloj manual para controlar la expiración del LRU"""
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_lru_expires_entries_after_ttl(clock):
+    lru = LRUCache(max_size=10, ttl=5)
+    lru.set('a', 1)
+
+    clock[0] += 4.9
+    assert lru.get('a') == 1
+
+    clock[0] += 0.2
+    assert lru.get('a') is None
+    assert lru.expirations == 1
+    assert len(lru) == 0
+
+
+def test_lru_evicts_least_recently_used():
+    lru = LRUCache(max_size=2, ttl=60)
+    lru.set('a', 1)
+    lru.set('b', 2)
+    # Leer 'a' la vuelve la más reciente: sale 'b'
+    assert lru.get('a') == 1
+    lru.set('c', 3)
+
+    assert lru.get('b') is None
+    assert lru.get('a') == 1
+    assert lru.get('c') == 3
+    assert lru.evictions == 1
+
+
+def test_lru_disabled_with_zero_size():
+    lru = LRUCache(max_size=0)
+    lru.set('a', 1)
+    assert lru.get('a') is None
+
+
+def test_two_tier_reads_shared_entries_into_local():
+    redis_client = fakeredis.FakeRedis()
+    writer = TwoTierCache(LRUCache(), redis_client)
+    writer.set_many({'k1': [1, 2], 'k2': {'x': 1}}, ttl=60)
+    assert 0 < redis_client.ttl('k1') <= 60
+
+    # Otro worker: nivel local vacío, mismo Redis
+    reader = TwoTierCache(LRUCache(), redis_client)
+    assert reader.get_many(['k1', 'k2', 'k3']) == {'k1': [1, 2], 'k2': {'x': 1}}
+    assert (reader.redis_hits, reader.redis_misses) == (2, 1)
+    assert reader.local.get('k1') == [1, 2]
+
+
+def test_two_tier_local_only_entries_skip_redis():
+    redis_client = fakeredis.FakeRedis()
+    cache = TwoTierCache(LRUCache(), redis_client)
+    cache.set('similar', [1], ttl=60, shared=False)
+
+    assert redis_client.get('similar') is None
+    assert cache.get('similar', shared=False) == [1]
+
+
+def test_two_tier_keeps_working_without_redis():
+    server = fakeredis.FakeServer()
+    server.connected = False
+    cache = TwoTierCache(LRUCache(), fakeredis.FakeRedis(server=server))
+    cache.set('k', 1, ttl=60)
+
+    assert cache.get('k') == 1
+    assert cache.get('otra') is None
+    assert cache.redis_errors == 2
+
+
+def test_two_tier_async_round_trip():
+    async def scenario():
+        redis_client = fakeredis.FakeAsyncRedis()
+        writer = TwoTierCache(LRUCache(), async_redis_client=redis_client)
+        await writer.set_many_async({'k': [3, 4]}, ttl=30)
+        assert json.loads(await redis_client.get('k')) == [3, 4]
+
+        reader = TwoTierCache(LRUCache(), async_redis_client=redis_client)
+        return await reader.get_many_async(['k', 'falta'])
+
+    assert asyncio.run(scenario()) == {'k': [3, 4]}
@@ -0,0 +1,54 @@
+"""Pruebas de las métricas de ranking de la evaluación offline"""
+
+import numpy as np
+import pytest
+
+from app.services.evaluation import ranking_metrics
+
+EMPTY = np.empty(0, dtype=np.int64)
+
+
+def metrics(users, products, relevant_users, relevant_products, n_users=2, n_products=5, k=2):
+    return ranking_metrics(
+        np.array(users), np.array(products), np.array(relevant_users, dtype=np.int64),
+        np.array(relevant_products, dtype=np.int64), n_users, n_products, k
+    )
+
+
+@pytest.mark.parametrize('k', [0, -3])
+def test_rejects_k_below_one(k):
+    with pytest.raises(ValueError):
+        ranking_metrics(EMPTY, EMPTY, EMPTY, EMPTY, 1, 1, k)
+
+
+def test_without_test_users_everything_is_zero():
+    result = ranking_metrics(EMPTY, EMPTY, EMPTY, EMPTY, 0, 0, 10)
+    assert set(result.values()) == {0.0}
+
+
+def test_hits_and_ranks():
+    # Usuario 0 acierta en la posición 2; usuario 1 acierta en la 1 con 2 relevantes
+    result = metrics([0, 0, 1, 1], [1, 2, 0, 3], [0, 1, 1], [2, 0, 4])
+
+    assert result['precision_at_k'] == pytest.approx((1 / 2 + 1 / 2) / 2)
+    assert result['recall_at_k'] == pytest.approx((1 + 1 / 2) / 2)
+    assert result['hit_rate'] == 1.0
+    assert result['coverage'] == pytest.approx(4 / 5)
+    ndcg_user0 = (1 / np.log2(3)) / 1
+    ndcg_user1 = 1 / (1 + 1 / np.log2(3))
+    assert result['ndcg_at_k'] == pytest.approx((ndcg_user0 + ndcg_user1) / 2)
+
+
+def test_users_without_relevant_items_count_as_zero():
+    with np.errstate(all='raise'):
+        result = metrics([0, 1], [1, 2], [0], [1])
+
+    assert result['recall_at_k'] == pytest.approx(0.5)
+    assert result['ndcg_at_k'] == pytest.approx(0.5)
+    assert result['hit_rate'] == pytest.approx(0.5)
+
+
+def test_no_relevant_items_at_all():
+    with np.errstate(all='raise'):
+        result = metrics([0, 1], [1, 2], [], [])
+    assert result['recall_at_k'] == result['ndcg_at_k'] == result['hit_rate'] == 0.0
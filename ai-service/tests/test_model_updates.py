@@ -0,0 +1,75 @@
+"""Pruebas de las estructuras que se actualizan en los entrenamientos incrementales"""
+
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
+from app.services.interaction_loader import _PairSums
+from app.services.neighbor_index import NeighborIndex
+from app.services.sparse_utils import replace_rows
+
+
+def random_features(n_products, seed=0):
+    return np.random.default_rng(seed).random((n_products, 8)).astype(np.float32)
+
+
+def test_neighbor_index_update_matches_full_build_for_new_products():
+    features = random_features(60)
+    index = NeighborIndex.build(features[:50], k=5)
+
+    # Agregar 10 productos y cambiar 2 existentes
+    features[[3, 7]] = random_features(2, seed=1)
+    changed = np.r_[3, 7, np.arange(50, 60)]
+    updated = index.update(features, changed, k=5)
+    rebuilt = NeighborIndex.build(features, k=5)
+
+    assert len(updated) == 60
+    np.testing.assert_array_equal(updated.indices[changed], rebuilt.indices[changed])
+    np.testing.assert_allclose(updated.scores[changed], rebuilt.scores[changed], rtol=1e-5)
+    # Ningún producto es vecino de sí mismo y las listas siguen ordenadas
+    assert not (updated.indices == np.arange(60)[:, None]).any()
+    assert (np.diff(updated.scores, axis=1) <= 1e-6).all()
+
+
+def test_neighbor_index_update_without_changes_keeps_lists():
+    features = random_features(20)
+    index = NeighborIndex.build(features, k=4)
+    updated = index.update(features, np.empty(0, dtype=np.int64), k=4)
+
+    np.testing.assert_array_equal(updated.indices, index.indices)
+
+
+def test_neighbors_filters_by_min_score():
+    index = NeighborIndex(
+        np.array([[2, 1, -1]], dtype=np.int32),
+        np.array([[0.9, 0.05, -np.inf]], dtype=np.float32),
+    )
+    indices, scores = index.neighbors(0, min_score=0.1)
+    assert indices.tolist() == [2]
+    assert scores.tolist() == [np.float32(0.9)]
+
+
+def test_replace_rows_replaces_and_appends():
+    matrix = csr_matrix(np.array([[1, 0], [0, 2]], dtype=np.float32))
+    new_rows = csr_matrix(np.array([[0, 5, 6], [7, 0, 0]], dtype=np.float32))
+    result = replace_rows(matrix, np.array([0, 2]), new_rows, shape=(3, 3))
+
+    assert result.toarray().tolist() == [[0, 5, 6], [0, 2, 0], [7, 0, 0]]
+
+
+def test_replace_rows_requires_every_new_row():
+    matrix = csr_matrix((1, 2), dtype=np.float32)
+    # Falta la fila 1
+    with pytest.raises(ValueError):
+        replace_rows(matrix, np.array([2]), None, shape=(3, 2))
+
+
+def test_pair_sums_adds_repeated_keys_across_compactions():
+    sums = _PairSums(compact_rows=2)
+    sums.add(np.array([5, 1]), np.array([1.0, 2.0], dtype=np.float32))
+    sums.add(np.array([1, 3, 5]), np.array([0.5, 4.0, 1.0], dtype=np.float32))
+    sums.add(np.array([0]), np.array([3.0], dtype=np.float32))
+
+    # n_productos = 3: clave 5 = (1, 2), 1 = (0, 1), 3 = (1, 0), 0 = (0, 0)
+    matrix = sums.to_csr(n_users=2, n_products=3, dtype=np.float32)
+    assert matrix.toarray().tolist() == [[3.0, 2.5, 0.0], [4.0, 0.0, 2.0]]
@@ -0,0 +1,96 @@
+"""Pruebas del ordenamiento de scores y de la fusión de fuentes"""
+
+import numpy as np
+import pytest
+
+from app.services.fusion import fuse, normalize_per_group
+from app.services.scoring import top_n_per_group, top_n_per_row
+
+
+def test_top_n_per_row_orders_by_score_and_breaks_ties_by_column():
+    scores = np.array([
+        [0.5, 0.9, 0.5, 0.1],
+        [0.0, 0.3, 0.7, 0.7],
+    ])
+    rows, columns, values = top_n_per_row(scores, 3)
+
+    assert rows.tolist() == [0, 0, 0, 1, 1, 1]
+    assert columns.tolist() == [1, 0, 2, 2, 3, 1]
+    assert values.tolist() == [0.9, 0.5, 0.5, 0.7, 0.7, 0.3]
+
+
+def test_top_n_per_row_drops_scores_at_or_below_min_score():
+    scores = np.array([[0.0, 0.2, -1.0], [0.0, 0.0, 0.0]])
+    rows, columns, _ = top_n_per_row(scores, 3)
+
+    assert rows.tolist() == [0]
+    assert columns.tolist() == [1]
+
+
+@pytest.mark.parametrize('n', [0, -1])
+def test_top_n_per_row_without_n_is_empty(n):
+    rows, columns, values = top_n_per_row(np.ones((2, 3)), n)
+    assert rows.size == columns.size == values.size == 0
+
+
+def test_top_n_per_row_caps_n_at_columns():
+    rows, columns, _ = top_n_per_row(np.array([[0.2, 0.1]]), 10)
+    assert columns.tolist() == [0, 1]
+
+
+def test_top_n_per_group_keeps_n_per_group_in_order():
+    groups = np.array([1, 0, 1, 0, 1, 1])
+    scores = np.array([0.1, 0.4, 0.8, 0.9, 0.8, 0.3])
+    tiebreak = np.array([7, 0, 5, 1, 2, 3])
+    top = top_n_per_group(groups, scores, 2, tiebreak=tiebreak)
+
+    assert groups[top].tolist() == [0, 0, 1, 1]
+    assert scores[top].tolist() == [0.9, 0.4, 0.8, 0.8]
+    # Empate en 0.8 del grupo 1: gana el menor tiebreak (2 antes que 5)
+    assert tiebreak[top].tolist() == [1, 0, 2, 5]
+
+
+def test_top_n_per_group_without_n_is_empty():
+    assert top_n_per_group(np.array([0]), np.array([1.0]), 0).size == 0
+    assert top_n_per_group(np.empty(0, dtype=np.int64), np.empty(0), 3).size == 0
+
+
+def test_normalize_per_group_scales_each_group():
+    groups = np.array([0, 0, 0, 1])
+    scores = np.array([2.0, 4.0, 3.0, 5.0])
+    # Un grupo con un solo valor queda en 1
+    assert normalize_per_group(groups, scores, 2).tolist() == [0.0, 1.0, 0.5, 1.0]
+
+
+def test_fuse_sums_weighted_sources_and_ranks_per_group():
+    collaborative = (np.array([0, 0, 0]), np.array([1, 2, 3]), np.array([10.0, 5.0, 0.0]))
+    content = (np.array([0, 0, 1]), np.array([3, 4, 0]), np.array([0.9, 0.1, 0.5]))
+    groups, items, scores = fuse([collaborative, content], [0.9, 0.1], n_groups=2, n_items=5, n=3)
+
+    assert groups.tolist() == [0, 0, 0, 1]
+    # Producto 3: 0 en CF + 0.1 en CB; producto 2: 0.45 en CF
+    assert items.tolist() == [1, 2, 3, 0]
+    np.testing.assert_allclose(scores, [0.9, 0.45, 0.1, 0.1])
+
+
+def test_fuse_breaks_ties_by_item():
+    source = (np.array([0, 0, 0]), np.array([4, 2, 3]), np.array([1.0, 1.0, 0.0]))
+    _, items, _ = fuse([source], [1.0], n_groups=1, n_items=5, n=2)
+    assert items.tolist() == [2, 4]
+
+
+def test_fuse_skips_groups_without_candidates():
+    source = (np.array([2]), np.array([1]), np.array([3.0]))
+    groups, items, scores = fuse([source], [1.0], n_groups=3, n_items=2, n=5)
+
+    assert groups.tolist() == [2]
+    assert items.tolist() == [1]
+    assert scores.tolist() == [1.0]
+
+
+def test_fuse_without_candidates_or_n_is_empty():
+    empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0))
+    assert fuse([empty], [1.0], n_groups=2, n_items=3, n=5)[0].size == 0
+
+    source = (np.array([0]), np.array([1]), np.array([1.0]))
+    assert fuse([source], [1.0], n_groups=1, n_items=3, n=0)[0].size == 0
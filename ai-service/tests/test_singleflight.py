@@ -0,0 +1,99 @@
+"""Pruebas de la coalescencia de cálculos (SingleFlight y RedisComputeLock)"""
+
+import asyncio
+
+import fakeredis
+import pytest
+
+from app.services.cache import LRUCache, TwoTierCache
+from app.services.singleflight import RedisComputeLock, SingleFlight
+
+
+def test_concurrent_misses_compute_once():
+    calls = []
+
+    async def get(flight, key):
+        own, waiting = flight.claim([key])
+        if waiting:
+            return await waiting[key]
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        flight.resolve({key: f'valor-{key}'}, own)
+        return f'valor-{key}'
+
+    async def scenario():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(get(flight, 'u1') for _ in range(10)))
+        return flight, results
+
+    flight, results = asyncio.run(scenario())
+    assert calls == ['u1']
+    assert results == ['valor-u1'] * 10
+    assert flight.stats() == {'inflight': 0, 'leaders': 1, 'coalesced': 9}
+
+
+def test_missing_result_fails_waiters():
+    async def scenario():
+        flight = SingleFlight()
+        own, _ = flight.claim(['a', 'b'])
+        _, waiting = flight.claim(['a', 'b'])
+        # El líder solo obtuvo 'a'
+        flight.resolve({'a': 1}, own)
+        assert await waiting['a'] == 1
+        with pytest.raises(LookupError):
+            await waiting['b']
+        # La clave quedó libre para recalcularse
+        assert flight.claim(['b'])[0] == ['b']
+
+    asyncio.run(scenario())
+
+
+def test_lock_lets_one_worker_compute():
+    async def scenario():
+        redis_client = fakeredis.FakeAsyncRedis()
+        first, second = RedisComputeLock(redis_client), RedisComputeLock(redis_client)
+
+        acquired, token = await first.acquire(['a', 'b'])
+        assert acquired == ['a', 'b']
+        assert (await second.acquire(['a', 'b', 'c']))[0] == ['c']
+
+        await first.release(acquired, token)
+        assert await redis_client.exists('lock:a', 'lock:b') == 0
+        assert await redis_client.exists('lock:c') == 1
+
+    asyncio.run(scenario())
+
+
+def test_release_keeps_lock_taken_by_another_worker():
+    async def scenario():
+        redis_client = fakeredis.FakeAsyncRedis()
+        slow, other = RedisComputeLock(redis_client), RedisComputeLock(redis_client)
+
+        acquired, slow_token = await slow.acquire(['a'])
+        # El lock expira mientras `slow` calcula y lo toma otro worker
+        await redis_client.delete('lock:a')
+        assert (await other.acquire(['a']))[0] == ['a']
+
+        await slow.release(acquired, slow_token)
+        assert await redis_client.exists('lock:a') == 1
+
+    asyncio.run(scenario())
+
+
+def test_waiting_worker_reads_published_result():
+    async def scenario():
+        redis_client = fakeredis.FakeAsyncRedis()
+        lock = RedisComputeLock(redis_client, wait_timeout=1.0, poll_interval=0.01)
+        leader = TwoTierCache(LRUCache(), async_redis_client=redis_client)
+        follower = TwoTierCache(LRUCache(), async_redis_client=redis_client)
+
+        async def publish():
+            await asyncio.sleep(0.03)
+            await leader.set_many_async({'k': [1]}, ttl=60)
+
+        found, _ = await asyncio.gather(lock.wait_for(['k'], follower), publish())
+        return lock, found
+
+    lock, found = asyncio.run(scenario())
+    assert found == {'k': [1]}
+    assert (lock.wait_hits, lock.timeouts) == (1, 0)
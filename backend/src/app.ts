@@ -19,6 +19,8 @@ const PORT = process.env.BACKEND_PORT || 3001;
 
 // Middleware
 app.use(cors());
+// La carga masiva de productos envía lotes de miles de productos
+app.use('/api/products/bulk', express.json({ limit: process.env.BULK_BODY_LIMIT || '20mb' }));
 app.use(express.json());
 app.use(express.urlencoded({ extended: true }));
 
@@ -1,7 +1,11 @@
 import { Request, Response, NextFunction } from 'express';
+import axios from 'axios';
 import { z } from 'zod';
 import { prisma } from '../utils/prisma';
 import { AppError } from '../middleware/errorHandler';
+import { logger } from '../utils/logger';
+
+const AI_SERVICE_URL = process.env.AI_SERVICE_URL || 'http://localhost:8000';
 
 const productSchema = z.object({
   name: z.string().min(1),
@@ -12,6 +16,33 @@ const productSchema = z.object({
   imageUrl: z.string().url().optional(),
 });
 
+// Carga masiva: productos por petición y por inserción (INSERT de varias filas)
+const MAX_BULK_PRODUCTS = parseInt(process.env.BULK_MAX_PRODUCTS || '10000');
+const DEFAULT_BULK_BATCH_SIZE = parseInt(process.env.BULK_BATCH_SIZE || '500');
+const MAX_BULK_BATCH_SIZE = 2000;
+
+const bulkSchema = z.object({
+  // Cada producto se valida por separado: uno inválido no rechaza el lote
+  products: z.array(z.unknown()).min(1).max(MAX_BULK_PRODUCTS),
+  batchSize: z.number().int().positive().max(MAX_BULK_BATCH_SIZE).optional(),
+  // Pedir al AI Service una actualización incremental al terminar
+  refresh: z.boolean().optional(),
+});
+
+type ProductInput = z.infer<typeof productSchema>;
+
+interface BatchSummary {
+  batch: number;
+  received: number;
+  invalid: number;
+  created: number;
+  duplicates: number;
+  failed: number;
+  errors?: string[];
+}
+
+const nameKey = (name: string) => name.trim().toLowerCase();
+
 // VI-60: Visualización del inventario
 export const getProducts = async (req: Request, res: Response, next: NextFunction) => {
   try {
@@ -107,6 +138,125 @@ export const createProduct = async (req: Request, res: Response, next: NextFunct
   }
 };
 
+// Carga masiva de productos (importador): por lotes, sin repetir nombre ni imagen
+export const bulkCreateProducts = async (req: Request, res: Response, next: NextFunction) => {
+  try {
+    const {
+      products,
+      batchSize = DEFAULT_BULK_BATCH_SIZE,
+      refresh = true,
+    } = bulkSchema.parse(req.body);
+
+    // Nombres (sin mayúsculas) e imágenes ya existentes o creados en esta petición
+    const knownNames = new Set<string>();
+    const knownUrls = new Set<string>();
+    const batches: BatchSummary[] = [];
+
+    for (let start = 0; start < products.length; start += batchSize) {
+      const parsed = products
+        .slice(start, start + batchSize)
+        .map((product) => productSchema.safeParse(product));
+      const chunk = parsed.flatMap((result) =>
+        result.success ? [{ ...result.data, name: result.data.name.trim() }] : []
+      );
+      const summary: BatchSummary = {
+        batch: batches.length + 1,
+        received: parsed.length,
+        invalid: parsed.length - chunk.length,
+        created: 0,
+        duplicates: 0,
+        failed: 0,
+      };
+      batches.push(summary);
+      // Los primeros errores de validación, para corregir el importador
+      const validationErrors = parsed
+        .flatMap((result, index) => {
+          if (result.success) return [];
+          const issues = result.error.errors.map((e) => `${e.path.join('.')} ${e.message}`);
+          return [`producto ${start + index}: ${issues.join(', ')}`];
+        })
+        .slice(0, 5);
+      if (validationErrors.length > 0) summary.errors = validationErrors;
+
+      try {
+        const existing = await prisma.product.findMany({
+          where: {
+            OR: [
+              { name: { in: chunk.map((product) => product.name), mode: 'insensitive' } },
+              { imageUrl: { in: chunk.flatMap((product) => (product.imageUrl ? [product.imageUrl] : [])) } },
+            ],
+          },
+          select: { name: true, imageUrl: true },
+        });
+        existing.forEach((product) => {
+          knownNames.add(nameKey(product.name));
+          if (product.imageUrl) knownUrls.add(product.imageUrl);
+        });
+
+        const batchNames = new Set<string>();
+        const batchUrls = new Set<string>();
+        const fresh: ProductInput[] = chunk.filter((product) => {
+          const key = nameKey(product.name);
+          const url = product.imageUrl;
+          if (knownNames.has(key) || batchNames.has(key) || (url && (knownUrls.has(url) || batchUrls.has(url)))) {
+            return false;
+          }
+          batchNames.add(key);
+          if (url) batchUrls.add(url);
+          return true;
+        });
+        summary.duplicates = chunk.length - fresh.length;
+
+        if (fresh.length > 0) {
+          // Un solo INSERT por lote: o entra completo o no entra
+          const { count } = await prisma.product.createMany({ data: fresh });
+          summary.created = count;
+        }
+        batchNames.forEach((key) => knownNames.add(key));
+        batchUrls.forEach((url) => knownUrls.add(url));
+      } catch (error: any) {
+        summary.failed = chunk.length - summary.duplicates - summary.created;
+        summary.errors = [...(summary.errors || []), error.message];
+        logger.error({ error: error.message, path: req.path, batch: summary.batch });
+      }
+    }
+
+    const total = (key: 'received' | 'invalid' | 'created' | 'duplicates' | 'failed') =>
+      batches.reduce((sum, batch) => sum + batch[key], 0);
+    const created = total('created');
+    const failed = total('failed');
+    const invalid = total('invalid');
+
+    // El AI Service solo procesa los cambios desde su último entrenamiento
+    let modelRefresh: { jobId?: string; status?: string; error?: string } | null = null;
+    if (refresh && created > 0) {
+      try {
+        const response = await axios.post(`${AI_SERVICE_URL}/api/recommendations/refresh`);
+        modelRefresh = { jobId: response.data.job_id, status: response.data.status };
+      } catch (error: any) {
+        logger.warn(`No se pudo pedir la actualización del modelo: ${error.message}`);
+        modelRefresh = { error: error.message };
+      }
+    }
+
+    res.status(created > 0 ? 201 : 200).json({
+      success: failed === 0 && invalid === 0,
+      message: `${created} productos creados, ${total('duplicates')} repetidos, ${invalid} inválidos, ${failed} fallidos`,
+      summary: {
+        received: total('received'),
+        invalid,
+        created,
+        duplicates: total('duplicates'),
+        failed,
+      },
+      batches,
+      modelRefresh,
+    });
+  } catch (error) {
+    next(error);
+  }
+};
+
 // VI-58: Edición de productos
 export const updateProduct = async (req: Request, res: Response, next: NextFunction) => {
   try {
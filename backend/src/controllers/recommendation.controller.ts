@@ -8,9 +8,12 @@ export const getRecommendations = async (req: Request, res: Response, next: Next
   try {
     const { userId } = req.params;
     const limit = parseInt(req.query.limit as string) || 10;
+    // Filtros aplicados por el servicio de IA antes de elegir el top
+    const inStockOnly = req.query.in_stock_only === 'true';
+    const category = req.query.category as string | undefined;
 
     const response = await axios.get(`${AI_SERVICE_URL}/api/recommendations/${userId}`, {
-      params: { limit },
+      params: { limit, in_stock_only: inStockOnly, ...(category && { category }) },
     });
 
     res.json({
@@ -32,9 +35,11 @@ export const getSimilarProducts = async (req: Request, res: Response, next: Next
   try {
     const { productId } = req.params;
     const limit = parseInt(req.query.limit as string) || 5;
+    const inStockOnly = req.query.in_stock_only === 'true';
+    const category = req.query.category as string | undefined;
 
     const response = await axios.get(`${AI_SERVICE_URL}/api/recommendations/product/${productId}`, {
-      params: { limit },
+      params: { limit, in_stock_only: inStockOnly, ...(category && { category }) },
     });
 
     res.json({
@@ -52,15 +57,54 @@ export const getSimilarProducts = async (req: Request, res: Response, next: Next
   }
 };
 
+const TRAINING_POLL_INTERVAL_MS = 1000;
+const TRAINING_TIMEOUT_MS = 10 * 60 * 1000;
+
 export const trainModel = async (req: Request, res: Response, next: NextFunction) => {
   try {
+    // El AI Service entrena en segundo plano; esperamos a que el trabajo termine
     const response = await axios.post(`${AI_SERVICE_URL}/api/recommendations/train`);
+    const { job_id: jobId } = response.data;
+
+    const deadline = Date.now() + TRAINING_TIMEOUT_MS;
+    let job = { status: response.data.status } as any;
+    while (job.status === 'queued' || job.status === 'running') {
+      if (Date.now() > deadline) {
+        throw new AppError('El entrenamiento del modelo excedió el tiempo de espera', 504);
+      }
+      await new Promise((resolve) => setTimeout(resolve, TRAINING_POLL_INTERVAL_MS));
+      const statusResponse = await axios.get(`${AI_SERVICE_URL}/api/recommendations/train/${jobId}`);
+      job = statusResponse.data.job;
+    }
+
+    if (job.status === 'failed') {
+      throw new AppError(`Error al entrenar modelo: ${job.error}`, 500);
+    }
 
+    const accuracy = job.result?.accuracy ?? 0;
     res.json({
       success: true,
-      message: response.data.message,
-      accuracy: response.data.accuracy_percent,
-      targetMet: response.data.target_met,
+      message: 'Modelo entrenado exitosamente',
+      jobId,
+      accuracy: Math.round(accuracy * 10000) / 100,
+      targetMet: accuracy >= 0.8,
+      durationSeconds: job.duration_seconds,
+    });
+  } catch (error) {
+    next(error);
+  }
+};
+
+export const refreshModel = async (req: Request, res: Response, next: NextFunction) => {
+  try {
+    // Actualización incremental: solo productos e interacciones nuevos o modificados
+    const response = await axios.post(`${AI_SERVICE_URL}/api/recommendations/refresh`);
+
+    res.status(202).json({
+      success: true,
+      message: 'Actualización del modelo en curso',
+      jobId: response.data.job_id,
+      status: response.data.status,
     });
   } catch (error) {
     next(error);
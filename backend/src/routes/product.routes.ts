@@ -3,6 +3,7 @@ import {
   getProducts,
   getProductById,
   createProduct,
+  bulkCreateProducts,
   updateProduct,
   deleteProduct,
   updateStock,
@@ -17,6 +18,7 @@ router.get('/:id', getProductById);
 
 // Protegidas (solo admin)
 router.post('/', authenticate, requireRole('admin'), createProduct);
+router.post('/bulk', authenticate, requireRole('admin'), bulkCreateProducts);
 router.put('/:id', authenticate, requireRole('admin'), updateProduct);
 router.delete('/:id', authenticate, requireRole('admin'), deleteProduct);
 router.patch('/:id/stock', authenticate, requireRole('admin'), updateStock);
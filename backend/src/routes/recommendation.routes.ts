@@ -5,6 +5,7 @@ import {
   getRecommendations,
   getSimilarProducts,
   trainModel,
+  refreshModel,
   getModelAccuracy,
 } from '../controllers/recommendation.controller';
 
@@ -18,6 +19,7 @@ router.get('/user/:userId', authenticate, getRecommendations);
 
 // Rutas de administración (solo admin)
 router.post('/train', authenticate, requireRole('admin'), trainModel);
+router.post('/refresh', authenticate, requireRole('admin'), refreshModel);
 router.get('/accuracy', authenticate, requireRole('admin'), getModelAccuracy);
 
 export default router;
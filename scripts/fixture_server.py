@@ -0,0 +1,81 @@
+"""
+Servidor local que reemplaza a las tiendas al probar import-products.py
+sin internet.
+
+Sirve los HTML de scripts/fixtures ignorando el query string; `{{page}}`
+en el HTML se reemplaza por el parámetro `page` de la URL, así cada página
+de resultados trae productos distintos. Con --delay-ms simula la latencia
+de un sitio real y con --fail-every responde 503 cada N peticiones (para
+probar los reintentos).
+
+Ejemplo:
+    python scripts/fixture_server.py --delay-ms 200
+    python scripts/import-products.py --dry-run --pages 5 \
+        --urls http://127.0.0.1:8765/amazon-search.html http://127.0.0.1:8765/tienda.html
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+import argparse
+import itertools
+import time
+
+FIXTURES_DIR = Path(__file__).parent / 'fixtures'
+
+def make_handler(fixtures_dir, delay, fail_every):
+    requests_seen = itertools.count(1)
+
+    class FixtureHandler(BaseHTTPRequestHandler):
+        # HTTP/1.1: conexiones keep-alive como las del pool del importador
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            path = (fixtures_dir / parts.path.lstrip('/')).resolve()
+            time.sleep(delay)
+
+            if fail_every and next(requests_seen) % fail_every == 0:
+                return self.respond(503, b'Servicio no disponible')
+            if fixtures_dir not in path.parents or not path.is_file():
+                return self.respond(404, b'No encontrado')
+
+            page = parse_qs(parts.query).get('page', ['1'])[0]
+            body = path.read_text(encoding='utf-8').replace('{{page}}', page).encode('utf-8')
+            self.respond(200, body, 'text/html; charset=utf-8')
+
+        def respond(self, status, body, content_type='text/plain; charset=utf-8'):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FixtureHandler
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--fixtures', default=str(FIXTURES_DIR), help='Directorio con los HTML')
+    parser.add_argument('--delay-ms', type=float, default=0, help='Latencia de cada respuesta')
+    parser.add_argument('--fail-every', type=int, default=0, help='Responder 503 cada N peticiones')
+    args = parser.parse_args()
+
+    handler = make_handler(Path(args.fixtures).resolve(), args.delay_ms / 1000, args.fail_every)
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"[OK] Sirviendo {args.fixtures} en http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
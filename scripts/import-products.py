@@ -1,13 +1,38 @@
 """
 Script para importar productos automáticamente desde una página web.
 Soporta Amazon, MercadoLibre y otras páginas de e-commerce.
+
+Sin argumentos pide una URL y confirma antes de importar (modo interactivo).
+
+Con argumentos trabaja por lotes y sin preguntas: descarga varias URLs (y
+sus páginas de resultados) en paralelo con un cliente HTTP asíncrono con
+pool de conexiones y límite de peticiones por host, parsea el HTML con lxml
+en un pool de procesos y envía los productos a la API en lotes
+(POST /products/bulk) a medida que se extraen. Al terminar pide al AI
+Service una actualización incremental del modelo con los productos nuevos.
+
+Ejemplos:
+    python scripts/import-products.py --urls "https://www.amazon.com/s?k=laptop" --pages 3 --token TOKEN
+    python scripts/import-products.py --url-file urls.txt --output productos.jsonl
+    python scripts/import-products.py --url-file urls.txt --dry-run
+
+Para probar sin internet, `python scripts/fixture_server.py` sirve los HTML
+guardados en scripts/fixtures en http://127.0.0.1:8765.
 """
 
+import httpx
 import requests
 from bs4 import BeautifulSoup
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+import argparse
+import asyncio
+import json
 import re
 import sys
 import os
+import time
 
 # Agregar el directorio backend al path para importar Prisma
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
@@ -19,222 +44,537 @@ except:
     # Si no está disponible Prisma, usar requests directo a la API
     prisma = None
 
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+# lxml (en requirements) es varias veces más rápido que 'html.parser'
+HTML_PARSER = 'lxml'
+
+# Respuestas que vale la pena reintentar (con espera exponencial)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Productos por petición a POST /products/bulk
+BULK_BATCH_SIZE = 500
+
+def detect_source(url):
+    """'amazon' o 'generic' según la URL"""
+    return 'amazon' if 'amazon' in url.lower() else 'generic'
+
+def parse_amazon_products(html, limit=20):
+    """Extrae productos del HTML de una búsqueda de Amazon"""
+    soup = BeautifulSoup(html, HTML_PARSER)
+
+    products = []
+    # Buscar contenedores de productos en Amazon
+    product_containers = soup.find_all('div', {'data-component-type': 's-search-result'})[:limit]
+
+    for container in product_containers:
+        try:
+            # Nombre
+            name_elem = container.find('h2', class_='a-size-mini')
+            if not name_elem:
+                name_elem = container.find('span', class_='a-text-normal')
+            name = name_elem.get_text(strip=True) if name_elem else 'Producto sin nombre'
+
+            # Precio
+            price_elem = container.find('span', class_='a-price-whole')
+            if price_elem:
+                price_text = price_elem.get_text(strip=True).replace(',', '')
+                price = float(re.sub(r'[^\d.]', '', price_text))
+            else:
+                price = 99.99  # Precio por defecto
+
+            # Imagen
+            img_elem = container.find('img', class_='s-image')
+            image_url = img_elem.get('src') if img_elem else None
+
+            # Categoría (intentar extraer de la URL o usar genérica)
+            category = 'electronics'  # Por defecto
+
+            products.append({
+                'name': name[:200],  # Limitar longitud
+                'description': f'Producto importado desde Amazon. {name}',
+                'price': price,
+                'category': category,
+                'stock': 100,  # Stock por defecto
+                'imageUrl': image_url
+            })
+        except Exception as e:
+            print(f"Error extrayendo producto: {e}")
+            continue
+
+    return products
+
+def parse_generic_products(html, url, limit=20):
+    """Extrae productos del HTML de una página genérica de e-commerce"""
+    soup = BeautifulSoup(html, HTML_PARSER)
+
+    products = []
+
+    # Buscar patrones comunes de productos
+    # Buscar elementos con clases comunes de productos
+    product_selectors = [
+        {'class': 'product'},
+        {'class': 'item'},
+        {'class': 'product-item'},
+        {'data-product': True},
+    ]
+
+    found_products = []
+    for selector in product_selectors:
+        found = soup.find_all('div', selector)
+        if found:
+            found_products = found[:limit]
+            break
+
+    # Si no encuentra, buscar cualquier elemento con precio
+    if not found_products:
+        # Buscar elementos que contengan símbolos de precio
+        price_elements = soup.find_all(string=re.compile(r'\$|€|£'))
+        for price_elem in price_elements[:limit]:
+            parent = price_elem.find_parent()
+            if parent:
+                found_products.append(parent)
+
+    for container in found_products[:limit]:
+        try:
+            # Intentar extraer nombre
+            name_elem = container.find(['h1', 'h2', 'h3', 'h4', 'span', 'a'], class_=re.compile(r'title|name|product'))
+            if not name_elem:
+                name_elem = container.find(['h1', 'h2', 'h3'])
+            name = name_elem.get_text(strip=True) if name_elem else 'Producto importado'
+
+            # Intentar extraer precio
+            price_text = container.find(string=re.compile(r'\$[\d,]+\.?\d*'))
+            if price_text:
+                price = float(re.sub(r'[^\d.]', '', price_text))
+            else:
+                price = 99.99
+
+            # Intentar extraer imagen
+            img_elem = container.find('img')
+            image_url = img_elem.get('src') if img_elem else None
+            if image_url and not image_url.startswith('http'):
+                # URL relativa, convertir a absoluta
+                image_url = urljoin(url, image_url)
+
+            products.append({
+                'name': name[:200],
+                'description': f'Producto importado desde {url}',
+                'price': price,
+                'category': 'electronics',  # Categoría por defecto
+                'stock': 100,
+                'imageUrl': image_url
+            })
+        except Exception as e:
+            continue
+
+    return products
+
+def parse_products(html, url, limit=20, source=None):
+    """Extrae productos de `html` con el parser de `source` (por defecto según la URL)"""
+    if (source or detect_source(url)) == 'amazon':
+        return parse_amazon_products(html, limit)
+    return parse_generic_products(html, url, limit)
+
 def extract_amazon_products(url, limit=20):
     """Extrae productos de Amazon"""
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-    }
-    
     try:
-        response = requests.get(url, headers=headers, timeout=10)
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        products = []
-        # Buscar contenedores de productos en Amazon
-        product_containers = soup.find_all('div', {'data-component-type': 's-search-result'})[:limit]
-        
-        for container in product_containers:
-            try:
-                # Nombre
-                name_elem = container.find('h2', class_='a-size-mini')
-                if not name_elem:
-                    name_elem = container.find('span', class_='a-text-normal')
-                name = name_elem.get_text(strip=True) if name_elem else 'Producto sin nombre'
-                
-                # Precio
-                price_elem = container.find('span', class_='a-price-whole')
-                if price_elem:
-                    price_text = price_elem.get_text(strip=True).replace(',', '')
-                    price = float(re.sub(r'[^\d.]', '', price_text))
-                else:
-                    price = 99.99  # Precio por defecto
-                
-                # Imagen
-                img_elem = container.find('img', class_='s-image')
-                image_url = img_elem.get('src') if img_elem else None
-                
-                # Link del producto
-                link_elem = container.find('a', class_='a-link-normal')
-                product_url = 'https://www.amazon.com' + link_elem.get('href', '') if link_elem else None
-                
-                # Categoría (intentar extraer de la URL o usar genérica)
-                category = 'electronics'  # Por defecto
-                
-                products.append({
-                    'name': name[:200],  # Limitar longitud
-                    'description': f'Producto importado desde Amazon. {name}',
-                    'price': price,
-                    'category': category,
-                    'stock': 100,  # Stock por defecto
-                    'imageUrl': image_url
-                })
-            except Exception as e:
-                print(f"Error extrayendo producto: {e}")
-                continue
-        
-        return products
+        response = requests.get(url, headers=HEADERS, timeout=10)
+        return parse_amazon_products(response.content, limit)
     except Exception as e:
         print(f"Error al acceder a Amazon: {e}")
         return []
 
 def extract_generic_products(url, limit=20):
     """Extrae productos de páginas genéricas de e-commerce"""
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-    }
-    
     try:
-        response = requests.get(url, headers=headers, timeout=10)
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        products = []
-        
-        # Buscar patrones comunes de productos
-        # Buscar elementos con clases comunes de productos
-        product_selectors = [
-            {'class': 'product'},
-            {'class': 'item'},
-            {'class': 'product-item'},
-            {'data-product': True},
-        ]
-        
-        found_products = []
-        for selector in product_selectors:
-            found = soup.find_all('div', selector)
-            if found:
-                found_products = found[:limit]
-                break
-        
-        # Si no encuentra, buscar cualquier elemento con precio
-        if not found_products:
-            # Buscar elementos que contengan símbolos de precio
-            price_elements = soup.find_all(string=re.compile(r'\$|€|£'))
-            for price_elem in price_elements[:limit]:
-                parent = price_elem.find_parent()
-                if parent:
-                    found_products.append(parent)
-        
-        for container in found_products[:limit]:
-            try:
-                # Intentar extraer nombre
-                name_elem = container.find(['h1', 'h2', 'h3', 'h4', 'span', 'a'], class_=re.compile(r'title|name|product'))
-                if not name_elem:
-                    name_elem = container.find(['h1', 'h2', 'h3'])
-                name = name_elem.get_text(strip=True) if name_elem else 'Producto importado'
-                
-                # Intentar extraer precio
-                price_text = container.find(string=re.compile(r'\$[\d,]+\.?\d*'))
-                if price_text:
-                    price = float(re.sub(r'[^\d.]', '', price_text))
-                else:
-                    price = 99.99
-                
-                # Intentar extraer imagen
-                img_elem = container.find('img')
-                image_url = img_elem.get('src') if img_elem else None
-                if image_url and not image_url.startswith('http'):
-                    # URL relativa, convertir a absoluta
-                    from urllib.parse import urljoin
-                    image_url = urljoin(url, image_url)
-                
-                products.append({
-                    'name': name[:200],
-                    'description': f'Producto importado desde {url}',
-                    'price': price,
-                    'category': 'electronics',  # Categoría por defecto
-                    'stock': 100,
-                    'imageUrl': image_url
-                })
-            except Exception as e:
-                continue
-        
-        return products
+        response = requests.get(url, headers=HEADERS, timeout=10)
+        return parse_generic_products(response.content, url, limit)
     except Exception as e:
         print(f"Error al acceder a la página: {e}")
         return []
 
-def import_to_database(products, api_url='http://localhost:3001/api'):
-    """Importa productos a la base de datos vía API"""
-    import requests
-    
+def bulk_payload(products):
+    """Cuerpo de POST /products/bulk (sin campos vacíos, que la API no acepta como null)"""
+    return {
+        'products': [{key: value for key, value in product.items() if value is not None} for product in products],
+        # La actualización del modelo se pide una sola vez, al final
+        'refresh': False,
+    }
+
+def batch_message(number, summary):
+    return (
+        f"Lote {number}: {summary['created']} creados, {summary['duplicates']} ya existentes, "
+        f"{summary['invalid']} inválidos, {summary['failed']} fallidos"
+    )
+
+def import_to_database(products, api_url='http://localhost:3001/api', batch_size=BULK_BATCH_SIZE):
+    """Importa productos a la base de datos vía API, por lotes (POST /products/bulk)"""
+
     # Necesitas estar autenticado como admin
     print("\n⚠️  IMPORTANTE: Necesitas un token de admin para importar productos")
     print("1. Inicia sesión como admin en http://localhost:3000")
     print("2. Abre la consola del navegador (F12)")
     print("3. Ejecuta: localStorage.getItem('token')")
     print("4. Copia el token y pégalo aquí\n")
-    
+
     token = input("Token de admin (o presiona Enter para usar API directamente): ").strip()
-    
+
     if not token:
         print("❌ Se necesita token de admin para importar productos")
         return
-    
-    headers = {
-        'Authorization': f'Bearer {token}',
-        'Content-Type': 'application/json'
-    }
-    
-    imported = 0
-    failed = 0
-    
-    for product in products:
+
+    totals = defaultdict(int)
+
+    # Una sesión: la conexión se reutiliza entre lotes
+    with requests.Session() as session:
+        session.headers['Authorization'] = f'Bearer {token}'
+        for number, start in enumerate(range(0, len(products), batch_size), 1):
+            batch = products[start:start + batch_size]
+            try:
+                response = session.post(f'{api_url}/products/bulk', json=bulk_payload(batch), timeout=120)
+                response.raise_for_status()
+                summary = response.json()['summary']
+                print(f"✅ {batch_message(number, summary)}")
+            except Exception as e:
+                summary = {'created': 0, 'duplicates': 0, 'invalid': 0, 'failed': len(batch)}
+                print(f"❌ Lote {number}: {e}")
+            for key, value in summary.items():
+                totals[key] += value
+
+        if totals['created']:
+            request_model_refresh(session.post, api_url)
+
+    print(
+        f"\n📊 Resumen: {totals['created']} importados, {totals['duplicates']} ya existentes, "
+        f"{totals['invalid']} inválidos, {totals['failed']} fallidos"
+    )
+
+def request_model_refresh(post, api_url):
+    """Pide al AI Service (vía backend) una actualización incremental con los productos nuevos"""
+    try:
+        response = post(f'{api_url}/recommendations/refresh', timeout=30)
+        response.raise_for_status()
+        print(f"🔄 Actualización del modelo en curso (trabajo {response.json().get('jobId')})")
+    except Exception as e:
+        print(f"⚠️ No se pudo pedir la actualización del modelo: {e}")
+
+# ---------------------------------------------------------------------------
+# Modo por lotes
+# ---------------------------------------------------------------------------
+
+def expand_pages(url, pages):
+    """`url` y sus páginas siguientes (parámetro `page` de la búsqueda)"""
+    if pages <= 1:
+        return [url]
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query, keep_blank_values=True))
+    first = int(query.get('page', 1))
+    return [
+        urlunsplit(parts._replace(query=urlencode({**query, 'page': page})))
+        for page in range(first, first + pages)
+    ]
+
+def read_urls(args):
+    """URLs de --urls y --url-file (una por línea; '#' comenta), sin repetir"""
+    urls = list(args.urls or [])
+    if args.url_file:
+        with open(args.url_file, encoding='utf-8') as f:
+            urls.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    pages = [page for url in urls for page in expand_pages(url, args.pages)]
+    return list(dict.fromkeys(pages))
+
+class HostRateLimiter:
+    """Espacia las peticiones a un mismo host a `rate` por segundo"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next_slot = {}
+        self._locks = defaultdict(asyncio.Lock)
+
+    async def wait(self, host):
+        if not self.interval:
+            return
+        # Reservar el turno bajo el lock y esperar fuera de él
+        async with self._locks[host]:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+async def fetch_page(client, limiter, url, retries=2, backoff=1.0):
+    """Descarga `url` respetando el límite del host; reintenta 429/5xx y errores de red"""
+    for attempt in range(retries + 1):
+        await limiter.wait(urlsplit(url).netloc)
         try:
-            response = requests.post(
-                f'{api_url}/products',
-                json=product,
-                headers=headers
-            )
-            if response.status_code == 201:
-                imported += 1
-                print(f"✅ Importado: {product['name'][:50]}")
-            else:
-                failed += 1
-                print(f"❌ Error: {product['name'][:50]} - {response.status_code}")
+            response = await client.get(url)
+            if response.status_code in RETRY_STATUS and attempt < retries:
+                await asyncio.sleep(backoff * 2 ** attempt)
+                continue
+            response.raise_for_status()
+            return response.content
+        except httpx.TransportError:
+            if attempt == retries:
+                raise
+            await asyncio.sleep(backoff * 2 ** attempt)
+
+class BulkImporter:
+    """
+    Junta los productos en lotes de `batch_size` y los envía a
+    POST /products/bulk por conexiones keep-alive; al terminar pide una
+    actualización incremental del modelo si se creó algún producto.
+    """
+
+    def __init__(self, api_url, token, batch_size, concurrency, refresh=True):
+        self.api_url = api_url.rstrip('/')
+        self.batch_size = batch_size
+        self.refresh = refresh
+        self.client = httpx.AsyncClient(
+            headers={'Authorization': f'Bearer {token}'},
+            timeout=120,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        )
+        self.buffer = []
+        self.batches = 0
+        self.totals = defaultdict(int)
+
+    async def __call__(self, product):
+        self.buffer.append(product)
+        if len(self.buffer) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        batch, self.buffer = self.buffer, []
+        if not batch:
+            return
+        self.batches += 1
+        number = self.batches
+        try:
+            response = await self.client.post(f'{self.api_url}/products/bulk', json=bulk_payload(batch))
+            response.raise_for_status()
+            summary = response.json()['summary']
+            print(f"✅ {batch_message(number, summary)}")
+        except Exception as e:
+            summary = {'created': 0, 'duplicates': 0, 'invalid': 0, 'failed': len(batch)}
+            print(f"❌ Lote {number}: {e!r}")
+        for key, value in summary.items():
+            self.totals[key] += value
+
+    def summary(self):
+        return (
+            f"{self.totals['created']} importados, {self.totals['duplicates']} ya existentes, "
+            f"{self.totals['invalid']} inválidos, {self.totals['failed']} fallidos"
+        )
+
+    @property
+    def failed(self):
+        return self.totals['failed'] + self.totals['invalid']
+
+    async def aclose(self):
+        try:
+            await self.flush()
+            if self.refresh and self.totals['created']:
+                await request_model_refresh_async(self.client.post, self.api_url)
+        finally:
+            await self.client.aclose()
+
+async def request_model_refresh_async(post, api_url):
+    """Versión asíncrona de `request_model_refresh`"""
+    try:
+        response = await post(f'{api_url}/recommendations/refresh', timeout=30)
+        response.raise_for_status()
+        print(f"🔄 Actualización del modelo en curso (trabajo {response.json().get('jobId')})")
+    except Exception as e:
+        print(f"⚠️ No se pudo pedir la actualización del modelo: {e}")
+
+class JsonlWriter:
+    """Escribe un producto por línea (JSON) en `path`"""
+
+    def __init__(self, path):
+        self.file = open(path, 'w', encoding='utf-8')
+
+    async def __call__(self, product):
+        self.file.write(json.dumps(product, ensure_ascii=False) + '\n')
+
+    async def aclose(self):
+        self.file.close()
+
+class DryRun:
+    """Solo muestra los productos extraídos"""
+
+    async def __call__(self, product):
+        print(f"🔎 {product['name'][:60]} - ${product['price']}")
+
+    async def aclose(self):
+        pass
+
+async def run_batch(urls, sink, args):
+    """
+    Descarga, parsea e importa `urls`. Las descargas corren en paralelo
+    (hasta --concurrency, --rate por host); el HTML se parsea en un pool de
+    procesos y los productos pasan por una cola a --import-concurrency
+    tareas que los envían a `sink` mientras siguen llegando páginas.
+    """
+    stats = defaultdict(int)
+    seen_names = set()
+    queue = asyncio.Queue(maxsize=args.queue_size)
+    limiter = HostRateLimiter(args.rate)
+    fetch_slots = asyncio.Semaphore(args.concurrency)
+    loop = asyncio.get_running_loop()
+
+    async def scrape(client, pool, url):
+        # Un error en una página (descarga o parseo) se cuenta y no detiene a las demás
+        try:
+            async with fetch_slots:
+                html = await fetch_page(client, limiter, url, args.retries)
+            products = await loop.run_in_executor(pool, parse_products, html, url, args.limit, args.source)
+            stats['pages'] += 1
+        except httpx.HTTPStatusError as e:
+            stats['pages_failed'] += 1
+            print(f"❌ {url}: HTTP {e.response.status_code}")
+            return
         except Exception as e:
-            failed += 1
-            print(f"❌ Error: {product['name'][:50]} - {str(e)}")
-    
-    print(f"\n📊 Resumen: {imported} importados, {failed} fallidos")
+            stats['pages_failed'] += 1
+            print(f"❌ {url}: {e!r}")
+            return
+        print(f"📄 {url}: {len(products)} productos")
+        for product in products:
+            await queue.put(product)
+
+    async def consume():
+        while (product := await queue.get()) is not None:
+            # Las páginas de resultados se solapan: un producto por nombre
+            if product['name'] in seen_names:
+                stats['duplicates'] += 1
+                continue
+            seen_names.add(product['name'])
+            try:
+                await sink(product)
+                stats['extracted'] += 1
+            except Exception as e:
+                stats['failed'] += 1
+                print(f"❌ Error: {product['name'][:50]} - {e}")
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        async with httpx.AsyncClient(headers=HEADERS, timeout=args.timeout, limits=limits,
+                                     follow_redirects=True) as client:
+            consumers = [asyncio.create_task(consume()) for _ in range(args.import_concurrency)]
+            await asyncio.gather(*(scrape(client, pool, url) for url in urls))
+            for _ in consumers:
+                await queue.put(None)
+            await asyncio.gather(*consumers)
+    return stats
+
+def batch_main(args):
+    urls = read_urls(args)
+    if not urls:
+        print("❌ No hay URLs (usa --urls o --url-file)")
+        return 1
+
+    if args.dry_run:
+        sink = DryRun()
+    elif args.output:
+        sink = JsonlWriter(args.output)
+    else:
+        token = args.token or os.getenv('IMPORT_API_TOKEN')
+        if not token:
+            print("❌ Se necesita un token de admin (--token o IMPORT_API_TOKEN), --output o --dry-run")
+            return 1
+        sink = BulkImporter(
+            args.api_url, token, args.batch_size, args.import_concurrency, refresh=not args.no_refresh
+        )
+
+    print(f"🔍 Procesando {len(urls)} páginas (concurrencia {args.concurrency}, {args.rate}/s por host)...")
+    start = time.perf_counter()
+
+    async def run():
+        try:
+            return await run_batch(urls, sink, args)
+        finally:
+            await sink.aclose()
+
+    stats = asyncio.run(run())
+    seconds = time.perf_counter() - start
+    print(
+        f"\n📊 Resumen: {stats['pages']} páginas ({stats['pages_failed']} fallidas), "
+        f"{stats['extracted']} productos, {stats['duplicates']} repetidos, "
+        f"{stats['failed']} fallidos en {seconds:.1f}s"
+    )
+    if isinstance(sink, BulkImporter):
+        print(f"📦 API: {sink.summary()} en {sink.batches} lotes")
+        stats['failed'] += sink.failed
+    return 1 if stats['pages_failed'] or stats['failed'] else 0
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--urls', nargs='+', help='URLs de páginas de productos o búsquedas')
+    parser.add_argument('--url-file', help='Archivo con una URL por línea')
+    parser.add_argument('--pages', type=int, default=1, help='Páginas de resultados por URL (parámetro page)')
+    parser.add_argument('--limit', type=int, default=20, help='Máximo de productos por página')
+    parser.add_argument('--source', choices=['amazon', 'generic'], default=None,
+                        help='Parser a usar (por defecto según la URL)')
+    parser.add_argument('--concurrency', type=int, default=16, help='Descargas simultáneas')
+    parser.add_argument('--rate', type=float, default=2.0, help='Peticiones por segundo a un mismo host (0 = sin límite)')
+    parser.add_argument('--retries', type=int, default=2)
+    parser.add_argument('--timeout', type=float, default=15.0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Procesos para parsear HTML')
+    parser.add_argument('--queue-size', type=int, default=1000, help='Productos en espera de importarse')
+    parser.add_argument('--import-concurrency', type=int, default=4, help='Lotes enviados a la vez a la API')
+    parser.add_argument('--batch-size', type=int, default=BULK_BATCH_SIZE, help='Productos por petición a /products/bulk')
+    parser.add_argument('--no-refresh', action='store_true',
+                        help='No pedir la actualización incremental del modelo al terminar')
+    parser.add_argument('--api-url', default=os.getenv('API_URL', 'http://localhost:3001/api'))
+    parser.add_argument('--token', help='Token de admin (por defecto IMPORT_API_TOKEN)')
+    parser.add_argument('--output', help='Guardar los productos en un archivo JSONL en vez de importarlos')
+    parser.add_argument('--dry-run', action='store_true', help='Solo mostrar los productos extraídos')
+    return parser.parse_args(argv)
 
 def main():
+    if len(sys.argv) > 1:
+        sys.exit(batch_main(parse_args(sys.argv[1:])))
+
     print("🛒 Importador de Productos desde Web")
     print("=" * 50)
-    
+
     url = input("\nIngresa la URL de la página de productos: ").strip()
     if not url:
         print("❌ URL requerida")
         return
-    
+
     limit = input("¿Cuántos productos importar? (default: 20): ").strip()
     limit = int(limit) if limit.isdigit() else 20
-    
+
     print(f"\n🔍 Analizando {url}...")
-    
+
     # Detectar tipo de página
-    if 'amazon' in url.lower():
+    if detect_source(url) == 'amazon':
         print("📦 Detectado: Amazon")
         products = extract_amazon_products(url, limit)
     else:
         print("🌐 Página genérica detectada")
         products = extract_generic_products(url, limit)
-    
+
     if not products:
         print("❌ No se pudieron extraer productos. Intenta con otra URL.")
         return
-    
+
     print(f"\n✅ Se encontraron {len(products)} productos")
     print("\nPrimeros productos encontrados:")
     for i, p in enumerate(products[:5], 1):
         print(f"{i}. {p['name'][:60]} - ${p['price']}")
-    
+
     confirm = input(f"\n¿Importar {len(products)} productos? (s/n): ").strip().lower()
     if confirm != 's':
         print("❌ Cancelado")
         return
-    
+
     import_to_database(products)
 
 if __name__ == '__main__':
     main()
-